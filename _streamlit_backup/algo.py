@@ -30,21 +30,47 @@ Where:
     Ω = uncertainty in views
 """
 
+from functools import lru_cache
+
 import numpy as np
 import pandas as pd
-from scipy import optimize
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Sequence, Union
+
+# Optional JIT backend for the Black-Litterman update
+from jit_backend import NUMBA_AVAILABLE, njit
 
 
 # =============================================================================
 # EQUILIBRIUM RETURNS (CAPM)
 # =============================================================================
 
+def _as_sigma(
+    cov_matrix: Union[pd.DataFrame, np.ndarray],
+    assets: Sequence[str],
+    cov_assets: Optional[Sequence[str]] = None
+) -> np.ndarray:
+    """
+    Return the covariance of `assets` as an ndarray in that order.
+    
+    An ndarray is taken to be ordered like `cov_assets` (or like `assets`
+    when not given) and is returned as-is when the orders agree, skipping
+    the pandas label lookup on the hot path.
+    """
+    if isinstance(cov_matrix, np.ndarray):
+        if cov_assets is None or list(cov_assets) == list(assets):
+            return cov_matrix
+        pos = {asset: i for i, asset in enumerate(cov_assets)}
+        order = [pos[asset] for asset in assets]
+        return cov_matrix[np.ix_(order, order)]
+    return cov_matrix.loc[list(assets), list(assets)].values
+
+
 def calculate_equilibrium_returns(
-    cov_matrix: pd.DataFrame,
+    cov_matrix: Union[pd.DataFrame, np.ndarray],
     market_weights: Dict[str, float],
     risk_aversion: float = 2.5,
-    risk_free_rate: float = 0.02
+    risk_free_rate: float = 0.02,
+    cov_assets: Optional[Sequence[str]] = None
 ) -> pd.Series:
     """
     Calculate equilibrium (implied) returns using reverse optimization.
@@ -55,7 +81,7 @@ def calculate_equilibrium_returns(
     
     Parameters
     ----------
-    cov_matrix : pd.DataFrame
+    cov_matrix : pd.DataFrame or np.ndarray
         Covariance matrix of asset returns (annualized)
     market_weights : dict
         Market capitalization weights for each asset
@@ -64,6 +90,9 @@ def calculate_equilibrium_returns(
         Higher = more risk averse
     risk_free_rate : float
         Annual risk-free rate
+    cov_assets : list, optional
+        Row/column order of `cov_matrix` when it is an ndarray.
+        Defaults to the order of `market_weights`.
         
     Returns
     -------
@@ -85,15 +114,25 @@ def calculate_equilibrium_returns(
     
     # Convert to numpy arrays maintaining order
     weights = np.array([market_weights[asset] for asset in assets])
-    cov = cov_matrix.loc[assets, assets].values
+    cov = _as_sigma(cov_matrix, assets, cov_assets)
+    
+    total_returns = _equilibrium_np(cov, weights, risk_aversion, risk_free_rate)
     
+    return pd.Series(total_returns, index=assets, name="Equilibrium Returns")
+
+
+def _equilibrium_np(
+    Sigma: np.ndarray,
+    weights: np.ndarray,
+    risk_aversion: float,
+    risk_free_rate: float
+) -> np.ndarray:
+    """Equilibrium returns on arrays already in matching asset order."""
     # Calculate excess returns: π = δ * Σ * w
-    excess_returns = risk_aversion * cov @ weights
+    excess_returns = risk_aversion * (Sigma @ weights)
     
     # Add risk-free rate for total returns
-    total_returns = excess_returns + risk_free_rate
-    
-    return pd.Series(total_returns, index=assets, name="Equilibrium Returns")
+    return excess_returns + risk_free_rate
 
 
 # =============================================================================
@@ -101,13 +140,14 @@ def calculate_equilibrium_returns(
 # =============================================================================
 
 def black_litterman(
-    cov_matrix: pd.DataFrame,
+    cov_matrix: Union[pd.DataFrame, np.ndarray],
     market_weights: Dict[str, float],
     views: Dict[str, float],
     view_confidences: Optional[Dict[str, float]] = None,
     tau: float = 0.05,
     risk_aversion: float = 2.5,
-    risk_free_rate: float = 0.02
+    risk_free_rate: float = 0.02,
+    cov_assets: Optional[Sequence[str]] = None
 ) -> Tuple[pd.Series, pd.Series]:
     """
     Implement the Black-Litterman model to combine equilibrium returns
@@ -115,7 +155,7 @@ def black_litterman(
     
     Parameters
     ----------
-    cov_matrix : pd.DataFrame
+    cov_matrix : pd.DataFrame or np.ndarray
         Covariance matrix of asset returns (annualized)
     market_weights : dict
         Market capitalization weights
@@ -132,6 +172,9 @@ def black_litterman(
         Risk aversion coefficient
     risk_free_rate : float
         Annual risk-free rate
+    cov_assets : list, optional
+        Row/column order of `cov_matrix` when it is an ndarray.
+        Defaults to the order of `market_weights`.
         
     Returns
     -------
@@ -146,80 +189,140 @@ def black_litterman(
     The model will adjust all asset returns, not just US Tech,
     accounting for correlations between assets.
     """
-    assets = list(market_weights.keys())
-    n_assets = len(assets)
-    
-    # Step 1: Get equilibrium returns
-    pi = calculate_equilibrium_returns(
-        cov_matrix, market_weights, risk_aversion, risk_free_rate
+    # Canonicalize inputs into hashable tuples so repeated calls with the
+    # same data (every Streamlit rerun) are served from the cache
+    assets = tuple(market_weights.keys())
+    cov = np.ascontiguousarray(_as_sigma(cov_matrix, assets, cov_assets), dtype=float)
+    if view_confidences is None:
+        view_confidences = {}
+    views_key = tuple(views.items()) if views else ()
+    confs_key = tuple(view_confidences.get(asset, 0.5) for asset in views) if views else ()
+    
+    posterior, weights = _black_litterman_cached(
+        cov.tobytes(), cov.shape, assets,
+        tuple(market_weights[asset] for asset in assets),
+        views_key, confs_key,
+        tau, risk_aversion, risk_free_rate
+    )
+    return posterior.copy(), weights.copy()
+
+
+@lru_cache(maxsize=128)
+def _black_litterman_cached(
+    cov_bytes: bytes,
+    cov_shape: Tuple[int, int],
+    assets_tuple: Tuple[str, ...],
+    weights_tuple: Tuple[float, ...],
+    views_tuple: Tuple[Tuple[str, float], ...],
+    confs_tuple: Tuple[float, ...],
+    tau: float,
+    risk_aversion: float,
+    risk_free_rate: float
+) -> Tuple[pd.Series, pd.Series]:
+    """
+    Memoized Black-Litterman core. Arguments are the canonicalized
+    (hashable) form of black_litterman's inputs; callers must copy the
+    returned Series before handing them out.
+    """
+    assets = list(assets_tuple)
+    Sigma = np.frombuffer(cov_bytes).reshape(cov_shape)
+    w_mkt = np.array(weights_tuple, dtype=float)
+    
+    # Views on assets outside the universe are ignored
+    idx = {asset: i for i, asset in enumerate(assets)}
+    kept = [i for i, (asset, _) in enumerate(views_tuple) if asset in idx]
+    view_idx = np.array([idx[views_tuple[i][0]] for i in kept], dtype=np.int64)
+    Q = np.array([views_tuple[i][1] for i in kept], dtype=float)
+    conf = np.array([confs_tuple[i] for i in kept], dtype=float)
+    
+    pi, posterior = _bl_kernel(
+        Sigma, w_mkt, view_idx, Q, conf, tau, risk_aversion, risk_free_rate
     )
     
     # If no views, return equilibrium
-    if not views:
-        weights = _optimize_portfolio(pi, cov_matrix, risk_aversion)
-        return pi, weights
-    
-    # Step 2: Build view matrices
-    # P: Pick matrix (n_views x n_assets)
-    # Q: View returns vector (n_views,)
-    n_views = len(views)
-    P = np.zeros((n_views, n_assets))
-    Q = np.zeros(n_views)
-    
-    # Default confidences
-    if view_confidences is None:
-        view_confidences = {asset: 0.5 for asset in views}
-    
-    for i, (asset, view_return) in enumerate(views.items()):
-        if asset in assets:
-            asset_idx = assets.index(asset)
-            P[i, asset_idx] = 1.0
-            Q[i] = view_return
-    
-    # Step 3: Build uncertainty matrix (Omega)
-    # Ω = diag(P * τ * Σ * P')
-    # This scales uncertainty by the variance of the view portfolio
-    # Adjust by confidence: lower confidence = higher uncertainty
-    Sigma = cov_matrix.loc[assets, assets].values
-    omega_diag = np.diag(P @ (tau * Sigma) @ P.T)
-    
-    # Adjust by confidence (inverse relationship)
-    for i, asset in enumerate(views.keys()):
-        conf = view_confidences.get(asset, 0.5)
-        # Confidence of 1 = use omega as is
-        # Confidence of 0.1 = multiply omega by 10 (higher uncertainty)
-        omega_diag[i] /= max(conf, 0.1)
-    
-    Omega = np.diag(omega_diag)
-    
-    # Step 4: Bayesian update (Black-Litterman formula)
-    # Posterior expected returns:
-    # E[R] = [(τΣ)^(-1) + P'Ω^(-1)P]^(-1) * [(τΣ)^(-1)π + P'Ω^(-1)Q]
-    
-    tau_Sigma = tau * Sigma
-    tau_Sigma_inv = np.linalg.inv(tau_Sigma)
-    Omega_inv = np.linalg.inv(Omega)
+    if len(kept) == 0:
+        returns = pd.Series(pi, index=assets, name="Equilibrium Returns")
+    else:
+        returns = pd.Series(posterior, index=assets, name="BL Returns")
     
-    # Left side: [( τΣ)^(-1) + P'Ω^(-1)P]^(-1)
-    left_term = np.linalg.inv(tau_Sigma_inv + P.T @ Omega_inv @ P)
+    # Step 5: Optimize portfolio with new returns
+    optimal_weights = _optimize_portfolio(returns, Sigma, risk_aversion)
     
-    # Right side: [(τΣ)^(-1)π + P'Ω^(-1)Q]
-    pi_array = pi.loc[assets].values
-    right_term = tau_Sigma_inv @ pi_array + P.T @ Omega_inv @ Q
+    return returns, optimal_weights
+
+
+def _bl_kernel(
+    Sigma: np.ndarray,
+    w_mkt: np.ndarray,
+    view_idx: np.ndarray,
+    Q: np.ndarray,
+    conf: np.ndarray,
+    tau: float,
+    risk_aversion: float,
+    risk_free_rate: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fused Black-Litterman numerics on plain arrays.
     
-    # Posterior returns
-    posterior_returns = left_term @ right_term
-    posterior_series = pd.Series(posterior_returns, index=assets, name="BL Returns")
+    Views are absolute views on single assets, so the pick matrix P is a
+    row selection: P @ X == X[view_idx] and X @ P' == X[:, view_idx].
+    Using fancy indexing instead of a dense P removes the n_views × n
+    matmuls and their temporaries.
     
-    # Step 5: Optimize portfolio with new returns
-    optimal_weights = _optimize_portfolio(posterior_series, cov_matrix, risk_aversion)
+    Returns
+    -------
+    tuple
+        (equilibrium_returns, posterior_returns)
+    """
+    # Step 1: Equilibrium returns π = δΣw (+ rf), as in _equilibrium_np
+    pi = risk_aversion * (Sigma @ w_mkt) + risk_free_rate
+    if view_idx.shape[0] == 0:
+        return pi, pi
+    
+    # Step 2-3: Uncertainty matrix Ω = diag(P τΣ P') / confidence
+    # Confidence of 1 = use omega as is
+    # Confidence of 0.1 = multiply omega by 10 (higher uncertainty)
+    tSPT = tau * Sigma[:, view_idx]                 # n×k  (τΣP')
+    PtSPT = tSPT[view_idx]                          # k×k  (PτΣP')
+    omega = np.diag(PtSPT) / np.maximum(conf, 0.1)
     
-    return posterior_series, optimal_weights
+    # Step 4: Bayesian update (Black-Litterman formula)
+    # E[R] = [(τΣ)^(-1) + P'Ω^(-1)P]^(-1) * [(τΣ)^(-1)π + P'Ω^(-1)Q]
+    #
+    # By the Woodbury identity this equals:
+    # E[R] = π + τΣP' (Ω + PτΣP')^(-1) (Q - Pπ)
+    # which needs only a k×k solve (k = number of views, usually 1-3)
+    # instead of factoring n×n matrices.
+    # Ω is diagonal: add it onto the diagonal of PτΣP' instead of forming
+    # a dense k×k matrix (PtSPT is a fresh copy from fancy indexing)
+    M = PtSPT
+    for j in range(M.shape[0]):
+        M[j, j] += omega[j]
+    posterior = pi + tSPT @ np.linalg.solve(M, Q - pi[view_idx])
+    
+    return pi, posterior
+
+
+if NUMBA_AVAILABLE:
+    from numba import types as nb_types
+    
+    # Eager signature (Sigma is the read-only frombuffer view from the
+    # lru_cache key): compiled once and cached on disk across restarts
+    _vec = nb_types.float64[::1]
+    _bl_kernel = njit(
+        nb_types.Tuple((_vec, _vec))(
+            nb_types.Array(nb_types.float64, 2, "C", readonly=True), _vec,
+            nb_types.int64[::1], _vec, _vec,
+            nb_types.float64, nb_types.float64, nb_types.float64
+        ),
+        cache=True
+    )(_bl_kernel)
+    del _vec
 
 
 def _optimize_portfolio(
     expected_returns: pd.Series,
-    cov_matrix: pd.DataFrame,
+    cov_matrix: Union[pd.DataFrame, np.ndarray],
     risk_aversion: float = 2.5
 ) -> pd.Series:
     """
@@ -230,19 +333,196 @@ def _optimize_portfolio(
     
     This is the standard quadratic utility function where we balance
     expected return against portfolio variance.
+    
+    The problem is a strictly convex QP, so it is solved exactly with
+    closed-form KKT solves (see _solve_long_only_qp). SLSQP is only used
+    as a fallback when the covariance matrix is singular.
     """
     assets = expected_returns.index.tolist()
     n = len(assets)
     mu = expected_returns.values
-    Sigma = cov_matrix.loc[assets, assets].values
+    Sigma = _as_sigma(cov_matrix, assets)
+    
+    key = tuple(assets)
+    try:
+        weights = None
+        if n <= _ENUM_MAX_ASSETS:
+            weights = _solve_small_qp(mu, Sigma, risk_aversion)
+        if weights is None:
+            weights = _solve_long_only_qp(
+                mu, Sigma, risk_aversion, free0=_LAST_SUPPORT.get(key)
+            )
+            _LAST_SUPPORT[key] = weights > 0
+    except np.linalg.LinAlgError:
+        weights = _optimize_slsqp(mu, Sigma, risk_aversion)
+    
+    # Clean up small weights (< 1%) and renormalize in place
+    weights[weights < 0.01] = 0.0
+    total = weights.sum()
+    if total > 0:
+        weights *= 1.0 / total
+    else:
+        weights[:] = 1.0 / n
+    
+    return pd.Series(weights, index=assets, name="Optimal Weights")
+
+
+# Up to this many assets the QP is solved by enumerating every support in
+# one batched solve (2^n - 1 systems: 15 for the app's 4 asset classes)
+_ENUM_MAX_ASSETS = 6
+
+
+def _solve_small_qp(
+    mu: np.ndarray,
+    Sigma: np.ndarray,
+    risk_aversion: float
+) -> Optional[np.ndarray]:
+    """
+    Exact long-only QP for small n by checking every possible support.
+    
+    For each non-empty support F the KKT system
+        δ(Σw)_i + λ = μ_i   (i in F)
+        w_i = 0             (i not in F)
+        sum(w) = 1
+    is an (n+1)×(n+1) linear system, so all 2^n - 1 of them are stacked
+    and solved with a single batched np.linalg.solve. The optimum is the
+    solution that is primal feasible (w >= 0) and dual feasible
+    (ν = δΣw - μ + λ >= 0 on the pinned assets).
+    
+    Returns None if no candidate passes the checks (numerical edge
+    cases); the caller then falls back to the active-set solver.
+    """
+    n = len(mu)
+    supports = _support_masks(n)                           # (m, n) bool
+    m = supports.shape[0]
+    
+    A = np.zeros((m, n + 1, n + 1))
+    b = np.zeros((m, n + 1))
+    dS = risk_aversion * Sigma
+    
+    A[:, :n, :n] = np.where(supports[:, :, None], dS, np.eye(n))
+    A[:, :n, n] = supports
+    A[:, n, :n] = 1.0
+    b[:, :n] = np.where(supports, mu, 0.0)
+    b[:, n] = 1.0
+    
+    x = np.linalg.solve(A, b[..., None])[..., 0]
+    w, lam = x[:, :n], x[:, n]
+    nu = w @ dS.T - mu + lam[:, None]
+    
+    tol = 1e-10
+    ok = (w >= -tol).all(axis=1) & ((nu >= -tol) | supports).all(axis=1)
+    if not ok.any():
+        return None
+    
+    # Strictly convex: the KKT point is unique, but pick the best
+    # objective in case tolerance lets a near-duplicate through
+    cand = w[ok]
+    utility = cand @ mu - 0.5 * risk_aversion * np.einsum('ij,jk,ik->i', cand, Sigma, cand)
+    best = np.clip(cand[np.argmax(utility)], 0.0, None)
+    return best / best.sum()
+
+
+@lru_cache(maxsize=None)
+def _support_masks(n: int) -> np.ndarray:
+    """All non-empty subsets of range(n) as a (2^n - 1, n) boolean matrix."""
+    codes = np.arange(1, 2 ** n)
+    return (codes[:, None] >> np.arange(n)) & 1 == 1
+
+
+# Support (non-zero assets) of the last optimum per asset universe, used to
+# warm-start the next solve: between Streamlit reruns the inputs move only
+# slightly, so the optimal support rarely changes
+_LAST_SUPPORT: Dict[Tuple[str, ...], np.ndarray] = {}
+
+
+def _solve_long_only_qp(
+    mu: np.ndarray,
+    Sigma: np.ndarray,
+    risk_aversion: float,
+    free0: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Solve max μ'w - (δ/2) w'Σw  s.t.  sum(w) = 1, w >= 0  exactly.
+    
+    Primal active-set method. With the set F of assets allowed to be
+    non-zero fixed, the KKT conditions have a closed-form solution:
+        w_F = Σ_FF^(-1) (μ_F - λ1) / δ
+        λ   = (1'Σ_FF^(-1)μ_F - δ) / (1'Σ_FF^(-1)1)    (so that sum(w) = 1)
+    
+    Starting from equal weights, each iteration either steps towards that
+    solution until an asset hits zero (and pins it), or - if the solution
+    is already feasible - releases the pinned asset with the most negative
+    multiplier. Terminates after a handful of n×n solves.
+    
+    `free0` (boolean mask) warm-starts from equal weights on that support
+    instead; when it is already the optimal support a single solve is
+    enough.
+    """
+    n = len(mu)
+    if free0 is not None and free0.any():
+        free = free0.copy()
+    else:
+        free = np.ones(n, dtype=bool)
+    w = np.where(free, 1.0 / free.sum(), 0.0)
+    
+    for _ in range(10 * n + 10):
+        S = Sigma[np.ix_(free, free)]
+        rhs = np.column_stack([mu[free], np.ones(free.sum())])
+        a, b = np.linalg.solve(S, rhs).T
+        lam = (a.sum() - risk_aversion) / b.sum()
+        
+        target = np.zeros(n)
+        target[free] = (a - lam * b) / risk_aversion
+        step = target - w
+        
+        # Largest step that keeps every free weight non-negative
+        shrinking = free & (step < 0)
+        ratios = np.full(n, np.inf)
+        ratios[shrinking] = -w[shrinking] / step[shrinking]
+        blocking = int(np.argmin(ratios))
+        
+        if ratios[blocking] < 1.0:
+            w = w + ratios[blocking] * step
+            w[blocking] = 0.0
+            free[blocking] = False
+            continue
+        
+        w = target
+        # Multipliers of the pinned w_i >= 0 constraints: ν = δΣw - μ + λ
+        nu = risk_aversion * (Sigma @ w) - mu + lam
+        nu[free] = np.inf
+        release = int(np.argmin(nu))
+        if nu[release] >= -1e-12:
+            return w
+        free[release] = True
+    
+    raise np.linalg.LinAlgError("active-set QP did not converge")
+
+
+def _optimize_slsqp(
+    mu: np.ndarray,
+    Sigma: np.ndarray,
+    risk_aversion: float
+) -> np.ndarray:
+    """Iterative SLSQP fallback for ill-conditioned covariance matrices."""
+    # Only needed on this rare path, so keep scipy out of the import time
+    from scipy import optimize
+    
+    n = len(mu)
     
     # Objective: minimize -(μ'w - (δ/2) * w'Σw) = -μ'w + (δ/2) * w'Σw
+    # Returned together with its analytic gradient -μ + δΣw so SLSQP does
+    # not finite-difference it (one Σw product per evaluation)
     def objective(w):
-        return -mu @ w + (risk_aversion / 2) * w @ Sigma @ w
+        Sw = Sigma @ w
+        return -mu @ w + (risk_aversion / 2) * (w @ Sw), -mu + risk_aversion * Sw
     
     # Constraints
+    ones = np.ones(n)
     constraints = [
-        {'type': 'eq', 'fun': lambda w: np.sum(w) - 1}  # weights sum to 1
+        {'type': 'eq', 'fun': lambda w: np.sum(w) - 1,  # weights sum to 1
+         'jac': lambda w: ones}
     ]
     
     # Bounds: no short selling (0 <= w <= 1)
@@ -253,21 +533,15 @@ def _optimize_portfolio(
     
     # Optimize
     result = optimize.minimize(
-        objective, w0, method='SLSQP',
-        bounds=bounds, constraints=constraints
+        objective, w0, method='SLSQP', jac=True,
+        bounds=bounds, constraints=constraints,
+        options={'ftol': 1e-8, 'maxiter': 100}
     )
     
     if result.success:
-        weights = result.x
-    else:
-        # Fallback to market weights if optimization fails
-        weights = np.array([1/n] * n)
-    
-    # Clean up small weights (< 1%)
-    weights = np.where(weights < 0.01, 0, weights)
-    weights = weights / weights.sum()  # Renormalize
-    
-    return pd.Series(weights, index=assets, name="Optimal Weights")
+        return result.x
+    # Fallback to equal weights if optimization fails
+    return np.array([1/n] * n)
 
 
 # =============================================================================
@@ -319,14 +593,14 @@ def display_allocation_comparison(
     """
     Create a comparison table of market vs BL-optimized weights.
     """
-    assets = bl_weights.index.tolist()
-    
-    comparison = pd.DataFrame({
-        "Asset": assets,
-        "Market Weight": [market_weights.get(a, 0) for a in assets],
-        "BL Optimal Weight": bl_weights.values,
-    })
+    assets = bl_weights.index
     
-    comparison["Difference"] = comparison["BL Optimal Weight"] - comparison["Market Weight"]
+    market = pd.Series(market_weights, dtype=float).reindex(assets, fill_value=0.0).to_numpy()
+    bl = bl_weights.to_numpy()
     
-    return comparison
+    return pd.DataFrame({
+        "Asset": assets.tolist(),
+        "Market Weight": market,
+        "BL Optimal Weight": bl,
+        "Difference": bl - market,
+    })
@@ -10,13 +10,15 @@ Smart Wealth Advisor Platform (ภาษาไทย)
 - ระบบปรับสมดุลพอร์ตอัจฉริยะ
 """
 
+import hashlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import astuple
+
 import streamlit as st
 from streamlit_option_menu import option_menu
 import pandas as pd
 import numpy as np
-import plotly.graph_objects as go
-import plotly.express as px
-from plotly.subplots import make_subplots
 
 # Import custom modules
 from data_loader import (
@@ -34,29 +36,12 @@ from models import (
     calculate_drift, 
     generate_action_plan, 
     format_action_plan,
-    calculate_risk_score
-)
-from tax_optimizer import (
-    calculate_full_tax,
-    calculate_ssf_rmf_recommendation,
-    calculate_optimal_allocation,
-    TaxDeductions,
-    get_tax_bracket_info,
-    format_thai_currency
-)
-from line_notify import (
-    send_advisor_alert,
-    create_panic_alert,
-    test_line_notify,
-    set_line_token,
-    get_notify_status
-)
-from pdf_generator import (
-    generate_wealth_report,
-    generate_simple_summary,
-    get_report_filename
+    calculate_dashboard_metrics
 )
+# tax_optimizer, line_notify and pdf_generator are imported inside the
+# pages that use them so cold starts don't load fpdf/requests up front
 from auth import (
+    get_auth,
     init_session_state,
     is_authenticated,
     get_current_user,
@@ -148,6 +133,39 @@ st.markdown("""
         font-size: 0.95rem !important;
     }
     
+    /* Static metric rows (metric_row_html) - same look as metric cards */
+    .metric-row {
+        display: flex;
+        gap: 1rem;
+        margin-bottom: 1rem;
+    }
+    
+    .metric-row .metric-card {
+        flex: 1;
+        background: linear-gradient(145deg, #1e222a 0%, #292d38 100%);
+        border-radius: 16px;
+        padding: 1.5rem 1.8rem;
+        border: 1px solid rgba(0, 210, 106, 0.15);
+        box-shadow: 0 4px 20px rgba(0, 0, 0, 0.3);
+    }
+    
+    .metric-row .metric-label {
+        color: #9CA3AF;
+        font-size: 1rem;
+        font-weight: 600;
+        letter-spacing: 0.02em;
+    }
+    
+    .metric-row .metric-value {
+        font-size: 2rem;
+        font-weight: 700;
+        color: #ffffff;
+    }
+    
+    .metric-row .metric-delta {
+        font-size: 0.95rem;
+    }
+    
     /* Slider Styling - Much More Readable */
     .stSlider {
         padding: 1rem 0 !important;
@@ -333,10 +351,212 @@ def load_data():
     prices = get_historical_prices()
     market_caps = get_market_caps()
     expected_returns, cov_matrix = calculate_statistics(prices)
-    return prices, market_caps, expected_returns, cov_matrix
+    # Covariance as an ndarray in market-cap order for the BL hot path
+    asset_order = list(market_caps.keys())
+    cov_np = cov_matrix.loc[asset_order, asset_order].to_numpy(copy=True)
+    # Statistics stay float64 (BL/optimizer); prices are only charted
+    prices = prices.astype(np.float32, copy=False)
+    # User-independent chart series: prices rebased to 100 and the
+    # equal-weight benchmark (per-user work is then a single mat-vec)
+    if prices.empty:
+        normalized_np = np.empty((0, prices.shape[1]), dtype=np.float32)
+        benchmark = np.empty(0, dtype=np.float32)
+    else:
+        normalized_np = prices.to_numpy() * (100 / prices.to_numpy()[0])
+        benchmark = normalized_np.mean(axis=1)
+    # Small fingerprint of the BL inputs so derived caches hash 8 bytes
+    # instead of a DataFrame
+    cov_hash = hashlib.blake2b(
+        cov_np.tobytes() + repr(tuple(market_caps.items())).encode(), digest_size=8
+    ).hexdigest()
+    return (prices, market_caps, expected_returns, cov_matrix, asset_order, cov_np,
+            normalized_np, benchmark, cov_hash)
 
 # Load data
-prices, market_caps, expected_returns, cov_matrix = load_data()
+(prices, market_caps, expected_returns, cov_matrix, asset_order, cov_np,
+ normalized_np, benchmark, cov_hash) = load_data()
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def run_black_litterman(cov_hash, views_key, confs_key, tau, risk_aversion,
+                        _cov, _market_caps, _asset_order):
+    """
+    Equilibrium + Black-Litterman results cached on the data fingerprint.
+    
+    The underscore arguments are not hashed; they are fully determined by
+    `cov_hash` (see load_data).
+    """
+    equilibrium = calculate_equilibrium_returns(
+        _cov, _market_caps, risk_aversion, cov_assets=_asset_order
+    )
+    bl_returns, optimal_weights = black_litterman(
+        cov_matrix=_cov,
+        market_weights=_market_caps,
+        views=dict(views_key),
+        view_confidences=dict(confs_key) if confs_key else None,
+        tau=tau,
+        risk_aversion=risk_aversion,
+        cov_assets=_asset_order
+    )
+    return equilibrium, bl_returns, optimal_weights
+
+# Monte Carlo noise: upper bounds of the simulation page inputs
+MC_MAX_PATHS = 1000
+MC_MAX_STEPS = 50 * 12
+
+@st.cache_resource
+def mc_noise(n_paths: int = MC_MAX_PATHS, n_steps: int = MC_MAX_STEPS, seed: int = 0) -> np.ndarray:
+    """Standard normals drawn once and shared by every Monte Carlo run (read-only)."""
+    noise = np.random.default_rng(seed).standard_normal((n_paths, n_steps), dtype=np.float32)
+    noise.setflags(write=False)
+    return noise
+
+# Shown while a user has not invested yet
+DEFAULT_HOLDINGS = {
+    'Thai Stock': 0.30,
+    'US Tech': 0.35,
+    'Gold': 0.15,
+    'Bonds': 0.20
+}
+DEFAULT_ASSET_ORDER = tuple(DEFAULT_HOLDINGS)
+DEFAULT_WEIGHTS = np.fromiter(DEFAULT_HOLDINGS.values(), dtype=np.float32)
+
+# Display labels for asset tables
+ASSET_LABELS_TH = {"Thai Stock": "หุ้นไทย", "US Tech": "หุ้นเทคโนโลยี US", "Gold": "ทองคำ", "Bonds": "พันธบัตร"}
+DRIFT_STATUS_TH = {
+    '🔴 Rebalance Needed': '🔴 ต้องปรับสมดุล',
+    '🟡 Monitor': '🟡 ควรติดตาม',
+    '🟢 On Target': '🟢 ตามเป้าหมาย'
+}
+
+# Transaction history labels
+TX_LABELS = {
+    TransactionType.DEPOSIT: "💳 ฝากเงิน",
+    TransactionType.WITHDRAW: "🏧 ถอนเงิน",
+    TransactionType.BUY: "📈 ซื้อ",
+    TransactionType.SELL: "📉 ขาย",
+    TransactionType.REBALANCE: "⚖️ ปรับสมดุล"
+}
+
+# User management role labels
+ROLE_BADGES = {"client": "🧑‍💼 ลูกค้า", "advisor": "👨‍💼 ที่ปรึกษา", "admin": "👑 แอดมิน"}
+
+# Black-Litterman view sliders: (asset, label, default view %)
+BL_VIEW_INPUTS = (
+    ("Thai Stock", "🇹🇭 หุ้นไทย", 0.0),
+    ("US Tech", "🇺🇸 หุ้นเทคโนโลยี US", 5.0),
+    ("Gold", "🪙 ทองคำ", 0.0),
+    ("Bonds", "📜 พันธบัตร", 0.0),
+)
+
+# Static widget options
+MARITAL_OPTIONS = ("โสด", "สมรส (คู่สมรสไม่มีรายได้)", "สมรส (คู่สมรสมีรายได้)")
+REPORT_TYPES = ("รายงานสรุปพอร์ต", "รายงานฉบับเต็ม")
+CONTACT_REASONS = (
+    "พอร์ตติดลบ ต้องการคำปรึกษา",
+    "ต้องการปรับกลยุทธ์การลงทุน",
+    "สอบถามเรื่อง SSF/RMF",
+    "วางแผนการเกษียณ",
+    "อื่นๆ"
+)
+CONTACT_TIMES = (
+    "ทันที (ด่วน)",
+    "ช่วงเช้า (9:00 - 12:00)",
+    "ช่วงบ่าย (13:00 - 17:00)",
+    "ช่วงเย็น (17:00 - 19:00)"
+)
+ROLE_CHOICES = {"ลูกค้า": UserRole.CLIENT, "ที่ปรึกษา": UserRole.ADVISOR, "แอดมิน": UserRole.ADMIN}
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _cached_get_portfolio(user_id: str):
+    """Portfolio snapshot per user; cleared by invalidate_user_caches."""
+    return get_portfolio_service().get_portfolio(user_id)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _cached_tx_list(user_id: str, limit: int = 20):
+    """Recent transactions per user; cleared by invalidate_user_caches."""
+    return get_portfolio_service().get_transactions(user_id, limit=limit)
+
+@st.cache_data(show_spinner=False)
+def _tax_bracket_df():
+    """Static 2567 tax bracket table, built once per process."""
+    from tax_optimizer import get_tax_bracket_info
+    
+    df = pd.DataFrame(get_tax_bracket_info())
+    df.columns = ["เงินได้สุทธิ (บาท)", "อัตราภาษี", "อัตรา (%)"]
+    return df
+
+@st.cache_data(show_spinner=False)
+def _tax(gross_income: float, ded_tuple: tuple):
+    """calculate_full_tax keyed on income and the TaxDeductions fields."""
+    from tax_optimizer import calculate_full_tax, TaxDeductions
+    
+    return calculate_full_tax(gross_income, TaxDeductions(*ded_tuple))
+
+@st.cache_data(show_spinner=False)
+def _ssf_rmf(gross_income: float, ded_tuple: tuple):
+    """calculate_ssf_rmf_recommendation keyed like _tax."""
+    from tax_optimizer import calculate_ssf_rmf_recommendation, TaxDeductions
+    
+    return calculate_ssf_rmf_recommendation(gross_income, TaxDeductions(*ded_tuple))
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _user_table(user_rows: tuple):
+    """Admin user table from (id, name, email, role, phone) rows."""
+    return pd.DataFrame.from_records(
+        ((uid, name, email, ROLE_BADGES.get(role, role), phone or "-")
+         for uid, name, email, role, phone in user_rows),
+        columns=["ID", "ชื่อ", "อีเมล", "บทบาท", "โทรศัพท์"]
+    )
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _all_users(_auth):
+    """Every profile for the admin page; cleared on role change."""
+    return _auth.get_all_users()
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _my_clients(advisor_id: str, is_admin: bool, _auth):
+    """Client list for the advisor page (all clients for admins); cleared on role change."""
+    if is_admin:
+        return _auth.get_users_by_role(UserRole.CLIENT)
+    return _auth.get_advisor_clients(advisor_id)
+
+@st.cache_resource
+def _worker_pool() -> ThreadPoolExecutor:
+    """Worker pool for PDF rendering, shared by all sessions."""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="swa-worker")
+
+@st.cache_data(show_spinner=False)
+def _pdf(report_type: str, name: str, total: float, ytd: float,
+         portfolio_items: tuple, target_items: tuple) -> bytes:
+    """Rendered report bytes keyed on the report inputs (portfolio as item tuples)."""
+    from pdf_generator import generate_wealth_report, generate_simple_summary
+    
+    portfolio = dict(portfolio_items)
+    if report_type == REPORT_TYPES[0]:
+        return generate_simple_summary(
+            client_name=name,
+            total_assets=total,
+            ytd_return=ytd,
+            portfolio=portfolio
+        )
+    return generate_wealth_report(
+        client_name=name,
+        client_data={
+            'total_assets': total,
+            'ytd_return': ytd,
+            'portfolio': portfolio,
+            'target_allocation': dict(target_items)
+        },
+        portfolio_data=portfolio,
+        include_recommendations=True
+    )
+
+def invalidate_user_caches(user_id: str):
+    """Drop cached portfolio data after a mutation (call before st.rerun)."""
+    # Clears every user's entries; refills are cheap at a 30s TTL
+    _cached_get_portfolio.clear()
+    _cached_tx_list.clear()
 
 # Get client data based on logged-in user with portfolio service
 def get_current_client_data():
@@ -345,10 +565,15 @@ def get_current_client_data():
     
     if user:
         # Get portfolio from portfolio service
-        portfolio_svc = get_portfolio_service()
-        portfolio = portfolio_svc.get_portfolio(user.id)
+        portfolio = _cached_get_portfolio(user.id)
         
         if portfolio:
+            if portfolio.weights.any():
+                holdings = portfolio.holdings
+                asset_order, weights = portfolio.asset_order, portfolio.weights
+            else:
+                holdings = DEFAULT_HOLDINGS
+                asset_order, weights = DEFAULT_ASSET_ORDER, DEFAULT_WEIGHTS
             return {
                 'id': 1,
                 'name': user.full_name,
@@ -358,1510 +583,1424 @@ def get_current_client_data():
                 'cash_balance': portfolio.cash_balance,
                 'ytd_return': portfolio.ytd_return,
                 'risk_score': portfolio.risk_score,
-                'portfolio': portfolio.holdings if any(portfolio.holdings.values()) else {
-                    'Thai Stock': 0.30,
-                    'US Tech': 0.35,
-                    'Gold': 0.15,
-                    'Bonds': 0.20
-                },
+                'portfolio': holdings,
+                'asset_order': asset_order,
+                'weights': weights,
                 'target_allocation': portfolio.target_allocation
             }
     
     # Fallback for not logged in
     from data_loader import simulate_supabase_connection
     db = simulate_supabase_connection()
-    return db.get_client(1)
+    client = dict(db.get_client(1))
+    client['asset_order'] = tuple(client['portfolio'])
+    client['weights'] = np.fromiter(client['portfolio'].values(), dtype=np.float32)
+    return client
 
 client = get_current_client_data()
 
 
 # =============================================================================
-# DASHBOARD PAGE (แดชบอร์ด)
+# UI HELPERS
 # =============================================================================
 
-if selected == "แดชบอร์ด":
-    # Header
-    st.markdown("""
-    <h1 style='margin-bottom: 0.5rem;'>
-        <span style='background: linear-gradient(135deg, #00D26A 0%, #FFD700 100%);
-        -webkit-background-clip: text; -webkit-text-fill-color: transparent;'>
-        📊 แดชบอร์ดพอร์ตโฟลิโอ
-        </span>
-    </h1>
-    <p style='color: #888; margin-bottom: 2rem; font-size: 1.1rem;'>ภาพรวมพอร์ตและผลการดำเนินงานแบบเรียลไทม์</p>
-    """, unsafe_allow_html=True)
-    
-    # Key Metrics Row
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        st.metric(
-            label="💰 สินทรัพย์รวม",
-            value=f"฿{client['total_assets']:,.0f}",
-            delta="+฿350,000 เดือนนี้"
-        )
-    
-    with col2:
-        st.metric(
-            label="📈 ผลตอบแทน YTD",
-            value=f"{client['ytd_return']*100:.2f}%",
-            delta="+2.1% เหนือเกณฑ์"
-        )
-    
-    with col3:
-        risk_score = calculate_risk_score(client['portfolio'])
-        st.metric(
-            label="⚠️ ระดับความเสี่ยง",
-            value=f"{risk_score}/10",
-            delta="ปานกลาง" if risk_score <= 6 else "สูง",
-            delta_color="off"
-        )
-    
-    with col4:
-        st.metric(
-            label="📊 Sharpe Ratio",
-            value="1.42",
-            delta="+0.15 จากไตรมาสก่อน"
-        )
-    
-    st.markdown("<br>", unsafe_allow_html=True)
-    
-    # Charts Row
-    col_left, col_right = st.columns(2)
+METRIC_DELTA_COLORS = {"up": "#00D26A", "down": "#FF6B6B", "off": "#9CA3AF"}
+
+def metric_row_html(items):
+    """
+    One HTML block for a row of static metric cards.
+    
+    `items` is a list of (label, value, delta, tone) with tone in
+    METRIC_DELTA_COLORS. Use instead of st.columns + st.metric where
+    delta animations are not needed: the row is a single element per rerun.
+    """
+    cards = "".join(
+        f"<div class='metric-card'>"
+        f"<div class='metric-label'>{label}</div>"
+        f"<div class='metric-value'>{value}</div>"
+        f"<div class='metric-delta' style='color: {METRIC_DELTA_COLORS[tone]};'>{delta}</div>"
+        f"</div>"
+        for label, value, delta, tone in items
+    )
+    return f"<div class='metric-row'>{cards}</div>"
+
+PAGE_HEADER_HTML = (
+    "<h1 style='margin-bottom: 0.5rem;'>"
+    "<span style='background: linear-gradient(135deg, #00D26A 0%%, #FFD700 100%%);"
+    " -webkit-background-clip: text; -webkit-text-fill-color: transparent;'>%s %s</span>"
+    "</h1>"
+    "<p style='color: #888; margin-bottom: 2rem; font-size: 1.1rem;'>%s</p>"
+)
+
+def page_header(emoji, title, subtitle):
+    """Gradient page title + subtitle shared by every page."""
+    st.markdown(PAGE_HEADER_HTML % (emoji, title, subtitle), unsafe_allow_html=True)
+
+
+# =============================================================================
+# CHART BUILDERS
+# =============================================================================
+
+# Shared dark theme; charts pass it to go.Figure and only override per-chart keys
+DARK_LAYOUT = dict(
+    paper_bgcolor='rgba(0,0,0,0)',
+    plot_bgcolor='rgba(0,0,0,0)',
+    font=dict(color='#fff', size=12),
+    xaxis=dict(gridcolor='rgba(255,255,255,0.1)'),
+    yaxis=dict(gridcolor='rgba(255,255,255,0.1)')
+)
+
+@st.cache_data(ttl=3600)
+def build_dashboard_figure(asset_order, weights, target_weights, last_date,
+                           price_assets, _dates, _normalized, _benchmark):
+    """
+    Dashboard allocation donuts and performance chart as a single figure.
+    
+    Cached on the weights and the last price date; the underscore price
+    arrays are not hashed (they only change together with `last_date`).
+    """
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    
+    labels_th = ["หุ้นไทย", "หุ้นเทคโนโลยี US", "ทองคำ", "พันธบัตร"]
+    colors = ['#00D26A', '#007AFF', '#FFD700', '#FF6B6B']
+    
+    fig = make_subplots(
+        rows=1, cols=3,
+        specs=[[{"type": "pie"}, {"type": "pie"}, {"type": "xy"}]],
+        column_widths=[0.25, 0.25, 0.5],
+        subplot_titles=("สัดส่วนปัจจุบัน", "สัดส่วนเป้าหมาย", "มูลค่า (ฐาน = 100)")
+    )
+    fig.update_layout(DARK_LAYOUT)
     
-    with col_left:
-        st.markdown("### 🥧 สัดส่วนการลงทุน ปัจจุบัน vs เป้าหมาย")
-        
-        # Donut chart for portfolio allocation
-        current_weights = list(client['portfolio'].values())
-        target_weights = list(client['target_allocation'].values())
-        labels_th = ["หุ้นไทย", "หุ้นเทคโนโลยี US", "ทองคำ", "พันธบัตร"]
-        
-        fig = make_subplots(
-            rows=1, cols=2, 
-            specs=[[{"type": "pie"}, {"type": "pie"}]],
-            subplot_titles=("สัดส่วนปัจจุบัน", "สัดส่วนเป้าหมาย")
-        )
-        
-        colors = ['#00D26A', '#007AFF', '#FFD700', '#FF6B6B']
-        
-        fig.add_trace(
-            go.Pie(
-                labels=labels_th,
-                values=current_weights,
-                hole=0.6,
-                marker_colors=colors,
-                textinfo='percent',
-                textfont_size=14,
-                hovertemplate="<b>%{label}</b><br>สัดส่วน: %{percent}<extra></extra>"
-            ),
-            row=1, col=1
-        )
-        
+    for col, values in ((1, weights), (2, target_weights)):
         fig.add_trace(
             go.Pie(
                 labels=labels_th,
-                values=target_weights,
+                values=values,
                 hole=0.6,
                 marker_colors=colors,
                 textinfo='percent',
                 textfont_size=14,
                 hovertemplate="<b>%{label}</b><br>สัดส่วน: %{percent}<extra></extra>"
             ),
-            row=1, col=2
-        )
-        
-        fig.update_layout(
-            height=380,
-            showlegend=True,
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=-0.15,
-                xanchor="center",
-                x=0.5,
-                font=dict(size=13)
-            ),
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font=dict(color='#fff', size=13),
-            margin=dict(t=50, b=60, l=20, r=20)
+            row=1, col=col
         )
-        
-        st.plotly_chart(fig, use_container_width=True)
-    
-    with col_right:
-        st.markdown("### 📈 ผลการดำเนินงาน (1 ปี)")
-        
-        # Performance line chart
-        if not prices.empty:
-            # Normalize to starting point = 100
-            normalized = (prices / prices.iloc[0]) * 100
-            
-            # Calculate portfolio value
-            weights = np.array(list(client['portfolio'].values()))
-            portfolio_perf = (normalized * weights).sum(axis=1)
-            
-            fig = go.Figure()
-            
-            # Add portfolio line
-            fig.add_trace(go.Scatter(
-                x=normalized.index,
-                y=portfolio_perf,
-                mode='lines',
-                name='พอร์ตของคุณ',
-                line=dict(color='#00D26A', width=3),
-                fill='tozeroy',
-                fillcolor='rgba(0, 210, 106, 0.1)'
-            ))
-            
-            # Add benchmark (equal weight)
-            benchmark = normalized.mean(axis=1)
-            fig.add_trace(go.Scatter(
-                x=normalized.index,
-                y=benchmark,
-                mode='lines',
-                name='ดัชนีเปรียบเทียบ',
-                line=dict(color='#888', width=2, dash='dash')
-            ))
-            
-            fig.update_layout(
-                height=380,
-                xaxis_title="",
-                yaxis_title="มูลค่า (ฐาน = 100)",
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                font=dict(color='#fff', size=12),
-                legend=dict(
-                    orientation="h",
-                    yanchor="top",
-                    y=1.1,
-                    xanchor="left",
-                    x=0,
-                    font=dict(size=13)
-                ),
-                margin=dict(t=30, b=30, l=50, r=20),
-                xaxis=dict(gridcolor='rgba(255,255,255,0.1)'),
-                yaxis=dict(gridcolor='rgba(255,255,255,0.1)')
-            )
-            
-            st.plotly_chart(fig, use_container_width=True)
-    
-    # Quick Insights
-    st.markdown("### 💡 ข้อมูลเชิงลึก")
-    
-    col1, col2, col3 = st.columns(3)
     
-    with col1:
-        st.info("🎯 **คะแนนกระจายความเสี่ยง:** 8.2/10 - พอร์ตของคุณกระจายความเสี่ยงได้ดี")
-    
-    with col2:
-        drift_df = calculate_drift(client['portfolio'], client['target_allocation'])
-        max_drift = drift_df['Drift (%)'].abs().max()
-        if max_drift > 5:
-            st.warning(f"⚠️ **แจ้งเตือน:** สัดส่วนเบี่ยงเบนสูงสุด {max_drift:.1f}% ควรพิจารณาปรับสมดุล")
-        else:
-            st.success("✅ **สถานะ:** พอร์ตอยู่ในช่วงเป้าหมาย")
+    # Performance line chart
+    if last_date is not None:
+        # Calculate portfolio value (align weights to the price columns by
+        # asset name: downloaded prices come back in ticker order)
+        held = dict(zip(asset_order, weights))
+        aligned = np.array([held.get(a, 0.0) for a in price_assets], dtype=np.float32)
+        portfolio_perf = _normalized @ aligned
+        
+        # Add portfolio line
+        fig.add_trace(go.Scatter(
+            x=_dates,
+            y=portfolio_perf,
+            mode='lines',
+            name='พอร์ตของคุณ',
+            line=dict(color='#00D26A', width=3),
+            fill='tozeroy',
+            fillcolor='rgba(0, 210, 106, 0.1)'
+        ), row=1, col=3)
+        
+        # Add benchmark (equal weight)
+        fig.add_trace(go.Scatter(
+            x=_dates,
+            y=_benchmark,
+            mode='lines',
+            name='ดัชนีเปรียบเทียบ',
+            line=dict(color='#888', width=2, dash='dash')
+        ), row=1, col=3)
+    
+    fig.update_layout(
+        height=400,
+        showlegend=True,
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=-0.2,
+            xanchor="center",
+            x=0.5,
+            font=dict(size=13)
+        ),
+        font_size=13,
+        margin=dict(t=50, b=60, l=20, r=20)
+    )
     
-    with col3:
-        st.info("📊 **มุมมองตลาด:** หุ้นเทคโนโลยี US มีโมเมนตัมที่ดี แนะนำรักษาสัดส่วน")
+    return fig
 
 
 # =============================================================================
-# PORTFOLIO MANAGEMENT PAGE (จัดการพอร์ต)
+# PAGE FRAGMENTS
 # =============================================================================
+# Self-contained pages run as fragments: their widgets rerun only the
+# page body, not the sidebar, client lookup and the rest of the script.
 
-elif selected == "จัดการพอร์ต":
-    st.markdown("""
-    <h1 style='margin-bottom: 0.5rem;'>
-        <span style='background: linear-gradient(135deg, #00D26A 0%, #FFD700 100%);
-        -webkit-background-clip: text; -webkit-text-fill-color: transparent;'>
-        💼 จัดการพอร์ตโฟลิโอ
-        </span>
-    </h1>
-    <p style='color: #888; margin-bottom: 2rem; font-size: 1.1rem;'>
-        ฝากเงิน ถอนเงิน และจัดสรรการลงทุนของคุณ
-    </p>
-    """, unsafe_allow_html=True)
-    
-    # Get current user and portfolio
-    user = get_current_user()
-    portfolio_svc = get_portfolio_service()
-    user_portfolio = portfolio_svc.get_portfolio(user.id) if user else None
-    
-    if not user_portfolio:
-        st.error("ไม่พบข้อมูลพอร์ตโฟลิโอ กรุณาลองใหม่อีกครั้ง")
-        st.stop()
-    
-    # Summary Cards
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        st.metric(
-            label="💰 มูลค่ารวม",
-            value=f"฿{user_portfolio.total_value:,.0f}",
-            delta="ทั้งหมด"
-        )
-    
-    with col2:
-        st.metric(
-            label="💵 เงินสด",
-            value=f"฿{user_portfolio.cash_balance:,.0f}",
-            delta="พร้อมลงทุน"
-        )
-    
-    with col3:
-        invested = user_portfolio.total_value - user_portfolio.cash_balance
-        st.metric(
-            label="📈 ลงทุนแล้ว",
-            value=f"฿{invested:,.0f}",
-            delta=f"{user_portfolio.ytd_return*100:.1f}% YTD" if user_portfolio.ytd_return else "0%"
-        )
-    
-    with col4:
-        st.metric(
-            label="⚠️ ระดับความเสี่ยง",
-            value=f"{user_portfolio.risk_score}/10",
-            delta="ปานกลาง" if user_portfolio.risk_score <= 6 else "สูง",
-            delta_color="off"
-        )
+@st.fragment
+def _page_tax():
+    """Tax planning page (วางแผนภาษี)."""
+    from tax_optimizer import TaxDeductions
     
-    st.markdown("<br>", unsafe_allow_html=True)
+    page_header("🧮", "วางแผนภาษีและ SSF/RMF", "คำนวณภาษีตามอัตรา 2567 และแนะนำการลงทุน SSF/RMF ที่เหมาะสม")
     
-    # Tabs for different actions
-    tab_deposit, tab_withdraw, tab_invest, tab_history = st.tabs([
-        "💳 ฝากเงิน", 
-        "🏧 ถอนเงิน", 
-        "📊 ลงทุน",
-        "📜 ประวัติ"
-    ])
+    # Tax bracket info
+    with st.expander("📊 อัตราภาษีเงินได้บุคคลธรรมดา 2567", expanded=False):
+        bracket_df = _tax_bracket_df()
+        st.dataframe(bracket_df, use_container_width=True, hide_index=True)
     
-    # Deposit Tab
-    with tab_deposit:
-        st.markdown("### ฝากเงินเข้าพอร์ต")
+    # Inputs are batched in a form so editing them doesn't rerun the page
+    with st.form("tax_form"):
+        st.markdown("### 📝 กรอกข้อมูลรายได้")
         
-        with st.form("deposit_form"):
-            deposit_amount = st.number_input(
-                "จำนวนเงิน (บาท)",
-                min_value=0.0,
-                max_value=100000000.0,
-                value=100000.0,
-                step=10000.0,
-                format="%.2f"
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            gross_income = st.number_input(
+                "💵 รายได้รวมต่อปี (บาท)",
+                min_value=0,
+                max_value=100_000_000,
+                value=1_200_000,
+                step=100_000,
+                format="%d",
+                help="รายได้รวมก่อนหักค่าใช้จ่ายและลดหย่อน"
             )
-            deposit_desc = st.text_input("หมายเหตุ (ไม่บังคับ)", value="ฝากเงิน")
             
-            if st.form_submit_button("ฝากเงิน", type="primary", use_container_width=True):
-                if deposit_amount > 0:
-                    success, msg = portfolio_svc.deposit(user.id, deposit_amount, deposit_desc)
-                    if success:
-                        st.success(msg)
-                        st.rerun()
-                    else:
-                        st.error(msg)
-                else:
-                    st.error("กรุณาระบุจำนวนเงินที่มากกว่า 0")
-    
-    # Withdraw Tab
-    with tab_withdraw:
-        st.markdown("### ถอนเงินจากพอร์ต")
-        st.info(f"💵 ยอดเงินสดคงเหลือ: **฿{user_portfolio.cash_balance:,.2f}**")
+            marital_status = st.selectbox(
+                "👫 สถานะสมรส",
+                options=MARITAL_OPTIONS,
+                index=0
+            )
+            
+            num_children = st.number_input(
+                "👶 จำนวนบุตร",
+                min_value=0,
+                max_value=10,
+                value=0,
+                step=1
+            )
+            
+            num_parents = st.number_input(
+                "👴 จำนวนบิดามารดาที่เลี้ยงดู (สูงสุด 4)",
+                min_value=0,
+                max_value=4,
+                value=0,
+                step=1
+            )
         
-        with st.form("withdraw_form"):
-            withdraw_amount = st.number_input(
-                "จำนวนเงิน (บาท)",
-                min_value=0.0,
-                max_value=max(0.0, float(user_portfolio.cash_balance)),
-                value=min(50000.0, float(user_portfolio.cash_balance)),
-                step=10000.0,
-                format="%.2f"
+        with col2:
+            life_insurance = st.number_input(
+                "🛡️ เบี้ยประกันชีวิต (บาท)",
+                min_value=0,
+                max_value=100_000,
+                value=0,
+                step=10_000,
+                help="สูงสุด 100,000 บาท"
             )
-            withdraw_desc = st.text_input("หมายเหตุ (ไม่บังคับ)", value="ถอนเงิน", key="wd_desc")
             
-            if st.form_submit_button("ถอนเงิน", type="primary", use_container_width=True):
-                if withdraw_amount > 0:
-                    success, msg = portfolio_svc.withdraw(user.id, withdraw_amount, withdraw_desc)
-                    if success:
-                        st.success(msg)
-                        st.rerun()
-                    else:
-                        st.error(msg)
-                else:
-                    st.error("กรุณาระบุจำนวนเงินที่มากกว่า 0")
-    
-    # Invest Tab
-    with tab_invest:
-        st.markdown("### ลงทุนตามสัดส่วน")
-        
-        if user_portfolio.cash_balance <= 0:
-            st.warning("⚠️ ไม่มียอดเงินสดสำหรับลงทุน กรุณาฝากเงินก่อน")
-        else:
-            st.info(f"💵 เงินสดพร้อมลงทุน: **฿{user_portfolio.cash_balance:,.2f}**")
-            
-            st.markdown("#### เลือกสัดส่วนการลงทุน")
-            
-            # Allocation sliders
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                thai_alloc = st.slider("🇹🇭 หุ้นไทย", 0, 100, 25, 5, format="%d%%", key="thai_alloc")
-                us_alloc = st.slider("🇺🇸 หุ้นเทคโนโลยี US", 0, 100, 35, 5, format="%d%%", key="us_alloc")
-            
-            with col2:
-                gold_alloc = st.slider("🪙 ทองคำ", 0, 100, 20, 5, format="%d%%", key="gold_alloc")
-                bonds_alloc = st.slider("📜 พันธบัตร", 0, 100, 20, 5, format="%d%%", key="bonds_alloc")
+            health_insurance = st.number_input(
+                "🏥 เบี้ยประกันสุขภาพ (บาท)",
+                min_value=0,
+                max_value=25_000,
+                value=0,
+                step=5_000,
+                help="สูงสุด 25,000 บาท"
+            )
             
-            total_alloc = thai_alloc + us_alloc + gold_alloc + bonds_alloc
+            social_security = st.number_input(
+                "📋 เงินสมทบประกันสังคม (บาท)",
+                min_value=0,
+                max_value=9_000,
+                value=9_000,
+                step=1_000,
+                help="สูงสุด 9,000 บาท"
+            )
             
-            if total_alloc != 100:
-                st.warning(f"⚠️ สัดส่วนรวม: **{total_alloc}%** (ต้องเท่ากับ 100%)")
-            else:
-                st.success(f"✅ สัดส่วนรวม: **{total_alloc}%**")
-                
-                # Preview allocation
-                alloc_preview = {
-                    "Thai Stock": f"฿{user_portfolio.cash_balance * thai_alloc / 100:,.0f}",
-                    "US Tech": f"฿{user_portfolio.cash_balance * us_alloc / 100:,.0f}",
-                    "Gold": f"฿{user_portfolio.cash_balance * gold_alloc / 100:,.0f}",
-                    "Bonds": f"฿{user_portfolio.cash_balance * bonds_alloc / 100:,.0f}"
-                }
-                st.markdown("**ตัวอย่างการจัดสรร:**")
-                st.json(alloc_preview)
-                
-                if st.button("ยืนยันลงทุน", type="primary", use_container_width=True):
-                    allocation = {
-                        "Thai Stock": thai_alloc / 100,
-                        "US Tech": us_alloc / 100,
-                        "Gold": gold_alloc / 100,
-                        "Bonds": bonds_alloc / 100
-                    }
-                    success, msg = portfolio_svc.invest(user.id, allocation)
-                    if success:
-                        st.success(msg)
-                        st.rerun()
-                    else:
-                        st.error(msg)
-    
-    # Transaction History Tab
-    with tab_history:
-        st.markdown("### ประวัติธุรกรรม")
+            provident_fund = st.number_input(
+                "🏦 กองทุนสำรองเลี้ยงชีพ (บาท)",
+                min_value=0,
+                max_value=500_000,
+                value=0,
+                step=10_000,
+                help="สูงสุด 15% ของเงินเดือน หรือ 500,000 บาท"
+            )
         
-        transactions = portfolio_svc.get_transactions(user.id, limit=20)
+        st.markdown("---")
+        st.markdown("### 📈 SSF/RMF ที่ซื้อแล้วในปีนี้")
         
-        if not transactions:
-            st.info("ยังไม่มีประวัติธุรกรรม")
-        else:
-            # Create table data
-            tx_data = []
-            for tx in transactions:
-                tx_type_th = {
-                    TransactionType.DEPOSIT: "💳 ฝากเงิน",
-                    TransactionType.WITHDRAW: "🏧 ถอนเงิน",
-                    TransactionType.BUY: "📈 ซื้อ",
-                    TransactionType.SELL: "📉 ขาย",
-                    TransactionType.REBALANCE: "⚖️ ปรับสมดุล"
-                }
-                tx_data.append({
-                    "วันที่": tx.created_at.strftime("%Y-%m-%d %H:%M") if tx.created_at else "-",
-                    "ประเภท": tx_type_th.get(tx.type, str(tx.type)),
-                    "จำนวน": f"฿{tx.amount:,.2f}",
-                    "รายละเอียด": tx.description or "-"
-                })
-            
-            st.dataframe(tx_data, use_container_width=True, hide_index=True)
-
-
-# =============================================================================
-# BLACK-LITTERMAN PAGE
-# =============================================================================
-
-elif selected == "Black-Litterman":
-    st.markdown("""
-    <h1 style='margin-bottom: 0.5rem;'>
-        <span style='background: linear-gradient(135deg, #00D26A 0%, #FFD700 100%);
-        -webkit-background-clip: text; -webkit-text-fill-color: transparent;'>
-        🧠 Black-Litterman Optimizer
-        </span>
-    </h1>
-    <p style='color: #888; margin-bottom: 2rem; font-size: 1.1rem;'>
-        ผสานมุมมองตลาดกับความคิดเห็นของคุณเพื่อหาสัดส่วนที่เหมาะสม
-    </p>
-    """, unsafe_allow_html=True)
-    
-    # Explanation card
-    with st.expander("ℹ️ Black-Litterman ทำงานอย่างไร?", expanded=False):
-        st.markdown("""
-        **โมเดล Black-Litterman** เป็นเทคนิคการปรับพอร์ตขั้นสูงที่:
+        col1, col2 = st.columns(2)
         
-        1. **เริ่มจากจุดสมดุลตลาด** - ใช้สัดส่วนตามมูลค่าตลาดเป็นฐาน
-        2. **รับมุมมองของคุณ** - ให้คุณแสดงความคาดหวังต่อสินทรัพย์แต่ละตัว
-        3. **สร้างผลตอบแทนปรับปรุง** - รวมจุดสมดุลกับมุมมองโดยใช้สถิติ Bayesian
-        4. **หาสัดส่วนที่เหมาะสม** - หาน้ำหนักที่เพิ่มผลตอบแทนต่อความเสี่ยงสูงสุด
+        with col1:
+            existing_ssf = st.number_input(
+                "📊 SSF ที่ซื้อแล้ว (บาท)",
+                min_value=0,
+                max_value=200_000,
+                value=0,
+                step=10_000,
+                help="Super Savings Fund - สูงสุด 30% ของรายได้ หรือ 200,000 บาท"
+            )
         
-        วิธีนี้หลีกเลี่ยงการจัดสรรแบบสุดโต่งที่มักเกิดจาก Mean-Variance Optimization แบบดั้งเดิม
-        """)
-    
-    st.markdown("### 🎯 ใส่มุมมองการลงทุนของคุณ")
-    st.markdown("*ปรับ slider เพื่อระบุผลตอบแทนส่วนเกินที่คาดหวังสำหรับแต่ละสินทรัพย์*")
-    
-    # View input sliders
-    views = {}
-    confidences = {}
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.markdown("#### มุมมองต่อสินทรัพย์ (ผลตอบแทนส่วนเกินที่คาดหวัง)")
+        with col2:
+            existing_rmf = st.number_input(
+                "📈 RMF ที่ซื้อแล้ว (บาท)",
+                min_value=0,
+                max_value=500_000,
+                value=0,
+                step=10_000,
+                help="Retirement Mutual Fund - สูงสุด 30% ของรายได้ หรือ 500,000 บาท"
+            )
         
-        thai_view = st.slider(
-            "🇹🇭 หุ้นไทย",
-            min_value=-10.0, max_value=10.0, value=0.0, step=0.5,
-            format="%.1f%%",
-            help="ผลตอบแทนส่วนเกินที่คุณคาดหวังเทียบกับจุดสมดุล"
-        )
-        if thai_view != 0:
-            views["Thai Stock"] = thai_view / 100
+        st.markdown("---")
         
-        us_view = st.slider(
-            "🇺🇸 หุ้นเทคโนโลยี US",
-            min_value=-10.0, max_value=10.0, value=5.0, step=0.5,
-            format="%.1f%%"
+        submitted = st.form_submit_button("🧮 คำนวณภาษีและคำแนะนำ", type="primary")
+    
+    if submitted:
+        # Create deductions object
+        deductions = TaxDeductions(
+            spouse=60_000 if "ไม่มีรายได้" in marital_status else 0,
+            children=num_children,
+            parents=num_parents,
+            life_insurance=life_insurance,
+            health_insurance=health_insurance,
+            social_security=social_security,
+            provident_fund=provident_fund,
+            ssf_current=existing_ssf,
+            rmf_current=existing_rmf
         )
-        if us_view != 0:
-            views["US Tech"] = us_view / 100
         
-        gold_view = st.slider(
-            "🪙 ทองคำ",
-            min_value=-10.0, max_value=10.0, value=0.0, step=0.5,
-            format="%.1f%%"
-        )
-        if gold_view != 0:
-            views["Gold"] = gold_view / 100
+        # Calculate tax and SSF/RMF recommendation (cached per input set)
+        ded_tuple = astuple(deductions)
+        tax_result = _tax(gross_income, ded_tuple)
+        recommendation = _ssf_rmf(gross_income, ded_tuple)
         
-        bonds_view = st.slider(
-            "📜 พันธบัตร",
-            min_value=-10.0, max_value=10.0, value=0.0, step=0.5,
-            format="%.1f%%"
-        )
-        if bonds_view != 0:
-            views["Bonds"] = bonds_view / 100
-    
-    with col2:
-        st.markdown("#### ระดับความมั่นใจ (คุณมั่นใจแค่ไหน?)")
+        # Display results
+        st.markdown("### 📊 ผลการคำนวณภาษี")
         
-        asset_names_th = {"Thai Stock": "หุ้นไทย", "US Tech": "หุ้นเทคโนโลยี US", "Gold": "ทองคำ", "Bonds": "พันธบัตร"}
+        col1, col2, col3, col4 = st.columns(4)
         
-        for asset in ["Thai Stock", "US Tech", "Gold", "Bonds"]:
-            if asset in views:
-                conf = st.slider(
-                    f"ความมั่นใจใน{asset_names_th[asset]}",
-                    min_value=0.1, max_value=1.0, value=0.5, step=0.1,
-                    key=f"conf_{asset}",
-                    help="1.0 = มั่นใจมาก, 0.1 = ไม่แน่ใจ"
-                )
-                confidences[asset] = conf
-    
-    st.markdown("---")
-    
-    # Advanced settings
-    with st.expander("⚙️ ตั้งค่าขั้นสูง"):
-        col1, col2 = st.columns(2)
         with col1:
-            tau = st.slider(
-                "Tau (ความไม่แน่นอนในจุดสมดุล)",
-                min_value=0.01, max_value=0.20, value=0.05, step=0.01,
-                help="ค่าต่ำ = เชื่อถือจุดสมดุลตลาดมากขึ้น"
+            st.metric(
+                "💰 เงินได้สุทธิ",
+                f"฿{tax_result.net_income:,.0f}",
+                f"ฐาน {tax_result.tax_bracket}"
             )
+        
         with col2:
-            risk_aversion = st.slider(
-                "ค่าสัมประสิทธิ์ความเสี่ยง",
-                min_value=1.0, max_value=5.0, value=2.5, step=0.5,
-                help="ค่าสูง = การจัดสรรอนุรักษ์นิยมมากขึ้น"
+            st.metric(
+                "📋 ภาษีที่ต้องจ่าย",
+                f"฿{tax_result.tax_after_deduction:,.0f}",
+                f"อัตราที่แท้จริง {tax_result.effective_rate:.2f}%"
             )
-    
-    # Calculate and display results
-    if st.button("🚀 คำนวณสัดส่วนที่เหมาะสม", type="primary"):
-        with st.spinner("กำลังประมวลผล Black-Litterman..."):
-            # Get equilibrium returns
-            equilibrium = calculate_equilibrium_returns(cov_matrix, market_caps, risk_aversion)
-            
-            # Run Black-Litterman
-            bl_returns, optimal_weights = black_litterman(
-                cov_matrix=cov_matrix,
-                market_weights=market_caps,
-                views=views if views else {},
-                view_confidences=confidences if confidences else None,
-                tau=tau,
-                risk_aversion=risk_aversion
+        
+        with col3:
+            st.metric(
+                "🎯 Marginal Rate",
+                f"{recommendation.marginal_rate*100:.0f}%",
+                "อัตราภาษีส่วนเพิ่ม"
+            )
+        
+        with col4:
+            st.metric(
+                "💵 ค่าลดหย่อนรวม",
+                f"฿{tax_result.total_deductions:,.0f}",
+                "รวมทุกรายการ"
             )
+        
+        st.markdown("---")
+        st.markdown("### 🎯 คำแนะนำ SSF/RMF")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.markdown("#### 📊 SSF (Super Savings Fund)")
             
-            st.markdown("### 📊 ผลลัพธ์การปรับพอร์ต")
+            ssf_progress = existing_ssf / recommendation.ssf_max_allowed * 100 if recommendation.ssf_max_allowed > 0 else 0
+            st.progress(min(ssf_progress / 100, 1.0))
             
-            col1, col2 = st.columns(2)
+            st.markdown(f"""
+            - **ซื้อแล้ว:** ฿{existing_ssf:,.0f}
+            - **ซื้อได้สูงสุด:** ฿{recommendation.ssf_max_allowed:,.0f}
+            - **แนะนำซื้อเพิ่ม:** 🟢 **฿{recommendation.ssf_recommended:,.0f}**
+            - **ประหยัดภาษีได้:** ฿{recommendation.ssf_tax_saving:,.0f}
+            """)
+        
+        with col2:
+            st.markdown("#### 📈 RMF (Retirement Mutual Fund)")
             
-            with col1:
-                st.markdown("#### เปรียบเทียบผลตอบแทนที่คาดหวัง")
-                
-                returns_df = pd.DataFrame({
-                    "สินทรัพย์": ["หุ้นไทย", "หุ้นเทคโนโลยี US", "ทองคำ", "พันธบัตร"],
-                    "จุดสมดุล (%)": (equilibrium.values * 100).round(2),
-                    "BL ปรับปรุง (%)": (bl_returns.values * 100).round(2)
-                })
-                
-                fig = go.Figure()
-                
-                fig.add_trace(go.Bar(
-                    x=returns_df["สินทรัพย์"],
-                    y=returns_df["จุดสมดุล (%)"],
-                    name="จุดสมดุลตลาด",
-                    marker_color='#666'
-                ))
-                
-                fig.add_trace(go.Bar(
-                    x=returns_df["สินทรัพย์"],
-                    y=returns_df["BL ปรับปรุง (%)"],
-                    name="BL ปรับปรุง",
-                    marker_color='#00D26A'
-                ))
-                
-                fig.update_layout(
-                    height=320,
-                    barmode='group',
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    font=dict(color='#fff', size=12),
-                    yaxis_title="ผลตอบแทนที่คาดหวัง (%)",
-                    legend=dict(orientation="h", yanchor="bottom", y=1.02, font=dict(size=12)),
-                    margin=dict(t=50, b=30)
-                )
-                
-                st.plotly_chart(fig, use_container_width=True)
+            rmf_progress = existing_rmf / recommendation.rmf_max_allowed * 100 if recommendation.rmf_max_allowed > 0 else 0
+            st.progress(min(rmf_progress / 100, 1.0))
             
-            with col2:
-                st.markdown("#### สัดส่วนที่แนะนำ")
-                
-                fig = go.Figure(go.Pie(
-                    labels=["หุ้นไทย", "หุ้นเทคโนโลยี US", "ทองคำ", "พันธบัตร"],
-                    values=optimal_weights.values,
-                    hole=0.6,
-                    marker_colors=['#00D26A', '#007AFF', '#FFD700', '#FF6B6B'],
-                    textinfo='label+percent',
-                    textfont_size=13
-                ))
-                
-                fig.update_layout(
-                    height=320,
-                    showlegend=False,
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    font=dict(color='#fff', size=12),
-                    margin=dict(t=20, b=20)
-                )
-                
-                st.plotly_chart(fig, use_container_width=True)
+            st.markdown(f"""
+            - **ซื้อแล้ว:** ฿{existing_rmf:,.0f}
+            - **ซื้อได้สูงสุด:** ฿{recommendation.rmf_max_allowed:,.0f}
+            - **แนะนำซื้อเพิ่ม:** 🟢 **฿{recommendation.rmf_recommended:,.0f}**
+            - **ประหยัดภาษีได้:** ฿{recommendation.rmf_tax_saving:,.0f}
+            """)
+        
+        # Summary box
+        st.markdown("---")
+        
+        if recommendation.total_tax_saving > 0:
+            st.success(f"""
+            ### 💰 สรุป: ถ้าซื้อ SSF/RMF ตามคำแนะนำ
             
-            # Comparison table
-            st.markdown("#### ตารางเปรียบเทียบ")
-            comparison = display_allocation_comparison(market_caps, optimal_weights)
-            comparison.columns = ["สินทรัพย์", "น้ำหนักตลาด", "น้ำหนัก BL", "ส่วนต่าง"]
-            comparison["สินทรัพย์"] = ["หุ้นไทย", "หุ้นเทคโนโลยี US", "ทองคำ", "พันธบัตร"]
-            comparison["น้ำหนักตลาด"] = (comparison["น้ำหนักตลาด"] * 100).round(1).astype(str) + "%"
-            comparison["น้ำหนัก BL"] = (comparison["น้ำหนัก BL"] * 100).round(1).astype(str) + "%"
-            comparison["ส่วนต่าง"] = (comparison["ส่วนต่าง"] * 100).round(1).astype(str) + "%"
+            - **SSF ซื้อเพิ่ม:** ฿{recommendation.ssf_recommended:,.0f}
+            - **RMF ซื้อเพิ่ม:** ฿{recommendation.rmf_recommended:,.0f}
+            - **รวมลงทุนเพิ่ม:** ฿{recommendation.ssf_recommended + recommendation.rmf_recommended:,.0f}
+            - **ประหยัดภาษีรวม:** 🎉 **฿{recommendation.total_tax_saving:,.0f}**
             
-            st.dataframe(comparison, use_container_width=True, hide_index=True)
-
+            📌 *กองทุนเกษียณรวม (SSF + RMF + กองทุนสำรองฯ) ใช้แล้ว ฿{recommendation.combined_current:,.0f} / ฿{recommendation.combined_max:,.0f}*
+            """)
+        else:
+            st.info("✅ คุณใช้สิทธิลดหย่อน SSF/RMF เต็มที่แล้ว!")
+        
+        st.warning("⚠️ **ข้อมูลนี้เป็นการประมาณการเท่านั้น** กรุณาปรึกษาผู้เชี่ยวชาญด้านภาษีก่อนตัดสินใจ")
 
-# =============================================================================
-# MONTE CARLO PAGE
-# =============================================================================
 
-elif selected == "Monte Carlo":
-    st.markdown("""
-    <h1 style='margin-bottom: 0.5rem;'>
-        <span style='background: linear-gradient(135deg, #00D26A 0%, #FFD700 100%);
-        -webkit-background-clip: text; -webkit-text-fill-color: transparent;'>
-        🎲 เครื่องจำลอง Monte Carlo
-        </span>
-    </h1>
-    <p style='color: #888; margin-bottom: 2rem; font-size: 1.1rem;'>
-        จำลองสถานการณ์ตลาดนับพันเพื่อวางแผนเกษียณอายุ
-    </p>
-    """, unsafe_allow_html=True)
+@st.fragment
+def _page_pdf_report():
+    """PDF report page (รายงาน PDF)."""
+    from pdf_generator import get_report_filename
     
-    # Input parameters
-    st.markdown("### 📝 พารามิเตอร์การจำลอง")
+    name, total, ytd, portfolio = (
+        client['name'], client['total_assets'], client['ytd_return'], client['portfolio']
+    )
     
-    col1, col2, col3 = st.columns(3)
+    page_header("📄", "สร้างรายงาน PDF", "ดาวน์โหลดรายงานสรุปพอร์ตโฟลิโอในรูปแบบ PDF")
     
-    with col1:
-        current_wealth = st.number_input(
-            "💰 เงินปัจจุบัน (บาท)",
-            min_value=100000,
-            max_value=100000000,
-            value=client['total_assets'],
-            step=100000,
-            format="%d"
-        )
+    st.markdown("### 📋 เลือกประเภทรายงาน")
     
-    with col2:
-        monthly_contribution = st.number_input(
-            "📥 เงินออมต่อเดือน (บาท)",
-            min_value=0,
-            max_value=1000000,
-            value=50000,
-            step=5000,
-            format="%d"
-        )
+    report_type = st.radio(
+        "เลือกรายงาน:",
+        options=REPORT_TYPES,
+        horizontal=True
+    )
     
-    with col3:
-        years_to_retire = st.number_input(
-            "📅 จำนวนปีถึงเกษียณ",
-            min_value=1,
-            max_value=50,
-            value=20,
-            step=1
-        )
+    st.markdown("---")
     
-    col1, col2, col3 = st.columns(3)
+    # Preview section
+    st.markdown("### 👁️ ตัวอย่างข้อมูลในรายงาน")
+    
+    col1, col2 = st.columns(2)
     
     with col1:
-        annual_return = st.slider(
-            "📈 ผลตอบแทนรายปีที่คาดหวัง (%)",
-            min_value=3.0, max_value=15.0, value=7.0, step=0.5
-        ) / 100
+        st.markdown("#### 📊 ข้อมูลลูกค้า")
+        st.markdown(f"""
+        - **ชื่อ:** {name}
+        - **สินทรัพย์รวม:** ฿{total:,.0f}
+        - **ผลตอบแทน YTD:** {ytd*100:.2f}%
+        - **วันที่รายงาน:** {pd.Timestamp.now().strftime('%d/%m/%Y')}
+        """)
     
     with col2:
-        annual_volatility = st.slider(
-            "📉 ความผันผวนรายปี (%)",
-            min_value=5.0, max_value=30.0, value=15.0, step=1.0
-        ) / 100
-    
-    with col3:
-        goal_amount = st.number_input(
-            "🎯 เป้าหมายเงินเกษียณ (บาท)",
-            min_value=1000000,
-            max_value=500000000,
-            value=30000000,
-            step=1000000,
-            format="%d"
-        )
+        st.markdown("#### 🥧 สัดส่วนพอร์ต")
+        for asset, weight in portfolio.items():
+            st.markdown(f"- **{ASSET_LABELS_TH.get(asset, asset)}:** {weight*100:.1f}%")
     
     st.markdown("---")
     
-    if st.button("🎲 รันจำลอง 1,000 ครั้ง", type="primary"):
-        with st.spinner("กำลังจำลอง Monte Carlo..."):
-            # Run simulation
-            result = run_monte_carlo(
-                current_wealth=current_wealth,
-                monthly_contribution=monthly_contribution,
-                years_to_retire=years_to_retire,
-                annual_return=annual_return,
-                annual_volatility=annual_volatility,
-                n_simulations=1000,
-                goal_amount=goal_amount
-            )
-            
-            # Summary metrics
-            st.markdown("### 📊 ผลลัพธ์การจำลอง")
-            
-            col1, col2, col3, col4 = st.columns(4)
-            
-            summary = summarize_simulation(result)
-            
-            with col1:
-                st.metric(
-                    "💵 มูลค่ามัธยฐาน",
-                    f"฿{summary['Median Final Value']:,.0f}",
-                    f"หลังจาก {years_to_retire} ปี"
-                )
-            
-            with col2:
-                st.metric(
-                    "📉 กรณีเลวร้าย (10%)",
-                    f"฿{summary['10th Percentile']:,.0f}",
-                    "ประมาณการอนุรักษ์นิยม"
-                )
-            
-            with col3:
-                st.metric(
-                    "📈 กรณีดีที่สุด (90%)",
-                    f"฿{summary['90th Percentile']:,.0f}",
-                    "ประมาณการมองบวก"
-                )
-            
-            with col4:
-                prob = result.probability_of_success * 100
-                st.metric(
-                    "🎯 โอกาสสำเร็จ",
-                    f"{prob:.1f}%",
-                    "เหนือเป้าหมาย" if prob >= 70 else "ต่ำกว่าเป้าหมาย",
-                    delta_color="normal" if prob >= 70 else "inverse"
-                )
-            
-            # Projection chart
-            st.markdown("### 📈 การคาดการณ์มูลค่าพอร์ต (Percentile 10 / 50 / 90)")
-            
-            fig = go.Figure()
-            
-            # Add percentile bands
-            fig.add_trace(go.Scatter(
-                x=result.years,
-                y=result.percentile_90,
-                mode='lines',
-                name='กรณีดีที่สุด (Percentile 90)',
-                line=dict(color='#00D26A', width=1, dash='dot'),
-                fill=None
-            ))
-            
-            fig.add_trace(go.Scatter(
-                x=result.years,
-                y=result.percentile_10,
-                mode='lines',
-                name='กรณีเลวร้าย (Percentile 10)',
-                line=dict(color='#FF6B6B', width=1, dash='dot'),
-                fill='tonexty',
-                fillcolor='rgba(0, 210, 106, 0.1)'
-            ))
+    # Generate button
+    if st.button("📥 สร้างและดาวน์โหลด PDF", type="primary"):
+        future = _worker_pool().submit(
+            _pdf, report_type, name, total, ytd,
+            tuple(portfolio.items()), tuple(client['target_allocation'].items())
+        )
+        with st.spinner("กำลังสร้างรายงาน PDF..."):
+            pdf_bytes = future.result()
             
-            fig.add_trace(go.Scatter(
-                x=result.years,
-                y=result.percentile_50,
-                mode='lines',
-                name='กรณีฐาน (Percentile 50)',
-                line=dict(color='#FFD700', width=3)
-            ))
+            # Create download button
+            filename = get_report_filename(name, "portfolio")
             
-            # Add goal line
-            fig.add_hline(
-                y=goal_amount, 
-                line_dash="dash", 
-                line_color="#888",
-                annotation_text=f"เป้าหมาย: ฿{goal_amount:,.0f}",
-                annotation_position="right"
+            st.download_button(
+                label="📄 ดาวน์โหลด PDF",
+                data=pdf_bytes,
+                file_name=filename,
+                mime="application/pdf",
+                type="secondary"
             )
             
-            fig.update_layout(
-                height=450,
-                xaxis_title="ปี",
-                yaxis_title="มูลค่าพอร์ต (บาท)",
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                font=dict(color='#fff', size=12),
-                legend=dict(
-                    orientation="h",
-                    yanchor="bottom",
-                    y=1.02,
-                    xanchor="right",
-                    x=1,
-                    font=dict(size=12)
-                ),
-                xaxis=dict(gridcolor='rgba(255,255,255,0.1)'),
-                yaxis=dict(gridcolor='rgba(255,255,255,0.1)', tickformat=',.0f'),
-                margin=dict(t=50, b=50)
+            st.success("✅ รายงาน PDF พร้อมดาวน์โหลดแล้ว!")
+    
+    # Info box
+    st.info("""
+    💡 **เคล็ดลับ:**
+    - รายงานสรุปพอร์ต: 1 หน้า สำหรับดูภาพรวม
+    - รายงานฉบับเต็ม: หลายหน้า รวมคำแนะนำและการวิเคราะห์
+    """)
+
+
+@st.fragment
+def _page_advisor_contact():
+    """Advisor contact page (ติดต่อที่ปรึกษา)."""
+    from line_notify import (
+        send_advisor_alert,
+        create_panic_alert,
+        test_line_notify,
+        set_line_token,
+        get_notify_status
+    )
+    
+    name, total = client['name'], client['total_assets']
+    
+    page_header("📞", "ติดต่อที่ปรึกษา", "ขอคำปรึกษาจากผู้เชี่ยวชาญเมื่อต้องการความช่วยเหลือ")
+    
+    # Check portfolio status
+    daily_change = -150000  # Simulated daily change
+    daily_change_pct = (daily_change / total) * 100 if total else 0.0
+    
+    # Alert section if portfolio is down
+    if daily_change < 0:
+        st.markdown("""
+        <div style='
+            background: linear-gradient(135deg, rgba(255, 107, 107, 0.2) 0%, rgba(255, 107, 107, 0.1) 100%);
+            border: 1px solid rgba(255, 107, 107, 0.5);
+            border-radius: 12px;
+            padding: 1.5rem;
+            margin-bottom: 2rem;
+        '>
+            <h3 style='color: #FF6B6B; margin: 0;'>⚠️ พอร์ตของคุณปรับลดลงวันนี้</h3>
+            <p style='color: #FF9999; margin: 0.5rem 0 0 0;'>
+                ไม่ต้องกังวล! ที่ปรึกษาของเราพร้อมช่วยเหลือคุณ
+            </p>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.metric(
+                "📉 การเปลี่ยนแปลงวันนี้",
+                f"฿{daily_change:,.0f}",
+                f"{daily_change_pct:.2f}%"
+            )
+        
+        with col2:
+            st.metric(
+                "💰 มูลค่าพอร์ตปัจจุบัน",
+                f"฿{total:,.0f}",
+                ""
+            )
+    
+    st.markdown("---")
+    
+    # Contact form
+    st.markdown("### 📝 ขอนัดพูดคุยกับที่ปรึกษา")
+    
+    # Inputs are batched in a form so typing doesn't rerun the page
+    with st.form("contact_form"):
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            contact_reason = st.selectbox(
+                "เหตุผลที่ต้องการพูดคุย",
+                options=CONTACT_REASONS
             )
             
-            st.plotly_chart(fig, use_container_width=True)
+            contact_phone = st.text_input(
+                "📞 เบอร์โทรศัพท์ติดต่อกลับ",
+                placeholder="08x-xxx-xxxx"
+            )
+        
+        with col2:
+            preferred_time = st.selectbox(
+                "ช่วงเวลาที่สะดวก",
+                options=CONTACT_TIMES
+            )
             
-            # Distribution of final values
-            col1, col2 = st.columns(2)
+            additional_note = st.text_area(
+                "📋 หมายเหตุเพิ่มเติม",
+                placeholder="ข้อมูลอื่นๆ ที่ต้องการแจ้ง...",
+                height=100
+            )
+        
+        submitted = st.form_submit_button("🚨 ส่งคำขอติดต่อที่ปรึกษา", type="primary")
+    
+    if submitted:
+        if not contact_phone:
+            st.error("กรุณากรอกเบอร์โทรศัพท์")
+        else:
+            # Create alert
+            alert = create_panic_alert(
+                client_name=name,
+                client_id=1,
+                portfolio_value=total,
+                daily_change=daily_change,
+                contact_phone=contact_phone
+            )
+            alert.alert_reason = f"{contact_reason} | เวลา: {preferred_time}"
             
-            with col1:
-                st.markdown("### 📊 การกระจายมูลค่าสุดท้าย")
-                
-                fig = go.Figure()
-                
-                fig.add_trace(go.Histogram(
-                    x=result.final_values,
-                    nbinsx=50,
-                    marker_color='#00D26A',
-                    opacity=0.7
-                ))
-                
-                fig.add_vline(
-                    x=goal_amount,
-                    line_dash="dash",
-                    line_color="#FFD700",
-                    annotation_text="เป้าหมาย"
-                )
-                
-                fig.update_layout(
-                    height=300,
-                    xaxis_title="มูลค่าพอร์ตสุดท้าย (บาท)",
-                    yaxis_title="ความถี่",
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    font=dict(color='#fff', size=12),
-                    xaxis=dict(gridcolor='rgba(255,255,255,0.1)', tickformat=',.0f'),
-                    yaxis=dict(gridcolor='rgba(255,255,255,0.1)'),
-                    margin=dict(t=20, b=50)
-                )
-                
-                st.plotly_chart(fig, use_container_width=True)
+            # Send notification
+            with st.spinner("กำลังส่งคำขอ..."):
+                result = send_advisor_alert(alert)
             
-            with col2:
-                st.markdown("### 💡 ข้อมูลสำคัญ")
-                
-                total_contribution = current_wealth + (monthly_contribution * 12 * years_to_retire)
-                median_gain = summary['Median Final Value'] - total_contribution
-                
-                st.success(f"""
-                **เงินลงทุนรวม:** ฿{total_contribution:,.0f}  
-                **มูลค่ามัธยฐาน:** ฿{summary['Median Final Value']:,.0f}  
-                **กำไรที่คาดหวัง:** ฿{median_gain:,.0f} ({median_gain/total_contribution*100:.1f}%)
-                """)
-                
-                if prob >= 80:
-                    st.info("✅ **ความมั่นใจสูง:** คุณมีโอกาสสำเร็จตามเป้าหมายสูงมาก!")
-                elif prob >= 60:
-                    st.warning("⚠️ **ความมั่นใจปานกลาง:** ควรพิจารณาเพิ่มเงินออมหรือขยายระยะเวลา")
+            if result.success:
+                if result.mock_mode:
+                    st.success("""
+                    ### ✅ บันทึกคำขอสำเร็จ!
+                    
+                    📌 **[Mock Mode]** ระบบบันทึกคำขอแล้ว
+                    
+                    เมื่อตั้งค่า LINE Notify Token แล้ว ที่ปรึกษาจะได้รับแจ้งเตือนทันที
+                    """)
+                    
+                    # Show what would be sent
+                    with st.expander("👁️ ตัวอย่างข้อความที่จะส่ง"):
+                        st.code(f"""
+🚨 แจ้งเตือนจากระบบ Wealth Advisor
+
+👤 ลูกค้า: {name} (ID: 1)
+💰 มูลค่าพอร์ต: ฿{total:,.0f}
+📉 เปลี่ยนแปลง: ฿{daily_change:+,.0f} ({daily_change_pct:+.2f}%)
+
+📋 เหตุผล: {contact_reason} | เวลา: {preferred_time}
+📞 โทร: {contact_phone}
+
+⏰ เวลา: {result.timestamp}
+                        """)
                 else:
-                    st.error("❌ **ความมั่นใจต่ำ:** คุณอาจต้องปรับแผนอย่างมาก")
+                    st.success("🎉 ส่งคำขอถึงที่ปรึกษาเรียบร้อยแล้ว! จะมีผู้ติดต่อกลับเร็วๆ นี้")
+                    st.balloons()
+            else:
+                st.error(f"❌ เกิดข้อผิดพลาด: {result.message}")
+    
+    st.markdown("---")
+    
+    # LINE Notify settings
+    with st.expander("⚙️ ตั้งค่า LINE Notify (สำหรับที่ปรึกษา)"):
+        notify_status = get_notify_status()
+        
+        if notify_status['mock_mode']:
+            st.warning("📌 ระบบอยู่ใน **Mock Mode** - ไม่ได้ส่ง LINE จริง")
+        else:
+            st.success("✅ ระบบเชื่อมต่อ LINE Notify แล้ว")
+        
+        line_token = st.text_input(
+            "LINE Notify Token",
+            type="password",
+            placeholder="วาง Token ที่นี่...",
+            help="ขอ Token ได้ที่ https://notify-bot.line.me/"
+        )
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            if st.button("💾 บันทึก Token"):
+                if set_line_token(line_token):
+                    st.success("✅ บันทึก Token สำเร็จ!")
+                    st.rerun()
+                else:
+                    st.error("❌ Token ไม่ถูกต้อง")
+        
+        with col2:
+            if st.button("🧪 ทดสอบส่ง LINE"):
+                result = test_line_notify(line_token if line_token else None)
+                if result.success:
+                    if result.mock_mode:
+                        st.info("📌 [Mock Mode] ข้อความถูกบันทึกแล้ว")
+                    else:
+                        st.success("✅ ส่ง LINE สำเร็จ!")
+                else:
+                    st.error(f"❌ Error: {result.message}")
 
 
 # =============================================================================
-# REBALANCING PAGE (ปรับสมดุล)
+# DASHBOARD PAGE (แดชบอร์ด)
 # =============================================================================
 
-elif selected == "ปรับสมดุล":
-    st.markdown("""
-    <h1 style='margin-bottom: 0.5rem;'>
-        <span style='background: linear-gradient(135deg, #00D26A 0%, #FFD700 100%);
-        -webkit-background-clip: text; -webkit-text-fill-color: transparent;'>
-        ⚖️ ระบบปรับสมดุลอัจฉริยะ
-        </span>
-    </h1>
-    <p style='color: #888; margin-bottom: 2rem; font-size: 1.1rem;'>
-        ติดตามการเบี่ยงเบนสัดส่วน และรับคำแนะนำการซื้อขาย
-    </p>
-    """, unsafe_allow_html=True)
+if selected == "แดชบอร์ด":
+    # Header
+    page_header("📊", "แดชบอร์ดพอร์ตโฟลิโอ", "ภาพรวมพอร์ตและผลการดำเนินงานแบบเรียลไทม์")
+    
+    # Key Metrics Row
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric(
+            label="💰 สินทรัพย์รวม",
+            value=f"฿{client['total_assets']:,.0f}",
+            delta="+฿350,000 เดือนนี้"
+        )
+    
+    with col2:
+        st.metric(
+            label="📈 ผลตอบแทน YTD",
+            value=f"{client['ytd_return']*100:.2f}%",
+            delta="+2.1% เหนือเกณฑ์"
+        )
     
-    # Current portfolio summary
-    st.markdown("### 📊 สถานะสัดส่วนปัจจุบัน")
+    # Risk, drift and diversification in one vectorized pass
+    risk_score, _, max_drift, diversification = calculate_dashboard_metrics(
+        client['asset_order'], client['weights'], client['target_allocation']
+    )
     
-    # Calculate drift
-    drift_df = calculate_drift(client['portfolio'], client['target_allocation'])
+    with col3:
+        st.metric(
+            label="⚠️ ระดับความเสี่ยง",
+            value=f"{risk_score}/10",
+            delta="ปานกลาง" if risk_score <= 6 else "สูง",
+            delta_color="off"
+        )
     
-    # Visual drift indicator
-    col1, col2 = st.columns([2, 1])
+    with col4:
+        st.metric(
+            label="📊 Sharpe Ratio",
+            value="1.42",
+            delta="+0.15 จากไตรมาสก่อน"
+        )
+    
+    st.markdown("<br>", unsafe_allow_html=True)
+    
+    # Charts Row: allocation donuts + 1y performance in one figure
+    st.markdown("### 🥧 สัดส่วนการลงทุน ปัจจุบัน vs เป้าหมาย  ·  📈 ผลการดำเนินงาน (1 ปี)")
+    
+    fig = build_dashboard_figure(
+        client['asset_order'],
+        tuple(float(w) for w in client['weights']),
+        tuple(client['target_allocation'].get(a, 0) for a in client['asset_order']),
+        prices.index[-1] if not prices.empty else None,
+        tuple(prices.columns),
+        prices.index,
+        normalized_np,
+        benchmark
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # Quick Insights
+    st.markdown("### 💡 ข้อมูลเชิงลึก")
+    
+    col1, col2, col3 = st.columns(3)
     
     with col1:
-        # Drift bar chart
-        fig = go.Figure()
-        
-        colors = ['#FF6B6B' if x > 0 else '#00D26A' for x in drift_df['Drift (%)']]
-        
-        asset_labels_th = ["หุ้นไทย", "หุ้นเทคโนโลยี US", "ทองคำ", "พันธบัตร"]
-        
-        fig.add_trace(go.Bar(
-            x=asset_labels_th,
-            y=drift_df['Drift (%)'],
-            marker_color=colors,
-            text=[f"{x:+.1f}%" for x in drift_df['Drift (%)']],
-            textposition='outside',
-            textfont=dict(size=14)
-        ))
-        
-        # Add threshold lines
-        fig.add_hline(y=5, line_dash="dash", line_color="#FFD700", 
-                      annotation_text="เกณฑ์ปรับสมดุล (+5%)")
-        fig.add_hline(y=-5, line_dash="dash", line_color="#FFD700",
-                      annotation_text="เกณฑ์ปรับสมดุล (-5%)")
-        
-        fig.update_layout(
-            height=380,
-            xaxis_title="",
-            yaxis_title="การเบี่ยงเบน (%)",
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            font=dict(color='#fff', size=13),
-            yaxis=dict(gridcolor='rgba(255,255,255,0.1)', range=[-15, 15]),
-            margin=dict(t=30, b=30)
-        )
-        
-        st.plotly_chart(fig, use_container_width=True)
+        if diversification >= 7:
+            st.info(f"🎯 **คะแนนกระจายความเสี่ยง:** {diversification:.1f}/10 - พอร์ตของคุณกระจายความเสี่ยงได้ดี")
+        else:
+            st.info(f"🎯 **คะแนนกระจายความเสี่ยง:** {diversification:.1f}/10 - ควรพิจารณากระจายความเสี่ยงเพิ่มเติม")
     
     with col2:
-        st.markdown("#### 📖 คำอธิบาย")
-        st.markdown("""
-        - 🔴 **เกินสัดส่วน:** ต้องขาย
-        - 🟢 **ต่ำกว่าสัดส่วน:** ต้องซื้อ
-        - ⚡ **เกณฑ์:** ±5% จะเรียกการปรับสมดุล
-        """)
-        
-        # Summary stats
-        max_over = drift_df['Drift (%)'].max()
-        max_under = drift_df['Drift (%)'].min()
-        
-        st.metric("เกินสัดส่วนสูงสุด", f"{max_over:+.1f}%")
-        st.metric("ต่ำกว่าสัดส่วนสูงสุด", f"{max_under:+.1f}%")
+        if max_drift > 5:
+            st.warning(f"⚠️ **แจ้งเตือน:** สัดส่วนเบี่ยงเบนสูงสุด {max_drift:.1f}% ควรพิจารณาปรับสมดุล")
+        else:
+            st.success("✅ **สถานะ:** พอร์ตอยู่ในช่วงเป้าหมาย")
     
-    st.markdown("---")
+    with col3:
+        st.info("📊 **มุมมองตลาด:** หุ้นเทคโนโลยี US มีโมเมนตัมที่ดี แนะนำรักษาสัดส่วน")
+
+
+# =============================================================================
+# PORTFOLIO MANAGEMENT PAGE (จัดการพอร์ต)
+# =============================================================================
+
+elif selected == "จัดการพอร์ต":
+    page_header("💼", "จัดการพอร์ตโฟลิโอ", "ฝากเงิน ถอนเงิน และจัดสรรการลงทุนของคุณ")
     
-    # Drift table
-    st.markdown("### 📋 รายละเอียดการเบี่ยงเบน")
+    # Get current user and portfolio
+    user = get_current_user()
+    portfolio_svc = get_portfolio_service()
+    user_portfolio = _cached_get_portfolio(user.id) if user else None
     
-    drift_df_th = drift_df.copy()
-    drift_df_th['Asset'] = ["หุ้นไทย", "หุ้นเทคโนโลยี US", "ทองคำ", "พันธบัตร"]
-    drift_df_th.columns = ['สินทรัพย์', 'ปัจจุบัน (%)', 'เป้าหมาย (%)', 'เบี่ยงเบน (%)', 'สถานะ']
-    drift_df_th['สถานะ'] = drift_df_th['สถานะ'].replace({
-        '🔴 Rebalance Needed': '🔴 ต้องปรับสมดุล',
-        '🟡 Monitor': '🟡 ควรติดตาม',
-        '🟢 On Target': '🟢 ตามเป้าหมาย'
-    })
+    if not user_portfolio:
+        st.error("ไม่พบข้อมูลพอร์ตโฟลิโอ กรุณาลองใหม่อีกครั้ง")
+        st.stop()
     
-    st.dataframe(drift_df_th, use_container_width=True, hide_index=True)
+    # Summary Cards
+    invested = user_portfolio.total_value - user_portfolio.cash_balance
+    ytd = user_portfolio.ytd_return
+    st.markdown(metric_row_html([
+        ("💰 มูลค่ารวม", f"฿{user_portfolio.total_value:,.0f}", "ทั้งหมด", "up"),
+        ("💵 เงินสด", f"฿{user_portfolio.cash_balance:,.0f}", "พร้อมลงทุน", "up"),
+        ("📈 ลงทุนแล้ว", f"฿{invested:,.0f}",
+         f"{ytd*100:.1f}% YTD" if ytd else "0%", "down" if ytd and ytd < 0 else "up"),
+        ("⚠️ ระดับความเสี่ยง", f"{user_portfolio.risk_score}/10",
+         "ปานกลาง" if user_portfolio.risk_score <= 6 else "สูง", "off"),
+    ]), unsafe_allow_html=True)
     
-    st.markdown("---")
+    st.markdown("<br>", unsafe_allow_html=True)
     
-    # Action Plan
-    st.markdown("### 🎯 แผนการดำเนินการที่แนะนำ")
+    # Tabs for different actions
+    tab_deposit, tab_withdraw, tab_invest, tab_history = st.tabs([
+        "💳 ฝากเงิน", 
+        "🏧 ถอนเงิน", 
+        "📊 ลงทุน",
+        "📜 ประวัติ"
+    ])
     
-    # Drift threshold setting
-    threshold = st.slider(
-        "เกณฑ์การปรับสมดุล (%)",
-        min_value=1.0, max_value=10.0, value=5.0, step=0.5,
-        help="สร้างคำสั่งซื้อขายเฉพาะสินทรัพย์ที่เบี่ยงเบนเกินเกณฑ์นี้"
-    ) / 100
+    # Deposit Tab
+    with tab_deposit:
+        st.markdown("### ฝากเงินเข้าพอร์ต")
+        
+        with st.form("deposit_form"):
+            deposit_amount = st.number_input(
+                "จำนวนเงิน (บาท)",
+                min_value=0.0,
+                max_value=100000000.0,
+                value=100000.0,
+                step=10000.0,
+                format="%.2f"
+            )
+            deposit_desc = st.text_input("หมายเหตุ (ไม่บังคับ)", value="ฝากเงิน")
+            
+            if st.form_submit_button("ฝากเงิน", type="primary", use_container_width=True):
+                if deposit_amount > 0:
+                    success, msg = portfolio_svc.deposit(user.id, deposit_amount, deposit_desc)
+                    if success:
+                        st.success(msg)
+                        invalidate_user_caches(user.id)
+                        st.rerun()
+                    else:
+                        st.error(msg)
+                else:
+                    st.error("กรุณาระบุจำนวนเงินที่มากกว่า 0")
     
-    # Generate and display action plan
-    actions = generate_action_plan(
-        current_weights=client['portfolio'],
-        target_weights=client['target_allocation'],
-        portfolio_value=client['total_assets'],
-        drift_threshold=threshold
-    )
+    # Withdraw Tab
+    with tab_withdraw:
+        st.markdown("### ถอนเงินจากพอร์ต")
+        st.info(f"💵 ยอดเงินสดคงเหลือ: **฿{user_portfolio.cash_balance:,.2f}**")
+        
+        cash_f = max(0.0, float(user_portfolio.cash_balance or 0.0))
+        with st.form("withdraw_form"):
+            withdraw_amount = st.number_input(
+                "จำนวนเงิน (บาท)",
+                min_value=0.0,
+                max_value=cash_f,
+                value=min(50000.0, cash_f),
+                step=10000.0,
+                format="%.2f"
+            )
+            withdraw_desc = st.text_input("หมายเหตุ (ไม่บังคับ)", value="ถอนเงิน", key="wd_desc")
+            
+            if st.form_submit_button("ถอนเงิน", type="primary", use_container_width=True):
+                if withdraw_amount > 0:
+                    success, msg = portfolio_svc.withdraw(user.id, withdraw_amount, withdraw_desc)
+                    if success:
+                        st.success(msg)
+                        invalidate_user_caches(user.id)
+                        st.rerun()
+                    else:
+                        st.error(msg)
+                else:
+                    st.error("กรุณาระบุจำนวนเงินที่มากกว่า 0")
     
-    if actions:
-        # Create Thai action plan table
-        action_data = []
-        for action in actions:
-            asset_th = {"Thai Stock": "หุ้นไทย", "US Tech": "หุ้นเทคโนโลยี US", "Gold": "ทองคำ", "Bonds": "พันธบัตร"}
-            action_data.append({
-                "การดำเนินการ": f"{'🔻 ขาย' if action.action == 'SELL' else '🔺 ซื้อ'}",
-                "สินทรัพย์": asset_th.get(action.asset, action.asset),
-                "จำนวนหน่วย": f"{action.trade_units:,}",
-                "มูลค่า": f"฿{action.trade_amount:,.0f}",
-                "ปัจจุบัน → เป้าหมาย": f"{action.current_weight*100:.1f}% → {action.target_weight*100:.1f}%"
-            })
+    # Invest Tab
+    with tab_invest:
+        st.markdown("### ลงทุนตามสัดส่วน")
         
-        action_df = pd.DataFrame(action_data)
-        st.dataframe(action_df, use_container_width=True, hide_index=True)
+        if user_portfolio.cash_balance <= 0:
+            st.warning("⚠️ ไม่มียอดเงินสดสำหรับลงทุน กรุณาฝากเงินก่อน")
+        else:
+            st.info(f"💵 เงินสดพร้อมลงทุน: **฿{user_portfolio.cash_balance:,.2f}**")
+            
+            st.markdown("#### เลือกสัดส่วนการลงทุน")
+            
+            # Allocation sliders
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                thai_alloc = st.slider("🇹🇭 หุ้นไทย", 0, 100, 25, 5, format="%d%%", key="thai_alloc")
+                us_alloc = st.slider("🇺🇸 หุ้นเทคโนโลยี US", 0, 100, 35, 5, format="%d%%", key="us_alloc")
+            
+            with col2:
+                gold_alloc = st.slider("🪙 ทองคำ", 0, 100, 20, 5, format="%d%%", key="gold_alloc")
+                bonds_alloc = st.slider("📜 พันธบัตร", 0, 100, 20, 5, format="%d%%", key="bonds_alloc")
+            
+            total_alloc = thai_alloc + us_alloc + gold_alloc + bonds_alloc
+            
+            if total_alloc != 100:
+                st.warning(f"⚠️ สัดส่วนรวม: **{total_alloc}%** (ต้องเท่ากับ 100%)")
+            else:
+                st.success(f"✅ สัดส่วนรวม: **{total_alloc}%**")
+                
+                # Preview allocation
+                allocs = np.array([thai_alloc, us_alloc, gold_alloc, bonds_alloc], dtype=np.float64) / 100
+                amounts = allocs * float(user_portfolio.cash_balance)
+                alloc_preview = dict(zip(DEFAULT_ASSET_ORDER, pd.Series(amounts).map("฿{:,.0f}".format)))
+                st.markdown("**ตัวอย่างการจัดสรร:**")
+                st.json(alloc_preview)
+                
+                if st.button("ยืนยันลงทุน", type="primary", use_container_width=True):
+                    allocation = dict(zip(DEFAULT_ASSET_ORDER, allocs.tolist()))
+                    success, msg = portfolio_svc.invest(user.id, allocation)
+                    if success:
+                        st.success(msg)
+                        invalidate_user_caches(user.id)
+                        st.rerun()
+                    else:
+                        st.error(msg)
+    
+    # Transaction History Tab
+    with tab_history:
+        st.markdown("### ประวัติธุรกรรม")
         
-        # Summary
-        total_trades = sum(a.trade_amount for a in actions)
-        st.info(f"💰 **มูลค่าการซื้อขายรวม:** ฿{total_trades:,.0f}")
+        # Read in the script thread, after any deposit/withdraw/invest above
+        # has run invalidate_user_caches, so no stale list is cached back
+        transactions = _cached_tx_list(user.id, 20)
         
-        # Execution button (simulated)
-        if st.button("✅ ดำเนินการปรับสมดุล", type="primary"):
-            st.success("🎉 คำสั่งปรับสมดุลถูกส่งไปดำเนินการแล้ว!")
-            st.balloons()
-    else:
-        st.success("✅ **ไม่ต้องปรับสมดุล** - พอร์ตของคุณอยู่ในสัดส่วนเป้าหมายแล้ว!")
+        if not transactions:
+            st.info("ยังไม่มีประวัติธุรกรรม")
+        else:
+            # Create table data column-wise
+            df = pd.DataFrame.from_records(
+                [(tx.created_at, tx.type, tx.amount, tx.description) for tx in transactions],
+                columns=["created_at", "type", "amount", "description"]
+            )
+            tx_table = pd.DataFrame({
+                "วันที่": pd.to_datetime(df["created_at"]).dt.strftime("%Y-%m-%d %H:%M").fillna("-"),
+                "ประเภท": df["type"].map(TX_LABELS).fillna(df["type"].astype(str)).astype("category"),
+                "จำนวน": "฿" + df["amount"].map("{:,.2f}".format),
+                "รายละเอียด": df["description"].fillna("-").replace("", "-")
+            })
+            
+            st.dataframe(tx_table, use_container_width=True, hide_index=True)
 
 
 # =============================================================================
-# TAX OPTIMIZER PAGE (วางแผนภาษี)
+# BLACK-LITTERMAN PAGE
 # =============================================================================
 
-elif selected == "วางแผนภาษี":
-    st.markdown("""
-    <h1 style='margin-bottom: 0.5rem;'>
-        <span style='background: linear-gradient(135deg, #00D26A 0%, #FFD700 100%);
-        -webkit-background-clip: text; -webkit-text-fill-color: transparent;'>
-        🧮 วางแผนภาษีและ SSF/RMF
-        </span>
-    </h1>
-    <p style='color: #888; margin-bottom: 2rem; font-size: 1.1rem;'>
-        คำนวณภาษีตามอัตรา 2567 และแนะนำการลงทุน SSF/RMF ที่เหมาะสม
-    </p>
-    """, unsafe_allow_html=True)
+elif selected == "Black-Litterman":
+    import plotly.graph_objects as go
     
-    # Tax bracket info
-    with st.expander("📊 อัตราภาษีเงินได้บุคคลธรรมดา 2567", expanded=False):
-        brackets = get_tax_bracket_info()
-        bracket_df = pd.DataFrame(brackets)
-        bracket_df.columns = ["เงินได้สุทธิ (บาท)", "อัตราภาษี", "อัตรา (%)"]
-        st.dataframe(bracket_df, use_container_width=True, hide_index=True)
+    page_header("🧠", "Black-Litterman Optimizer", "ผสานมุมมองตลาดกับความคิดเห็นของคุณเพื่อหาสัดส่วนที่เหมาะสม")
     
-    st.markdown("### 📝 กรอกข้อมูลรายได้")
+    # Explanation card
+    with st.expander("ℹ️ Black-Litterman ทำงานอย่างไร?", expanded=False):
+        st.markdown("""
+        **โมเดล Black-Litterman** เป็นเทคนิคการปรับพอร์ตขั้นสูงที่:
+        
+        1. **เริ่มจากจุดสมดุลตลาด** - ใช้สัดส่วนตามมูลค่าตลาดเป็นฐาน
+        2. **รับมุมมองของคุณ** - ให้คุณแสดงความคาดหวังต่อสินทรัพย์แต่ละตัว
+        3. **สร้างผลตอบแทนปรับปรุง** - รวมจุดสมดุลกับมุมมองโดยใช้สถิติ Bayesian
+        4. **หาสัดส่วนที่เหมาะสม** - หาน้ำหนักที่เพิ่มผลตอบแทนต่อความเสี่ยงสูงสุด
+        
+        วิธีนี้หลีกเลี่ยงการจัดสรรแบบสุดโต่งที่มักเกิดจาก Mean-Variance Optimization แบบดั้งเดิม
+        """)
     
-    col1, col2 = st.columns(2)
+    st.markdown("### 🎯 ใส่มุมมองการลงทุนของคุณ")
+    st.markdown("*ปรับ slider เพื่อระบุผลตอบแทนส่วนเกินที่คาดหวังสำหรับแต่ละสินทรัพย์*")
     
-    with col1:
-        gross_income = st.number_input(
-            "💵 รายได้รวมต่อปี (บาท)",
-            min_value=0,
-            max_value=100_000_000,
-            value=1_200_000,
-            step=100_000,
-            format="%d",
-            help="รายได้รวมก่อนหักค่าใช้จ่ายและลดหย่อน"
-        )
-        
-        marital_status = st.selectbox(
-            "👫 สถานะสมรส",
-            options=["โสด", "สมรส (คู่สมรสไม่มีรายได้)", "สมรส (คู่สมรสมีรายได้)"],
-            index=0
-        )
+    # Sliders are batched in a form so dragging them doesn't rerun the page
+    with st.form("bl_form"):
+        col1, col2 = st.columns(2)
         
-        num_children = st.number_input(
-            "👶 จำนวนบุตร",
-            min_value=0,
-            max_value=10,
-            value=0,
-            step=1
-        )
+        with col1:
+            st.markdown("#### มุมมองต่อสินทรัพย์ (ผลตอบแทนส่วนเกินที่คาดหวัง)")
+            
+            view_vals = {
+                asset: st.slider(
+                    label,
+                    min_value=-10.0, max_value=10.0, value=default, step=0.5,
+                    format="%.1f%%",
+                    key=f"view_{asset}",
+                    help="ผลตอบแทนส่วนเกินที่คุณคาดหวังเทียบกับจุดสมดุล"
+                )
+                for asset, label, default in BL_VIEW_INPUTS
+            }
+            views = {asset: v / 100 for asset, v in view_vals.items() if v != 0}
         
-        num_parents = st.number_input(
-            "👴 จำนวนบิดามารดาที่เลี้ยงดู (สูงสุด 4)",
-            min_value=0,
-            max_value=4,
-            value=0,
-            step=1
-        )
-    
-    with col2:
-        life_insurance = st.number_input(
-            "🛡️ เบี้ยประกันชีวิต (บาท)",
-            min_value=0,
-            max_value=100_000,
-            value=0,
-            step=10_000,
-            help="สูงสุด 100,000 บาท"
-        )
+        with col2:
+            st.markdown("#### ระดับความมั่นใจ (คุณมั่นใจแค่ไหน?)")
+            
+            # Inside a form the view values are only known on submit, so show
+            # every confidence slider and keep the ones that have a view
+            conf_vals = {
+                asset: st.slider(
+                    f"ความมั่นใจใน{ASSET_LABELS_TH[asset]}",
+                    min_value=0.1, max_value=1.0, value=0.5, step=0.1,
+                    key=f"conf_{asset}",
+                    help="1.0 = มั่นใจมาก, 0.1 = ไม่แน่ใจ"
+                )
+                for asset, _, _ in BL_VIEW_INPUTS
+            }
+            confidences = {asset: c for asset, c in conf_vals.items() if asset in views}
         
-        health_insurance = st.number_input(
-            "🏥 เบี้ยประกันสุขภาพ (บาท)",
-            min_value=0,
-            max_value=25_000,
-            value=0,
-            step=5_000,
-            help="สูงสุด 25,000 บาท"
-        )
+        st.markdown("---")
         
-        social_security = st.number_input(
-            "📋 เงินสมทบประกันสังคม (บาท)",
-            min_value=0,
-            max_value=9_000,
-            value=9_000,
-            step=1_000,
-            help="สูงสุด 9,000 บาท"
-        )
+        # Advanced settings
+        with st.expander("⚙️ ตั้งค่าขั้นสูง"):
+            col1, col2 = st.columns(2)
+            with col1:
+                tau = st.slider(
+                    "Tau (ความไม่แน่นอนในจุดสมดุล)",
+                    min_value=0.01, max_value=0.20, value=0.05, step=0.01,
+                    help="ค่าต่ำ = เชื่อถือจุดสมดุลตลาดมากขึ้น"
+                )
+            with col2:
+                risk_aversion = st.slider(
+                    "ค่าสัมประสิทธิ์ความเสี่ยง",
+                    min_value=1.0, max_value=5.0, value=2.5, step=0.5,
+                    help="ค่าสูง = การจัดสรรอนุรักษ์นิยมมากขึ้น"
+                )
         
-        provident_fund = st.number_input(
-            "🏦 กองทุนสำรองเลี้ยงชีพ (บาท)",
-            min_value=0,
-            max_value=500_000,
-            value=0,
-            step=10_000,
-            help="สูงสุด 15% ของเงินเดือน หรือ 500,000 บาท"
-        )
-    
-    st.markdown("---")
-    st.markdown("### 📈 SSF/RMF ที่ซื้อแล้วในปีนี้")
+        # Calculate and display results
+        submitted = st.form_submit_button("🚀 คำนวณสัดส่วนที่เหมาะสม", type="primary")
     
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        existing_ssf = st.number_input(
-            "📊 SSF ที่ซื้อแล้ว (บาท)",
-            min_value=0,
-            max_value=200_000,
-            value=0,
-            step=10_000,
-            help="Super Savings Fund - สูงสุด 30% ของรายได้ หรือ 200,000 บาท"
-        )
+    if submitted:
+        with st.spinner("กำลังประมวลผล Black-Litterman..."):
+            # Get equilibrium returns and run Black-Litterman
+            equilibrium, bl_returns, optimal_weights = run_black_litterman(
+                cov_hash,
+                tuple(sorted(views.items())),
+                tuple(sorted(confidences.items())),
+                tau,
+                risk_aversion,
+                cov_np,
+                market_caps,
+                asset_order
+            )
+            
+            st.markdown("### 📊 ผลลัพธ์การปรับพอร์ต")
+            
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                st.markdown("#### เปรียบเทียบผลตอบแทนที่คาดหวัง")
+                
+                returns_df = pd.DataFrame({
+                    "สินทรัพย์": ["หุ้นไทย", "หุ้นเทคโนโลยี US", "ทองคำ", "พันธบัตร"],
+                    "จุดสมดุล (%)": (equilibrium.values * 100).round(2),
+                    "BL ปรับปรุง (%)": (bl_returns.values * 100).round(2)
+                })
+                
+                fig = go.Figure(layout=DARK_LAYOUT)
+                
+                fig.add_trace(go.Bar(
+                    x=returns_df["สินทรัพย์"],
+                    y=returns_df["จุดสมดุล (%)"],
+                    name="จุดสมดุลตลาด",
+                    marker_color='#666'
+                ))
+                
+                fig.add_trace(go.Bar(
+                    x=returns_df["สินทรัพย์"],
+                    y=returns_df["BL ปรับปรุง (%)"],
+                    name="BL ปรับปรุง",
+                    marker_color='#00D26A'
+                ))
+                
+                fig.update_layout(
+                    height=320,
+                    barmode='group',
+                    yaxis_title="ผลตอบแทนที่คาดหวัง (%)",
+                    legend=dict(orientation="h", yanchor="bottom", y=1.02, font=dict(size=12)),
+                    margin=dict(t=50, b=30)
+                )
+                
+                st.plotly_chart(fig, use_container_width=True)
+            
+            with col2:
+                st.markdown("#### สัดส่วนที่แนะนำ")
+                
+                fig = go.Figure(go.Pie(
+                    labels=["หุ้นไทย", "หุ้นเทคโนโลยี US", "ทองคำ", "พันธบัตร"],
+                    values=optimal_weights.values,
+                    hole=0.6,
+                    marker_colors=['#00D26A', '#007AFF', '#FFD700', '#FF6B6B'],
+                    textinfo='label+percent',
+                    textfont_size=13
+                ), layout=DARK_LAYOUT)
+                
+                fig.update_layout(
+                    height=320,
+                    showlegend=False,
+                    margin=dict(t=20, b=20)
+                )
+                
+                st.plotly_chart(fig, use_container_width=True)
+            
+            # Comparison table
+            st.markdown("#### ตารางเปรียบเทียบ")
+            raw = display_allocation_comparison(market_caps, optimal_weights)
+            comparison = pd.DataFrame({
+                "สินทรัพย์": raw["Asset"].map(ASSET_LABELS_TH).fillna(raw["Asset"]),
+                "น้ำหนักตลาด": (raw["Market Weight"] * 100).map("{:.1f}%".format),
+                "น้ำหนัก BL": (raw["BL Optimal Weight"] * 100).map("{:.1f}%".format),
+                "ส่วนต่าง": (raw["Difference"] * 100).map("{:.1f}%".format)
+            })
+            
+            st.dataframe(comparison, use_container_width=True, hide_index=True)
+
+
+# =============================================================================
+# MONTE CARLO PAGE
+# =============================================================================
+
+elif selected == "Monte Carlo":
+    import plotly.graph_objects as go
     
-    with col2:
-        existing_rmf = st.number_input(
-            "📈 RMF ที่ซื้อแล้ว (บาท)",
-            min_value=0,
-            max_value=500_000,
-            value=0,
-            step=10_000,
-            help="Retirement Mutual Fund - สูงสุด 30% ของรายได้ หรือ 500,000 บาท"
-        )
+    page_header("🎲", "เครื่องจำลอง Monte Carlo", "จำลองสถานการณ์ตลาดนับพันเพื่อวางแผนเกษียณอายุ")
     
-    st.markdown("---")
+    # Input parameters
+    st.markdown("### 📝 พารามิเตอร์การจำลอง")
     
-    if st.button("🧮 คำนวณภาษีและคำแนะนำ", type="primary"):
-        # Create deductions object
-        deductions = TaxDeductions(
-            spouse=60_000 if "ไม่มีรายได้" in marital_status else 0,
-            children=num_children,
-            parents=num_parents,
-            life_insurance=life_insurance,
-            health_insurance=health_insurance,
-            social_security=social_security,
-            provident_fund=provident_fund,
-            ssf_current=existing_ssf,
-            rmf_current=existing_rmf
-        )
+    # Parameters are batched in a form so editing them doesn't rerun the page
+    with st.form("mc_form"):
+        col1, col2, col3 = st.columns(3)
         
-        # Calculate tax
-        tax_result = calculate_full_tax(gross_income, deductions)
+        with col1:
+            current_wealth = st.number_input(
+                "💰 เงินปัจจุบัน (บาท)",
+                min_value=100000,
+                max_value=100000000,
+                # int and clamped: total_assets is a float and may be 0
+                value=min(max(int(client['total_assets']), 100000), 100000000),
+                step=100000,
+                format="%d"
+            )
         
-        # Calculate SSF/RMF recommendation
-        recommendation = calculate_ssf_rmf_recommendation(gross_income, deductions)
+        with col2:
+            monthly_contribution = st.number_input(
+                "📥 เงินออมต่อเดือน (บาท)",
+                min_value=0,
+                max_value=1000000,
+                value=50000,
+                step=5000,
+                format="%d"
+            )
         
-        # Display results
-        st.markdown("### 📊 ผลการคำนวณภาษี")
+        with col3:
+            years_to_retire = st.number_input(
+                "📅 จำนวนปีถึงเกษียณ",
+                min_value=1,
+                max_value=50,
+                value=20,
+                step=1
+            )
         
-        col1, col2, col3, col4 = st.columns(4)
+        col1, col2, col3 = st.columns(3)
         
         with col1:
-            st.metric(
-                "💰 เงินได้สุทธิ",
-                f"฿{tax_result.net_income:,.0f}",
-                f"ฐาน {tax_result.tax_bracket}"
-            )
+            annual_return = st.slider(
+                "📈 ผลตอบแทนรายปีที่คาดหวัง (%)",
+                min_value=3.0, max_value=15.0, value=7.0, step=0.5
+            ) / 100
         
         with col2:
-            st.metric(
-                "📋 ภาษีที่ต้องจ่าย",
-                f"฿{tax_result.tax_after_deduction:,.0f}",
-                f"อัตราที่แท้จริง {tax_result.effective_rate:.2f}%"
-            )
+            annual_volatility = st.slider(
+                "📉 ความผันผวนรายปี (%)",
+                min_value=5.0, max_value=30.0, value=15.0, step=1.0
+            ) / 100
         
         with col3:
-            st.metric(
-                "🎯 Marginal Rate",
-                f"{recommendation.marginal_rate*100:.0f}%",
-                "อัตราภาษีส่วนเพิ่ม"
+            goal_amount = st.number_input(
+                "🎯 เป้าหมายเงินเกษียณ (บาท)",
+                min_value=1000000,
+                max_value=500000000,
+                value=30000000,
+                step=1000000,
+                format="%d"
             )
         
-        with col4:
-            st.metric(
-                "💵 ค่าลดหย่อนรวม",
-                f"฿{tax_result.total_deductions:,.0f}",
-                "รวมทุกรายการ"
+        st.markdown("---")
+        
+        submitted = st.form_submit_button("🎲 รันจำลอง 1,000 ครั้ง", type="primary")
+    
+    # Last result is kept in session state, so incidental reruns redraw it
+    # without re-simulating; it is reused only while the inputs are unchanged
+    mc_params = (current_wealth, monthly_contribution, years_to_retire,
+                 annual_return, annual_volatility, goal_amount)
+    cached = st.session_state.get('mc_result')
+    if submitted and (cached is None or cached[0] != mc_params):
+        with st.spinner("กำลังจำลอง Monte Carlo..."):
+            result = run_monte_carlo(
+                current_wealth=current_wealth,
+                monthly_contribution=monthly_contribution,
+                years_to_retire=years_to_retire,
+                annual_return=annual_return,
+                annual_volatility=annual_volatility,
+                n_simulations=MC_MAX_PATHS,
+                goal_amount=goal_amount,
+                noise=mc_noise(),
+                # Only the percentile curves and final values are drawn
+                return_paths=False
             )
+        st.session_state['mc_result'] = cached = (mc_params, result)
+    
+    if cached is not None and cached[0] == mc_params:
+        result = cached[1]
+        
+        # Summary metrics
+        st.markdown("### 📊 ผลลัพธ์การจำลอง")
+        
+        summary = summarize_simulation(result)
+        prob = result.probability_of_success * 100
+        
+        st.markdown(metric_row_html([
+            ("💵 มูลค่ามัธยฐาน", f"฿{summary['Median Final Value']:,.0f}",
+             f"หลังจาก {years_to_retire} ปี", "up"),
+            ("📉 กรณีเลวร้าย (10%)", f"฿{summary['10th Percentile']:,.0f}",
+             "ประมาณการอนุรักษ์นิยม", "up"),
+            ("📈 กรณีดีที่สุด (90%)", f"฿{summary['90th Percentile']:,.0f}",
+             "ประมาณการมองบวก", "up"),
+            ("🎯 โอกาสสำเร็จ", f"{prob:.1f}%",
+             "เหนือเป้าหมาย" if prob >= 70 else "ต่ำกว่าเป้าหมาย",
+             "up" if prob >= 70 else "down"),
+        ]), unsafe_allow_html=True)
+        
+        # Projection chart
+        st.markdown("### 📈 การคาดการณ์มูลค่าพอร์ต (Percentile 10 / 50 / 90)")
+        
+        fig = go.Figure(layout=DARK_LAYOUT)
+        
+        # Add percentile bands
+        fig.add_trace(go.Scattergl(
+            x=result.years,
+            y=result.percentile_90,
+            mode='lines',
+            name='กรณีดีที่สุด (Percentile 90)',
+            line=dict(color='#00D26A', width=1, dash='dot'),
+            fill=None
+        ))
         
-        st.markdown("---")
-        st.markdown("### 🎯 คำแนะนำ SSF/RMF")
+        fig.add_trace(go.Scattergl(
+            x=result.years,
+            y=result.percentile_10,
+            mode='lines',
+            name='กรณีเลวร้าย (Percentile 10)',
+            line=dict(color='#FF6B6B', width=1, dash='dot'),
+            fill='tonexty',
+            fillcolor='rgba(0, 210, 106, 0.1)'
+        ))
         
-        col1, col2 = st.columns(2)
+        fig.add_trace(go.Scattergl(
+            x=result.years,
+            y=result.percentile_50,
+            mode='lines',
+            name='กรณีฐาน (Percentile 50)',
+            line=dict(color='#FFD700', width=3)
+        ))
         
-        with col1:
-            st.markdown("#### 📊 SSF (Super Savings Fund)")
-            
-            ssf_progress = existing_ssf / recommendation.ssf_max_allowed * 100 if recommendation.ssf_max_allowed > 0 else 0
-            st.progress(min(ssf_progress / 100, 1.0))
-            
-            st.markdown(f"""
-            - **ซื้อแล้ว:** ฿{existing_ssf:,.0f}
-            - **ซื้อได้สูงสุด:** ฿{recommendation.ssf_max_allowed:,.0f}
-            - **แนะนำซื้อเพิ่ม:** 🟢 **฿{recommendation.ssf_recommended:,.0f}**
-            - **ประหยัดภาษีได้:** ฿{recommendation.ssf_tax_saving:,.0f}
-            """)
+        # Add goal line
+        fig.add_hline(
+            y=goal_amount, 
+            line_dash="dash", 
+            line_color="#888",
+            annotation_text=f"เป้าหมาย: ฿{goal_amount:,.0f}",
+            annotation_position="right"
+        )
         
-        with col2:
-            st.markdown("#### 📈 RMF (Retirement Mutual Fund)")
-            
-            rmf_progress = existing_rmf / recommendation.rmf_max_allowed * 100 if recommendation.rmf_max_allowed > 0 else 0
-            st.progress(min(rmf_progress / 100, 1.0))
-            
-            st.markdown(f"""
-            - **ซื้อแล้ว:** ฿{existing_rmf:,.0f}
-            - **ซื้อได้สูงสุด:** ฿{recommendation.rmf_max_allowed:,.0f}
-            - **แนะนำซื้อเพิ่ม:** 🟢 **฿{recommendation.rmf_recommended:,.0f}**
-            - **ประหยัดภาษีได้:** ฿{recommendation.rmf_tax_saving:,.0f}
-            """)
+        fig.update_layout(
+            height=450,
+            xaxis_title="ปี",
+            yaxis_title="มูลค่าพอร์ต (บาท)",
+            legend=dict(
+                orientation="h",
+                yanchor="bottom",
+                y=1.02,
+                xanchor="right",
+                x=1,
+                font=dict(size=12)
+            ),
+            yaxis_tickformat=',.0f',
+            margin=dict(t=50, b=50)
+        )
         
-        # Summary box
-        st.markdown("---")
+        st.plotly_chart(fig, use_container_width=True)
         
-        if recommendation.total_tax_saving > 0:
-            st.success(f"""
-            ### 💰 สรุป: ถ้าซื้อ SSF/RMF ตามคำแนะนำ
-            
-            - **SSF ซื้อเพิ่ม:** ฿{recommendation.ssf_recommended:,.0f}
-            - **RMF ซื้อเพิ่ม:** ฿{recommendation.rmf_recommended:,.0f}
-            - **รวมลงทุนเพิ่ม:** ฿{recommendation.ssf_recommended + recommendation.rmf_recommended:,.0f}
-            - **ประหยัดภาษีรวม:** 🎉 **฿{recommendation.total_tax_saving:,.0f}**
-            
-            📌 *กองทุนเกษียณรวม (SSF + RMF + กองทุนสำรองฯ) ใช้แล้ว ฿{recommendation.combined_current:,.0f} / ฿{recommendation.combined_max:,.0f}*
-            """)
-        else:
-            st.info("✅ คุณใช้สิทธิลดหย่อน SSF/RMF เต็มที่แล้ว!")
+        # Distribution of final values
+        col1, col2 = st.columns(2)
         
-        st.warning("⚠️ **ข้อมูลนี้เป็นการประมาณการเท่านั้น** กรุณาปรึกษาผู้เชี่ยวชาญด้านภาษีก่อนตัดสินใจ")
-
-
-# =============================================================================
-# PDF REPORT PAGE (รายงาน PDF)
-# =============================================================================
-
-elif selected == "รายงาน PDF":
-    st.markdown("""
-    <h1 style='margin-bottom: 0.5rem;'>
-        <span style='background: linear-gradient(135deg, #00D26A 0%, #FFD700 100%);
-        -webkit-background-clip: text; -webkit-text-fill-color: transparent;'>
-        📄 สร้างรายงาน PDF
-        </span>
-    </h1>
-    <p style='color: #888; margin-bottom: 2rem; font-size: 1.1rem;'>
-        ดาวน์โหลดรายงานสรุปพอร์ตโฟลิโอในรูปแบบ PDF
-    </p>
-    """, unsafe_allow_html=True)
-    
-    st.markdown("### 📋 เลือกประเภทรายงาน")
-    
-    report_type = st.radio(
-        "เลือกรายงาน:",
-        options=["รายงานสรุปพอร์ต", "รายงานฉบับเต็ม"],
-        horizontal=True
-    )
-    
-    st.markdown("---")
-    
-    # Preview section
-    st.markdown("### 👁️ ตัวอย่างข้อมูลในรายงาน")
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.markdown("#### 📊 ข้อมูลลูกค้า")
-        st.markdown(f"""
-        - **ชื่อ:** {client['name']}
-        - **สินทรัพย์รวม:** ฿{client['total_assets']:,.0f}
-        - **ผลตอบแทน YTD:** {client['ytd_return']*100:.2f}%
-        - **วันที่รายงาน:** {pd.Timestamp.now().strftime('%d/%m/%Y')}
-        """)
-    
-    with col2:
-        st.markdown("#### 🥧 สัดส่วนพอร์ต")
-        for asset, weight in client['portfolio'].items():
-            asset_th = {"Thai Stock": "หุ้นไทย", "US Tech": "หุ้นเทคโนโลยี US", "Gold": "ทองคำ", "Bonds": "พันธบัตร"}
-            st.markdown(f"- **{asset_th.get(asset, asset)}:** {weight*100:.1f}%")
-    
-    st.markdown("---")
-    
-    # Generate button
-    if st.button("📥 สร้างและดาวน์โหลด PDF", type="primary"):
-        with st.spinner("กำลังสร้างรายงาน PDF..."):
-            # Generate PDF
-            if report_type == "รายงานสรุปพอร์ต":
-                pdf_bytes = generate_simple_summary(
-                    client_name=client['name'],
-                    total_assets=client['total_assets'],
-                    ytd_return=client['ytd_return'],
-                    portfolio=client['portfolio']
-                )
-            else:
-                pdf_bytes = generate_wealth_report(
-                    client_name=client['name'],
-                    client_data=client,
-                    portfolio_data=client['portfolio'],
-                    include_recommendations=True
-                )
+        with col1:
+            st.markdown("### 📊 การกระจายมูลค่าสุดท้าย")
             
-            # Create download button
-            filename = get_report_filename(client['name'], "portfolio")
+            fig = go.Figure(layout=DARK_LAYOUT)
             
-            st.download_button(
-                label="📄 ดาวน์โหลด PDF",
-                data=pdf_bytes,
-                file_name=filename,
-                mime="application/pdf",
-                type="secondary"
+            # Bin here so only 50 counts go to the browser
+            counts, edges = np.histogram(result.final_values, bins=50)
+            fig.add_trace(go.Bar(
+                x=0.5 * (edges[1:] + edges[:-1]),
+                y=counts,
+                width=edges[1] - edges[0],
+                marker_color='#00D26A',
+                opacity=0.7
+            ))
+            
+            fig.add_vline(
+                x=goal_amount,
+                line_dash="dash",
+                line_color="#FFD700",
+                annotation_text="เป้าหมาย"
             )
             
-            st.success("✅ รายงาน PDF พร้อมดาวน์โหลดแล้ว!")
-    
-    # Info box
-    st.info("""
-    💡 **เคล็ดลับ:**
-    - รายงานสรุปพอร์ต: 1 หน้า สำหรับดูภาพรวม
-    - รายงานฉบับเต็ม: หลายหน้า รวมคำแนะนำและการวิเคราะห์
-    """)
+            fig.update_layout(
+                height=300,
+                xaxis_title="มูลค่าพอร์ตสุดท้าย (บาท)",
+                yaxis_title="ความถี่",
+                xaxis_tickformat=',.0f',
+                margin=dict(t=20, b=50)
+            )
+            
+            st.plotly_chart(fig, use_container_width=True)
+        
+        with col2:
+            st.markdown("### 💡 ข้อมูลสำคัญ")
+            
+            total_contribution = current_wealth + (monthly_contribution * 12 * years_to_retire)
+            median_gain = summary['Median Final Value'] - total_contribution
+            
+            st.success(f"""
+            **เงินลงทุนรวม:** ฿{total_contribution:,.0f}  
+            **มูลค่ามัธยฐาน:** ฿{summary['Median Final Value']:,.0f}  
+            **กำไรที่คาดหวัง:** ฿{median_gain:,.0f} ({median_gain/total_contribution*100:.1f}%)
+            """)
+            
+            if prob >= 80:
+                st.info("✅ **ความมั่นใจสูง:** คุณมีโอกาสสำเร็จตามเป้าหมายสูงมาก!")
+            elif prob >= 60:
+                st.warning("⚠️ **ความมั่นใจปานกลาง:** ควรพิจารณาเพิ่มเงินออมหรือขยายระยะเวลา")
+            else:
+                st.error("❌ **ความมั่นใจต่ำ:** คุณอาจต้องปรับแผนอย่างมาก")
 
 
 # =============================================================================
-# ADVISOR CONTACT PAGE (ติดต่อที่ปรึกษา)
+# REBALANCING PAGE (ปรับสมดุล)
 # =============================================================================
 
-elif selected == "ติดต่อที่ปรึกษา":
-    st.markdown("""
-    <h1 style='margin-bottom: 0.5rem;'>
-        <span style='background: linear-gradient(135deg, #00D26A 0%, #FFD700 100%);
-        -webkit-background-clip: text; -webkit-text-fill-color: transparent;'>
-        📞 ติดต่อที่ปรึกษา
-        </span>
-    </h1>
-    <p style='color: #888; margin-bottom: 2rem; font-size: 1.1rem;'>
-        ขอคำปรึกษาจากผู้เชี่ยวชาญเมื่อต้องการความช่วยเหลือ
-    </p>
-    """, unsafe_allow_html=True)
-    
-    # Check portfolio status
-    daily_change = -150000  # Simulated daily change
-    daily_change_pct = (daily_change / client['total_assets']) * 100
+elif selected == "ปรับสมดุล":
+    import plotly.graph_objects as go
     
-    # Alert section if portfolio is down
-    if daily_change < 0:
-        st.markdown("""
-        <div style='
-            background: linear-gradient(135deg, rgba(255, 107, 107, 0.2) 0%, rgba(255, 107, 107, 0.1) 100%);
-            border: 1px solid rgba(255, 107, 107, 0.5);
-            border-radius: 12px;
-            padding: 1.5rem;
-            margin-bottom: 2rem;
-        '>
-            <h3 style='color: #FF6B6B; margin: 0;'>⚠️ พอร์ตของคุณปรับลดลงวันนี้</h3>
-            <p style='color: #FF9999; margin: 0.5rem 0 0 0;'>
-                ไม่ต้องกังวล! ที่ปรึกษาของเราพร้อมช่วยเหลือคุณ
-            </p>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.metric(
-                "📉 การเปลี่ยนแปลงวันนี้",
-                f"฿{daily_change:,.0f}",
-                f"{daily_change_pct:.2f}%"
-            )
-        
-        with col2:
-            st.metric(
-                "💰 มูลค่าพอร์ตปัจจุบัน",
-                f"฿{client['total_assets']:,.0f}",
-                ""
-            )
+    page_header("⚖️", "ระบบปรับสมดุลอัจฉริยะ", "ติดตามการเบี่ยงเบนสัดส่วน และรับคำแนะนำการซื้อขาย")
     
-    st.markdown("---")
+    # Current portfolio summary
+    st.markdown("### 📊 สถานะสัดส่วนปัจจุบัน")
     
-    # Contact form
-    st.markdown("### 📝 ขอนัดพูดคุยกับที่ปรึกษา")
+    # Calculate drift
+    drift_df = calculate_drift(client['portfolio'], client['target_allocation'])
+    drift_vals = drift_df['Drift (%)'].to_numpy()
+    asset_labels_th = drift_df['Asset'].map(ASSET_LABELS_TH).fillna(drift_df['Asset'])
     
-    col1, col2 = st.columns(2)
+    # Visual drift indicator
+    col1, col2 = st.columns([2, 1])
     
     with col1:
-        contact_reason = st.selectbox(
-            "เหตุผลที่ต้องการพูดคุย",
-            options=[
-                "พอร์ตติดลบ ต้องการคำปรึกษา",
-                "ต้องการปรับกลยุทธ์การลงทุน",
-                "สอบถามเรื่อง SSF/RMF",
-                "วางแผนการเกษียณ",
-                "อื่นๆ"
-            ]
-        )
+        # Drift bar chart
+        fig = go.Figure(layout=DARK_LAYOUT)
         
-        contact_phone = st.text_input(
-            "📞 เบอร์โทรศัพท์ติดต่อกลับ",
-            placeholder="08x-xxx-xxxx"
-        )
-    
-    with col2:
-        preferred_time = st.selectbox(
-            "ช่วงเวลาที่สะดวก",
-            options=[
-                "ทันที (ด่วน)",
-                "ช่วงเช้า (9:00 - 12:00)",
-                "ช่วงบ่าย (13:00 - 17:00)",
-                "ช่วงเย็น (17:00 - 19:00)"
-            ]
-        )
+        colors = np.where(drift_vals > 0, '#FF6B6B', '#00D26A').tolist()
         
-        additional_note = st.text_area(
-            "📋 หมายเหตุเพิ่มเติม",
-            placeholder="ข้อมูลอื่นๆ ที่ต้องการแจ้ง...",
-            height=100
-        )
-    
-    st.markdown("---")
-    
-    # LINE Notify settings
-    with st.expander("⚙️ ตั้งค่า LINE Notify (สำหรับที่ปรึกษา)"):
-        notify_status = get_notify_status()
+        fig.add_trace(go.Bar(
+            x=asset_labels_th,
+            y=drift_vals,
+            marker_color=colors,
+            text=np.char.mod("%+.1f%%", drift_vals).tolist(),
+            textposition='outside',
+            textfont=dict(size=14)
+        ))
         
-        if notify_status['mock_mode']:
-            st.warning("📌 ระบบอยู่ใน **Mock Mode** - ไม่ได้ส่ง LINE จริง")
-        else:
-            st.success("✅ ระบบเชื่อมต่อ LINE Notify แล้ว")
+        # Add threshold lines
+        fig.add_hline(y=5, line_dash="dash", line_color="#FFD700", 
+                      annotation_text="เกณฑ์ปรับสมดุล (+5%)")
+        fig.add_hline(y=-5, line_dash="dash", line_color="#FFD700",
+                      annotation_text="เกณฑ์ปรับสมดุล (-5%)")
         
-        line_token = st.text_input(
-            "LINE Notify Token",
-            type="password",
-            placeholder="วาง Token ที่นี่...",
-            help="ขอ Token ได้ที่ https://notify-bot.line.me/"
+        fig.update_layout(
+            height=380,
+            xaxis_title="",
+            yaxis_title="การเบี่ยงเบน (%)",
+            font_size=13,
+            yaxis_range=[-15, 15],
+            margin=dict(t=30, b=30)
         )
         
-        col1, col2 = st.columns(2)
+        st.plotly_chart(fig, use_container_width=True)
+    
+    with col2:
+        st.markdown("#### 📖 คำอธิบาย")
+        st.markdown("""
+        - 🔴 **เกินสัดส่วน:** ต้องขาย
+        - 🟢 **ต่ำกว่าสัดส่วน:** ต้องซื้อ
+        - ⚡ **เกณฑ์:** ±5% จะเรียกการปรับสมดุล
+        """)
         
-        with col1:
-            if st.button("💾 บันทึก Token"):
-                if set_line_token(line_token):
-                    st.success("✅ บันทึก Token สำเร็จ!")
-                    st.rerun()
-                else:
-                    st.error("❌ Token ไม่ถูกต้อง")
+        # Summary stats
+        max_over = drift_vals.max()
+        max_under = drift_vals.min()
         
-        with col2:
-            if st.button("🧪 ทดสอบส่ง LINE"):
-                result = test_line_notify(line_token if line_token else None)
-                if result.success:
-                    if result.mock_mode:
-                        st.info("📌 [Mock Mode] ข้อความถูกบันทึกแล้ว")
-                    else:
-                        st.success("✅ ส่ง LINE สำเร็จ!")
-                else:
-                    st.error(f"❌ Error: {result.message}")
+        st.metric("เกินสัดส่วนสูงสุด", f"{max_over:+.1f}%")
+        st.metric("ต่ำกว่าสัดส่วนสูงสุด", f"{max_under:+.1f}%")
     
     st.markdown("---")
     
-    # Send alert button
-    if st.button("🚨 ส่งคำขอติดต่อที่ปรึกษา", type="primary"):
-        if not contact_phone:
-            st.error("กรุณากรอกเบอร์โทรศัพท์")
-        else:
-            # Create alert
-            alert = create_panic_alert(
-                client_name=client['name'],
-                client_id=1,
-                portfolio_value=client['total_assets'],
-                daily_change=daily_change,
-                contact_phone=contact_phone
-            )
-            alert.alert_reason = f"{contact_reason} | เวลา: {preferred_time}"
-            
-            # Send notification
-            with st.spinner("กำลังส่งคำขอ..."):
-                result = send_advisor_alert(alert)
-            
-            if result.success:
-                if result.mock_mode:
-                    st.success("""
-                    ### ✅ บันทึกคำขอสำเร็จ!
-                    
-                    📌 **[Mock Mode]** ระบบบันทึกคำขอแล้ว
-                    
-                    เมื่อตั้งค่า LINE Notify Token แล้ว ที่ปรึกษาจะได้รับแจ้งเตือนทันที
-                    """)
-                    
-                    # Show what would be sent
-                    with st.expander("👁️ ตัวอย่างข้อความที่จะส่ง"):
-                        st.code(f"""
-🚨 แจ้งเตือนจากระบบ Wealth Advisor
+    # Drift table
+    st.markdown("### 📋 รายละเอียดการเบี่ยงเบน")
+    
+    drift_df_th = drift_df.assign(
+        Asset=asset_labels_th,
+        Status=drift_df['Status'].map(DRIFT_STATUS_TH).fillna(drift_df['Status'])
+    ).rename(columns={
+        'Asset': 'สินทรัพย์', 'Current (%)': 'ปัจจุบัน (%)', 'Target (%)': 'เป้าหมาย (%)',
+        'Drift (%)': 'เบี่ยงเบน (%)', 'Status': 'สถานะ'
+    })
+    
+    st.dataframe(drift_df_th, use_container_width=True, hide_index=True)
+    
+    st.markdown("---")
+    
+    # Action Plan
+    st.markdown("### 🎯 แผนการดำเนินการที่แนะนำ")
+    
+    # Drift threshold setting
+    threshold = st.slider(
+        "เกณฑ์การปรับสมดุล (%)",
+        min_value=1.0, max_value=10.0, value=5.0, step=0.5,
+        help="สร้างคำสั่งซื้อขายเฉพาะสินทรัพย์ที่เบี่ยงเบนเกินเกณฑ์นี้"
+    ) / 100
+    
+    # Generate and display action plan
+    actions = generate_action_plan(
+        current_weights=client['portfolio'],
+        target_weights=client['target_allocation'],
+        portfolio_value=client['total_assets'],
+        drift_threshold=threshold
+    )
+    
+    if actions:
+        # Create Thai action plan table (column-wise)
+        plan = pd.DataFrame([vars(a) for a in actions])
+        action_df = pd.DataFrame({
+            "การดำเนินการ": np.where(plan['action'] == 'SELL', '🔻 ขาย', '🔺 ซื้อ'),
+            "สินทรัพย์": plan['asset'].map(ASSET_LABELS_TH).fillna(plan['asset']),
+            "จำนวนหน่วย": plan['trade_units'].map("{:,}".format),
+            "มูลค่า": plan['trade_amount'].map("฿{:,.0f}".format),
+            "ปัจจุบัน → เป้าหมาย": (plan['current_weight'] * 100).map("{:.1f}% → ".format)
+                                   + (plan['target_weight'] * 100).map("{:.1f}%".format)
+        })
+        st.dataframe(action_df, use_container_width=True, hide_index=True)
+        
+        # Summary
+        total_trades = plan['trade_amount'].sum()
+        st.info(f"💰 **มูลค่าการซื้อขายรวม:** ฿{total_trades:,.0f}")
+        
+        # Execution button (simulated)
+        if st.button("✅ ดำเนินการปรับสมดุล", type="primary"):
+            st.success("🎉 คำสั่งปรับสมดุลถูกส่งไปดำเนินการแล้ว!")
+            st.balloons()
+    else:
+        st.success("✅ **ไม่ต้องปรับสมดุล** - พอร์ตของคุณอยู่ในสัดส่วนเป้าหมายแล้ว!")
 
-👤 ลูกค้า: {client['name']} (ID: 1)
-💰 มูลค่าพอร์ต: ฿{client['total_assets']:,.0f}
-📉 เปลี่ยนแปลง: ฿{daily_change:+,.0f} ({daily_change_pct:+.2f}%)
 
-📋 เหตุผล: {contact_reason} | เวลา: {preferred_time}
-📞 โทร: {contact_phone}
+# =============================================================================
+# TAX OPTIMIZER PAGE (วางแผนภาษี)
+# =============================================================================
 
-⏰ เวลา: {result.timestamp}
-                        """)
-                else:
-                    st.success("🎉 ส่งคำขอถึงที่ปรึกษาเรียบร้อยแล้ว! จะมีผู้ติดต่อกลับเร็วๆ นี้")
-                    st.balloons()
-            else:
-                st.error(f"❌ เกิดข้อผิดพลาด: {result.message}")
+elif selected == "วางแผนภาษี":
+    _page_tax()
+
+
+# =============================================================================
+# PDF REPORT PAGE (รายงาน PDF)
+# =============================================================================
+
+elif selected == "รายงาน PDF":
+    _page_pdf_report()
+
+
+# =============================================================================
+# ADVISOR CONTACT PAGE (ติดต่อที่ปรึกษา)
+# =============================================================================
+
+elif selected == "ติดต่อที่ปรึกษา":
+    _page_advisor_contact()
 
 
 # =============================================================================
@@ -1872,35 +2011,24 @@ elif selected == "จัดการผู้ใช้":
     # Check role
     require_role([UserRole.ADMIN])
     
-    st.markdown("""
-    <h1 style='margin-bottom: 0.5rem;'>
-        <span style='background: linear-gradient(135deg, #00D26A 0%, #FFD700 100%);
-        -webkit-background-clip: text; -webkit-text-fill-color: transparent;'>
-        👑 แผงควบคุมผู้ดูแลระบบ
-        </span>
-    </h1>
-    <p style='color: #888; margin-bottom: 2rem; font-size: 1.1rem;'>
-        จัดการผู้ใช้และดูสถิติระบบ
-    </p>
-    """, unsafe_allow_html=True)
+    page_header("👑", "แผงควบคุมผู้ดูแลระบบ", "จัดการผู้ใช้และดูสถิติระบบ")
     
     # Stats
-    auth = st.session_state.auth
-    all_users = auth.get_all_users()
-    clients = [u for u in all_users if u.is_client]
-    advisors = [u for u in all_users if u.is_advisor]
-    admins = [u for u in all_users if u.is_admin]
+    auth = get_auth()
+    all_users = _all_users(auth)
+    role_counts = Counter(u.role for u in all_users)
+    users_by_email = {u.email: u for u in all_users}
     
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
         st.metric("👥 ผู้ใช้ทั้งหมด", len(all_users))
     with col2:
-        st.metric("🧑‍💼 ลูกค้า", len(clients))
+        st.metric("🧑‍💼 ลูกค้า", role_counts[UserRole.CLIENT])
     with col3:
-        st.metric("👨‍💼 ที่ปรึกษา", len(advisors))
+        st.metric("👨‍💼 ที่ปรึกษา", role_counts[UserRole.ADVISOR])
     with col4:
-        st.metric("👑 แอดมิน", len(admins))
+        st.metric("👑 แอดมิน", role_counts[UserRole.ADMIN])
     
     st.markdown("---")
     
@@ -1908,18 +2036,9 @@ elif selected == "จัดการผู้ใช้":
     st.markdown("### 📋 รายชื่อผู้ใช้ทั้งหมด")
     
     if all_users:
-        user_data = []
-        for user in all_users:
-            role_badge = {"client": "🧑‍💼 ลูกค้า", "advisor": "👨‍💼 ที่ปรึกษา", "admin": "👑 แอดมิน"}
-            user_data.append({
-                "ID": user.id,
-                "ชื่อ": user.full_name,
-                "อีเมล": user.email,
-                "บทบาท": role_badge.get(user.role.value, user.role.value),
-                "โทรศัพท์": user.phone or "-"
-            })
-        
-        user_df = pd.DataFrame(user_data)
+        user_df = _user_table(tuple(
+            (u.id, u.full_name, u.email, u.role.value, u.phone) for u in all_users
+        ))
         st.dataframe(user_df, use_container_width=True, hide_index=True)
     else:
         st.info("ยังไม่มีผู้ใช้ในระบบ")
@@ -1932,7 +2051,7 @@ elif selected == "จัดการผู้ใช้":
     col1, col2 = st.columns(2)
     
     with col1:
-        user_emails = [u.email for u in all_users if u.email != current_user.email]
+        user_emails = [email for email in users_by_email if email != current_user.email]
         selected_user = st.selectbox(
             "เลือกผู้ใช้",
             options=user_emails if user_emails else ["ไม่มีผู้ใช้อื่น"]
@@ -1941,18 +2060,18 @@ elif selected == "จัดการผู้ใช้":
     with col2:
         new_role = st.selectbox(
             "บทบาทใหม่",
-            options=["ลูกค้า", "ที่ปรึกษา", "แอดมิน"]
+            options=ROLE_CHOICES
         )
     
-    role_mapping = {"ลูกค้า": UserRole.CLIENT, "ที่ปรึกษา": UserRole.ADVISOR, "แอดมิน": UserRole.ADMIN}
-    
     if st.button("💾 บันทึกการเปลี่ยนแปลง", type="primary"):
         if selected_user and selected_user != "ไม่มีผู้ใช้อื่น":
-            target_user = next((u for u in all_users if u.email == selected_user), None)
+            target_user = users_by_email.get(selected_user)
             if target_user:
-                result = auth.update_user_role(target_user.id, role_mapping[new_role])
+                result = auth.update_user_role(target_user.id, ROLE_CHOICES[new_role])
                 if result.success:
                     st.success(f"✅ เปลี่ยนบทบาทของ {selected_user} เป็น {new_role} สำเร็จ!")
+                    _all_users.clear()
+                    _my_clients.clear()
                     st.rerun()
                 else:
                     st.error(f"❌ เกิดข้อผิดพลาด: {result.message}")
@@ -1970,26 +2089,14 @@ elif selected == "ลูกค้าของฉัน":
     # Check role
     require_role([UserRole.ADVISOR, UserRole.ADMIN])
     
-    st.markdown("""
-    <h1 style='margin-bottom: 0.5rem;'>
-        <span style='background: linear-gradient(135deg, #00D26A 0%, #FFD700 100%);
-        -webkit-background-clip: text; -webkit-text-fill-color: transparent;'>
-        👥 ลูกค้าของฉัน
-        </span>
-    </h1>
-    <p style='color: #888; margin-bottom: 2rem; font-size: 1.1rem;'>
-        รายชื่อลูกค้าที่อยู่ในความดูแล
-    </p>
-    """, unsafe_allow_html=True)
+    page_header("👥", "ลูกค้าของฉัน", "รายชื่อลูกค้าที่อยู่ในความดูแล")
     
     # Get clients for this advisor
-    auth = st.session_state.auth
+    auth = get_auth()
     
+    my_clients = _my_clients(current_user.id, current_user.is_admin, auth)
     if current_user.is_admin:
-        my_clients = auth.get_users_by_role(UserRole.CLIENT)
         st.info("👑 คุณเป็น Admin - แสดงลูกค้าทั้งหมดในระบบ")
-    else:
-        my_clients = auth.get_advisor_clients(current_user.id)
     
     # Stats
     col1, col2, col3 = st.columns(3)
@@ -10,19 +10,28 @@ Roles:
 """
 
 import os
+import atexit
+import importlib.util
+import threading
 import streamlit as st
 from dataclasses import dataclass
-from typing import Optional, Dict, List, Tuple
+from typing import Optional, Dict, List, Tuple, TYPE_CHECKING
 from datetime import datetime
 from enum import Enum
+from operator import itemgetter
 
-# Try to import supabase, fallback to mock mode if not available
+# supabase (+ httpx) is imported only when a real client is built, so mock
+# mode never pays for it at startup; here we just check it is installed.
+SUPABASE_AVAILABLE = importlib.util.find_spec("supabase") is not None
+if TYPE_CHECKING:
+    from supabase import Client
+
+# Optional shared store for login rate limiting across Streamlit workers
 try:
-    from supabase import create_client, Client
-    SUPABASE_AVAILABLE = True
+    import redis
+    REDIS_AVAILABLE = True
 except ImportError:
-    SUPABASE_AVAILABLE = False
-    Client = None
+    REDIS_AVAILABLE = False
 
 try:
     from dotenv import load_dotenv
@@ -37,10 +46,28 @@ except ImportError:
 
 SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY", "")
+REDIS_URL = os.getenv("REDIS_URL", "")
+
+# Columns read into User (skip created_at/updated_at in every profiles query)
+PROFILE_COLUMNS = "id,email,full_name,role,phone,advisor_id"
+_PROFILE_FIELDS = itemgetter(*PROFILE_COLUMNS.split(","))
+# Fallbacks for rows missing a column
+_PROFILE_DEFAULTS = {"id": "", "email": "", "full_name": "", "role": "client",
+                     "phone": None, "advisor_id": None}
 
 # Check if we should use mock mode
 MOCK_MODE = not (SUPABASE_URL and SUPABASE_KEY and SUPABASE_AVAILABLE)
 
+# Pooled HTTP transport for PostgREST/Auth calls (keep-alive, bounded sockets)
+SUPABASE_MAX_CONNECTIONS = 10
+SUPABASE_MAX_KEEPALIVE = 5
+SUPABASE_TIMEOUT = 10.0          # seconds per request
+SUPABASE_CONNECT_TIMEOUT = 2.0   # seconds to open a socket
+
+# Per-session (access_token, refresh_token, expires_at); the shared client holds no session
+SESSION_TOKENS_KEY = "auth_tokens"
+TOKEN_REFRESH_MARGIN = 60  # seconds before expiry to refresh the access token
+
 
 # =============================================================================
 # ENUMS & DATA CLASSES
@@ -51,8 +78,11 @@ class UserRole(Enum):
     ADVISOR = "advisor"
     ADMIN = "admin"
 
+# Stored role string -> UserRole without going through the Enum lookup
+_ROLE_BY_VALUE = {r.value: r for r in UserRole}
+
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class User:
     """ข้อมูลผู้ใช้"""
     id: str
@@ -86,13 +116,14 @@ class User:
         return self.role in required_roles
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class AuthResult:
     """ผลลัพธ์การ authentication"""
     success: bool
     message: str
     user: Optional[User] = None
     error_code: Optional[str] = None
+    tokens: Optional[Tuple[str, str, Optional[int]]] = None
 
 
 # =============================================================================
@@ -100,23 +131,31 @@ class AuthResult:
 # =============================================================================
 
 import hashlib
+import hmac
 from collections import defaultdict
+import math
 import time
 
+_BLAKE = hashlib.blake2b
+
 def hash_password(password: str) -> str:
-    """Hash password using SHA256 - Use bcrypt in production."""
-    return hashlib.sha256(password.encode()).hexdigest()
+    """Hash password using BLAKE2b (32-byte digest) - Use bcrypt in production."""
+    return _BLAKE(password.encode("utf-8"), digest_size=32).hexdigest()
 
 def verify_password(password: str, hashed: str) -> bool:
-    """Verify password against hash."""
-    return hash_password(password) == hashed
+    """Verify password against hash (constant-time comparison of fixed-width hex)."""
+    return hmac.compare_digest(hashed.encode(), hash_password(password).encode())
+
+# Compared against for unknown emails so they cost the same as a wrong password
+_DUMMY_HASH = "0" * 64
 
-# Pre-hashed passwords (original: client123, advisor123, admin123)
+# Pre-hashed passwords (original: client123, advisor123, admin123), stored as
+# hash_password hex literals so importing the module does no hashing
 MOCK_USERS = {
     "client@example.com": {
         "id": "user-001",
         "email": "client@example.com",
-        "password_hash": hash_password("client123"),
+        "password_hash": "7772d54002006bd7b9d7414009f94c8b43b4a98e1537b5ae92cdd38f41f7304f",
         "full_name": "คุณสมชาย ใจดี",
         "role": "client",
         "phone": "081-234-5678",
@@ -125,55 +164,185 @@ MOCK_USERS = {
     "advisor@example.com": {
         "id": "user-002",
         "email": "advisor@example.com",
-        "password_hash": hash_password("advisor123"),
+        "password_hash": "add1ef035f95c2acb67d791e5e07c833dd5e24c5f2f53363822e567fa474ef62",
         "full_name": "คุณวิชัย ที่ปรึกษา",
         "role": "advisor",
-        "phone": "082-345-6789"
+        "phone": "082-345-6789",
+        "advisor_id": None
     },
     "admin@example.com": {
         "id": "user-003",
         "email": "admin@example.com",
-        "password_hash": hash_password("admin123"),
+        "password_hash": "eee0cbba7db7e6ba4e50f316d96c92c606740ad235291e9affee5246990616e1",
         "full_name": "ผู้ดูแลระบบ",
         "role": "admin",
-        "phone": "083-456-7890"
+        "phone": "083-456-7890",
+        "advisor_id": None
     }
 }
 
-# Rate limiting configuration
-LOGIN_ATTEMPTS = defaultdict(list)  # email -> [timestamp, ...]
-MAX_ATTEMPTS = 5  # Max login attempts
-LOCKOUT_DURATION = 300  # 5 minutes lockout
+# Secondary indices over MOCK_USERS (emails kept in insertion order as dict
+# keys); maintained by _mock_register and update_user_role
+MOCK_EMAIL_BY_ID: Dict[str, str] = {}
+MOCK_USERS_BY_ROLE: Dict[str, Dict[str, None]] = defaultdict(dict)
+MOCK_USERS_BY_ADVISOR: Dict[str, Dict[str, None]] = defaultdict(dict)
+
+def _index_mock_user(email: str):
+    user = MOCK_USERS[email]
+    MOCK_EMAIL_BY_ID[user["id"]] = email
+    MOCK_USERS_BY_ROLE[user["role"]][email] = None
+    if user.get("advisor_id"):
+        MOCK_USERS_BY_ADVISOR[user["advisor_id"]][email] = None
+
+for _email in MOCK_USERS:
+    _index_mock_user(_email)
+
+# Rate limiting: one token bucket per email and per client IP ("quantized
+# maximum rate"). A full bucket allows LOGIN_BUCKET_CAP failed logins at any
+# time and refills at LOGIN_BUCKET_CAP tokens per day. For emails each
+# consecutive failure doubles the cost of the next one (1, 2, 4, 8 at most)
+# until the bucket has refilled completely or a successful login resets it.
+LOGIN_BUCKET_CAP = 144
+LOGIN_REFILL_PER_SEC = LOGIN_BUCKET_CAP / 86_400
+IP_BUCKET_CAP = 4 * LOGIN_BUCKET_CAP  # Shared office/NAT addresses: larger, no back-off
+IP_REFILL_PER_SEC = IP_BUCKET_CAP / 86_400
+LOGIN_BUCKETS_SWEEP_AT = 10_000  # In-memory buckets before full ones are swept
+LOGIN_BACKOFF_MAX_EXP = 3  # Back-off cost doubles per failure up to 2**3 tokens (80 min)
+
+# Atomic refill (+ optional consume) on a hash {tokens, ts, fails}.
+# ARGV: cap, refill/sec, now, consume (0/1), back-off exponent cap (0 = off).
+# Returns seconds until the next attempt is affordable (0 = allowed).
+# Same arithmetic as the in-memory path of TokenBucket._step.
+_BUCKET_LUA = """
+local cap, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local s = redis.call('HMGET', KEYS[1], 'tokens', 'ts', 'fails')
+local tokens = tonumber(s[1]) or cap
+local fails = tonumber(s[3]) or 0
+tokens = math.min(cap, tokens + (now - (tonumber(s[2]) or now)) * rate)
+if tokens >= cap then fails = 0 end
+local cost = math.min(cap, 2 ^ math.min(fails, tonumber(ARGV[5])))
+if ARGV[4] == '1' then
+    tokens = math.max(0, tokens - cost)
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now, 'fails', fails + 1)
+    redis.call('EXPIRE', KEYS[1], math.ceil((cap - tokens) / rate) + 1)
+    return 0
+end
+if tokens >= cost then return 0 end
+return math.ceil((cost - tokens) / rate)
+"""
 
-def check_rate_limit(email: str) -> Tuple[bool, str]:
-    """
-    Check if login is rate limited.
-    Returns (is_allowed, message)
+
+class TokenBucket:
     """
-    email = email.lower().strip()
-    current_time = time.time()
+    Failed-login token bucket per identifier (email or IP).
     
-    # Clean old attempts (older than lockout duration)
-    LOGIN_ATTEMPTS[email] = [
-        t for t in LOGIN_ATTEMPTS[email] 
-        if current_time - t < LOCKOUT_DURATION
-    ]
+    State is (tokens, last_refill, consecutive_failures): in a Redis hash
+    keyed on sha1(identifier) when `client` is given (shared by all workers,
+    updated by one Lua script), else in a per-process dict. A missing entry
+    is a full bucket.
+    """
     
-    if len(LOGIN_ATTEMPTS[email]) >= MAX_ATTEMPTS:
-        remaining = int(LOCKOUT_DURATION - (current_time - LOGIN_ATTEMPTS[email][0]))
-        return False, f"บัญชีถูกล็อคชั่วคราว กรุณารอ {remaining} วินาที"
+    def __init__(self, prefix: str, cap: float, refill_per_sec: float,
+                 backoff: bool, client=None):
+        self.prefix = prefix
+        self.cap = cap
+        self.rate = refill_per_sec
+        self.backoff = backoff
+        self.max_exp = LOGIN_BACKOFF_MAX_EXP if backoff else 0
+        self.client = client
+        self.buckets: Dict[str, list] = {}
+        self._script = client.register_script(_BUCKET_LUA) if client is not None else None
+    
+    def _key(self, ident: str) -> str:
+        return f"ratelimit:{self.prefix}:{hashlib.sha1(ident.encode()).hexdigest()}"
+    
+    def _step(self, ident: str, consume: bool) -> int:
+        if self._script is not None:
+            try:
+                return int(self._script(
+                    keys=[self._key(ident)],
+                    args=[self.cap, self.rate, time.time(), int(consume), self.max_exp]
+                ))
+            except redis.RedisError:
+                pass  # Redis down: this process keeps its own buckets
+        
+        now = time.monotonic()
+        tokens, last, fails = self.buckets.get(ident) or (self.cap, now, 0)
+        tokens = min(self.cap, tokens + (now - last) * self.rate)
+        if tokens >= self.cap:
+            fails = 0  # Fully refilled: back-off starts over
+        cost = min(self.cap, 2 ** min(fails, self.max_exp))
+        if consume:
+            self.buckets[ident] = [max(0.0, tokens - cost), now, fails + 1]
+            if len(self.buckets) > LOGIN_BUCKETS_SWEEP_AT:
+                self._sweep(now)
+            return 0
+        return 0 if tokens >= cost else math.ceil((cost - tokens) / self.rate)
+    
+    def _sweep(self, now: float):
+        """Forget in-memory buckets that have refilled completely."""
+        for ident in [i for i, (tokens, last, _) in self.buckets.items()
+                      if tokens + (now - last) * self.rate >= self.cap]:
+            del self.buckets[ident]
+    
+    def retry_after(self, ident: str) -> int:
+        """Seconds until `ident` can afford its next attempt (0 = allowed)."""
+        return self._step(ident, consume=False)
+    
+    def consume(self, ident: str):
+        """Charge one failed attempt (doubling cost under back-off)."""
+        self._step(ident, consume=True)
+    
+    def reset(self, ident: str):
+        self.buckets.pop(ident, None)
+        if self.client is not None:
+            try:
+                self.client.delete(self._key(ident))
+            except redis.RedisError:
+                pass
+
+
+_redis = redis.Redis.from_url(REDIS_URL) if REDIS_AVAILABLE and REDIS_URL else None
+EMAIL_BUCKETS = TokenBucket("email", LOGIN_BUCKET_CAP, LOGIN_REFILL_PER_SEC, backoff=True, client=_redis)
+IP_BUCKETS = TokenBucket("ip", IP_BUCKET_CAP, IP_REFILL_PER_SEC, backoff=False, client=_redis)
+
+# The helpers below expect an already normalized email (lower/strip),
+# done once in SupabaseAuth.login
+
+def check_rate_limit(email: str, ip: Optional[str] = None) -> Tuple[bool, str]:
+    """
+    Check if login is rate limited (per email, and per client IP if known).
+    Returns (is_allowed, message)
+    """
+    wait = max(EMAIL_BUCKETS.retry_after(email), IP_BUCKETS.retry_after(ip) if ip else 0)
+    if wait >= 60:
+        return False, f"บัญชีถูกล็อคชั่วคราว กรุณารอ {math.ceil(wait / 60)} นาที"
+    if wait:
+        return False, f"บัญชีถูกล็อคชั่วคราว กรุณารอ {wait} วินาที"
     
     return True, ""
 
-def record_login_attempt(email: str):
+def record_login_attempt(email: str, ip: Optional[str] = None):
     """Record a failed login attempt."""
-    email = email.lower().strip()
-    LOGIN_ATTEMPTS[email].append(time.time())
+    EMAIL_BUCKETS.consume(email)
+    if ip:
+        IP_BUCKETS.consume(ip)
 
 def clear_login_attempts(email: str):
-    """Clear login attempts after successful login."""
-    email = email.lower().strip()
-    LOGIN_ATTEMPTS[email] = []
+    """Refill the email's bucket and end its back-off after a successful login."""
+    EMAIL_BUCKETS.reset(email)
+
+def _client_ip() -> Optional[str]:
+    """IP of the browser session running this script, when Streamlit knows it."""
+    try:
+        return getattr(st.context, "ip_address", None)
+    except Exception:
+        return None
+
+
+def _session_tokens(session) -> Tuple[str, str, Optional[int]]:
+    """(access_token, refresh_token, expires_at) ของ GoTrue session"""
+    return session.access_token, session.refresh_token, session.expires_at
 
 
 # =============================================================================
@@ -183,27 +352,94 @@ def clear_login_attempts(email: str):
 class SupabaseAuth:
     """จัดการ Authentication กับ Supabase หรือ Mock Mode"""
     
+    # One Supabase client per process, shared by every instance
+    _client: Optional["Client"] = None
+    _client_lock = threading.Lock()
+    
     def __init__(self):
         self.mock_mode = MOCK_MODE
-        self.client: Optional[Client] = None
+        self.client: Optional["Client"] = None
+        self._profiles_src = None
+        self._profiles_builder = None
         
         if not self.mock_mode:
             try:
-                self.client = create_client(SUPABASE_URL, SUPABASE_KEY)
+                self.client = self._shared_client()
             except Exception as e:
                 print(f"Failed to connect to Supabase: {e}")
                 self.mock_mode = True
     
+    @classmethod
+    def _shared_client(cls) -> "Client":
+        """สร้าง Supabase client ครั้งเดียวต่อ process"""
+        with cls._client_lock:
+            if cls._client is None:
+                import httpx
+                from supabase import create_client, ClientOptions
+                
+                http = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=SUPABASE_MAX_CONNECTIONS,
+                        max_keepalive_connections=SUPABASE_MAX_KEEPALIVE
+                    ),
+                    timeout=httpx.Timeout(SUPABASE_TIMEOUT, connect=SUPABASE_CONNECT_TIMEOUT)
+                )
+                atexit.register(http.close)
+                # No stored session: every request carries its own session's JWT
+                stateless = {"persist_session": False, "auto_refresh_token": False}
+                try:
+                    options = ClientOptions(httpx_client=http, **stateless)
+                except TypeError:
+                    # supabase < 2.15 has no httpx_client option: default transport
+                    http.close()
+                    options = ClientOptions(**stateless)
+                cls._client = create_client(SUPABASE_URL, SUPABASE_KEY, options=options)
+            return cls._client
+    
+    @property
+    def _profiles(self):
+        """
+        Request builder for the profiles table, built once per PostgREST client.
+        
+        supabase-py swaps in a new PostgREST client when the auth session
+        changes, so the builder is rebuilt whenever that object changes.
+        Queries built from it must go through ``_as_session`` before
+        ``execute()`` so they never run with another session's JWT.
+        """
+        postgrest = self.client.postgrest
+        if self._profiles_src is not postgrest:
+            self._profiles_builder = postgrest.from_("profiles")
+            self._profiles_src = postgrest
+        return self._profiles_builder
+    
+    def _session_token(self) -> str:
+        """JWT ของ session นี้ (refresh เมื่อใกล้หมดอายุ) หรือ anon key ถ้ายังไม่ login"""
+        tokens = st.session_state.get(SESSION_TOKENS_KEY)
+        if not tokens:
+            return SUPABASE_KEY
+        access, refresh, expires_at = tokens
+        if expires_at and time.time() > expires_at - TOKEN_REFRESH_MARGIN:
+            try:
+                tokens = _session_tokens(self.client.auth.refresh_session(refresh).session)
+                st.session_state[SESSION_TOKENS_KEY] = tokens
+            except Exception:
+                pass
+        return tokens[0]
+    
+    def _as_session(self, query, token: Optional[str] = None):
+        """แนบ JWT ให้ query นี้เท่านั้น (ไม่แตะ header ของ client ที่ใช้ร่วมกัน)"""
+        query.headers["Authorization"] = f"Bearer {token or self._session_token()}"
+        return query
+    
     def _dict_to_user(self, data: Dict) -> User:
         """แปลง dict เป็น User object"""
-        return User(
-            id=data.get("id", ""),
-            email=data.get("email", ""),
-            full_name=data.get("full_name", ""),
-            role=UserRole(data.get("role", "client")),
-            phone=data.get("phone"),
-            advisor_id=data.get("advisor_id")
-        )
+        try:
+            uid, email, full_name, role, phone, advisor_id = _PROFILE_FIELDS(data)
+        except KeyError:
+            uid, email, full_name, role, phone, advisor_id = _PROFILE_FIELDS(
+                {**_PROFILE_DEFAULTS, **data}
+            )
+        return User(uid, email, full_name, _ROLE_BY_VALUE[role], phone, None, advisor_id)
     
     # =========================================================================
     # LOGIN
@@ -220,8 +456,11 @@ class SupabaseAuth:
         Returns:
             AuthResult
         """
+        email = email.lower().strip()
+        ip = _client_ip()
+        
         # Check rate limiting first
-        is_allowed, rate_msg = check_rate_limit(email)
+        is_allowed, rate_msg = check_rate_limit(email, ip)
         if not is_allowed:
             return AuthResult(
                 success=False,
@@ -230,7 +469,7 @@ class SupabaseAuth:
             )
         
         if self.mock_mode:
-            return self._mock_login(email, password)
+            return self._mock_login(email, password, ip)
         
         try:
             response = self.client.auth.sign_in_with_password({
@@ -238,11 +477,15 @@ class SupabaseAuth:
                 "password": password
             })
             
-            if response.user:
+            if response.user and response.session:
+                tokens = _session_tokens(response.session)
                 # Get user profile from profiles table
-                profile = self.client.table("profiles").select("*").eq(
-                    "id", response.user.id
-                ).single().execute()
+                profile = self._as_session(
+                    self._profiles.select(PROFILE_COLUMNS).eq(
+                        "id", response.user.id
+                    ).single(),
+                    tokens[0]
+                ).execute()
                 
                 if profile.data:
                     clear_login_attempts(email)  # Clear on success
@@ -250,10 +493,11 @@ class SupabaseAuth:
                     return AuthResult(
                         success=True,
                         message="เข้าสู่ระบบสำเร็จ",
-                        user=user
+                        user=user,
+                        tokens=tokens
                     )
             
-            record_login_attempt(email)  # Record failed attempt
+            record_login_attempt(email, ip)  # Record failed attempt
             return AuthResult(
                 success=False,
                 message="อีเมลหรือรหัสผ่านไม่ถูกต้อง",
@@ -261,30 +505,28 @@ class SupabaseAuth:
             )
             
         except Exception as e:
-            record_login_attempt(email)  # Record failed attempt
+            record_login_attempt(email, ip)  # Record failed attempt
             return AuthResult(
                 success=False,
                 message=f"เกิดข้อผิดพลาด: {str(e)}",
                 error_code="AUTH_ERROR"
             )
     
-    def _mock_login(self, email: str, password: str) -> AuthResult:
+    def _mock_login(self, email: str, password: str, ip: Optional[str] = None) -> AuthResult:
         """Mock login for development with hashed password verification"""
-        email = email.lower().strip()
-        
-        if email in MOCK_USERS:
-            user_data = MOCK_USERS[email]
-            # Verify password using hash
-            if verify_password(password, user_data["password_hash"]):
-                clear_login_attempts(email)  # Clear on success
-                user = self._dict_to_user(user_data)
-                return AuthResult(
-                    success=True,
-                    message="[Mock] เข้าสู่ระบบสำเร็จ",
-                    user=user
-                )
+        user_data = MOCK_USERS.get(email)
+        # Always hash + compare, even for unknown emails (no timing oracle)
+        expected = user_data["password_hash"] if user_data else _DUMMY_HASH
+        if verify_password(password, expected) and user_data:
+            clear_login_attempts(email)  # Clear on success
+            user = self._dict_to_user(user_data)
+            return AuthResult(
+                success=True,
+                message="[Mock] เข้าสู่ระบบสำเร็จ",
+                user=user
+            )
         
-        record_login_attempt(email)  # Record failed attempt
+        record_login_attempt(email, ip)  # Record failed attempt
         return AuthResult(
             success=False,
             message="อีเมลหรือรหัสผ่านไม่ถูกต้อง",
@@ -336,7 +578,8 @@ class SupabaseAuth:
                     "phone": phone
                 }
                 
-                self.client.table("profiles").insert(profile_data).execute()
+                token = response.session.access_token if response.session else None
+                self._as_session(self._profiles.insert(profile_data), token).execute()
                 
                 user = self._dict_to_user(profile_data)
                 return AuthResult(
@@ -391,8 +634,10 @@ class SupabaseAuth:
             "password_hash": hash_password(password),  # Hash the password!
             "full_name": full_name,
             "role": role.value,
-            "phone": phone
+            "phone": phone,
+            "advisor_id": None
         }
+        _index_mock_user(email)
         
         user = self._dict_to_user(MOCK_USERS[email])
         return AuthResult(
@@ -438,11 +683,11 @@ class SupabaseAuth:
     # LOGOUT
     # =========================================================================
     
-    def logout(self) -> AuthResult:
-        """ออกจากระบบ"""
-        if not self.mock_mode and self.client:
+    def logout(self, access_token: Optional[str] = None) -> AuthResult:
+        """ออกจากระบบ (revoke เฉพาะ session ของ token นี้)"""
+        if not self.mock_mode and self.client and access_token:
             try:
-                self.client.auth.sign_out()
+                self.client.auth.admin.sign_out(access_token, "local")
             except:
                 pass
         
@@ -461,7 +706,7 @@ class SupabaseAuth:
             return [self._dict_to_user(u) for u in MOCK_USERS.values()]
         
         try:
-            response = self.client.table("profiles").select("*").execute()
+            response = self._as_session(self._profiles.select(PROFILE_COLUMNS)).execute()
             return [self._dict_to_user(u) for u in response.data]
         except:
             return []
@@ -470,15 +715,14 @@ class SupabaseAuth:
         """ดึงรายชื่อผู้ใช้ตาม role"""
         if self.mock_mode:
             return [
-                self._dict_to_user(u) 
-                for u in MOCK_USERS.values() 
-                if u["role"] == role.value
+                self._dict_to_user(MOCK_USERS[email])
+                for email in MOCK_USERS_BY_ROLE.get(role.value, ())
             ]
         
         try:
-            response = self.client.table("profiles").select("*").eq(
+            response = self._as_session(self._profiles.select(PROFILE_COLUMNS).eq(
                 "role", role.value
-            ).execute()
+            )).execute()
             return [self._dict_to_user(u) for u in response.data]
         except:
             return []
@@ -486,19 +730,22 @@ class SupabaseAuth:
     def update_user_role(self, user_id: str, new_role: UserRole) -> AuthResult:
         """เปลี่ยน role ของ user (Admin only)"""
         if self.mock_mode:
-            for email, user in MOCK_USERS.items():
-                if user["id"] == user_id:
-                    user["role"] = new_role.value
-                    return AuthResult(
-                        success=True,
-                        message=f"[Mock] เปลี่ยน role เป็น {new_role.value} สำเร็จ"
-                    )
-            return AuthResult(success=False, message="ไม่พบผู้ใช้")
+            email = MOCK_EMAIL_BY_ID.get(user_id)
+            if email is None:
+                return AuthResult(success=False, message="ไม่พบผู้ใช้")
+            user = MOCK_USERS[email]
+            MOCK_USERS_BY_ROLE[user["role"]].pop(email, None)
+            MOCK_USERS_BY_ROLE[new_role.value][email] = None
+            user["role"] = new_role.value
+            return AuthResult(
+                success=True,
+                message=f"[Mock] เปลี่ยน role เป็น {new_role.value} สำเร็จ"
+            )
         
         try:
-            self.client.table("profiles").update({
+            self._as_session(self._profiles.update({
                 "role": new_role.value
-            }).eq("id", user_id).execute()
+            }).eq("id", user_id)).execute()
             
             return AuthResult(
                 success=True,
@@ -514,15 +761,14 @@ class SupabaseAuth:
         """ดึงรายชื่อลูกค้าของที่ปรึกษา"""
         if self.mock_mode:
             return [
-                self._dict_to_user(u) 
-                for u in MOCK_USERS.values() 
-                if u.get("advisor_id") == advisor_id
+                self._dict_to_user(MOCK_USERS[email])
+                for email in MOCK_USERS_BY_ADVISOR.get(advisor_id, ())
             ]
         
         try:
-            response = self.client.table("profiles").select("*").eq(
+            response = self._as_session(self._profiles.select(PROFILE_COLUMNS).eq(
                 "advisor_id", advisor_id
-            ).execute()
+            )).execute()
             return [self._dict_to_user(u) for u in response.data]
         except:
             return []
@@ -532,14 +778,18 @@ class SupabaseAuth:
 # SESSION MANAGEMENT (Streamlit)
 # =============================================================================
 
+@st.cache_resource
+def get_auth() -> SupabaseAuth:
+    """SupabaseAuth ที่ใช้ร่วมกันทุก session (session_state เก็บแค่ user)"""
+    return SupabaseAuth()
+
+
 def init_session_state():
     """Initialize session state for authentication"""
     if "authenticated" not in st.session_state:
         st.session_state.authenticated = False
     if "user" not in st.session_state:
         st.session_state.user = None
-    if "auth" not in st.session_state:
-        st.session_state.auth = SupabaseAuth()
 
 
 def get_current_user() -> Optional[User]:
@@ -554,18 +804,19 @@ def is_authenticated() -> bool:
     return st.session_state.authenticated
 
 
-def login_user(user: User):
-    """บันทึก user ลง session"""
+def login_user(user: User, tokens: Optional[Tuple[str, str, Optional[int]]] = None):
+    """บันทึก user (และ JWT ของ session นี้) ลง session"""
     st.session_state.authenticated = True
     st.session_state.user = user
+    st.session_state[SESSION_TOKENS_KEY] = tokens
 
 
 def logout_user():
     """ล้าง session"""
     st.session_state.authenticated = False
     st.session_state.user = None
-    if "auth" in st.session_state:
-        st.session_state.auth.logout()
+    tokens = st.session_state.pop(SESSION_TOKENS_KEY, None)
+    get_auth().logout(tokens[0] if tokens else None)
 
 
 def require_auth():
@@ -624,9 +875,9 @@ def show_login_form() -> Optional[User]:
                 if not email or not password:
                     st.error("กรุณากรอกอีเมลและรหัสผ่าน")
                 else:
-                    result = st.session_state.auth.login(email, password)
+                    result = get_auth().login(email, password)
                     if result.success:
-                        login_user(result.user)
+                        login_user(result.user, result.tokens)
                         st.success(result.message)
                         st.rerun()
                     else:
@@ -659,7 +910,7 @@ def show_login_form() -> Optional[User]:
                 elif len(new_password) < 6:
                     st.error("รหัสผ่านต้องมีอย่างน้อย 6 ตัวอักษร")
                 else:
-                    result = st.session_state.auth.register(
+                    result = get_auth().register(
                         email=new_email,
                         password=new_password,
                         full_name=full_name,
@@ -685,7 +936,7 @@ def show_login_form() -> Optional[User]:
                 if not reset_email:
                     st.error("กรุณากรอกอีเมล")
                 else:
-                    result = st.session_state.auth.reset_password(reset_email)
+                    result = get_auth().reset_password(reset_email)
                     if result.success:
                         st.success(result.message)
                     else:
@@ -694,6 +945,31 @@ def show_login_form() -> Optional[User]:
     return None
 
 
+ROLE_BADGE = {
+    UserRole.CLIENT: "🧑‍💼 ลูกค้า",
+    UserRole.ADVISOR: "👨‍💼 ที่ปรึกษา",
+    UserRole.ADMIN: "👑 แอดมิน"
+}
+
+# Sidebar menu per role: (page names, bootstrap icon names)
+BASE_MENU = ("แดชบอร์ด", "จัดการพอร์ต")
+BASE_ICONS = ("speedometer2", "wallet2")
+MENU_BY_ROLE = {
+    UserRole.CLIENT: (
+        BASE_MENU + ("Monte Carlo", "วางแผนภาษี", "รายงาน PDF", "ติดต่อที่ปรึกษา"),
+        BASE_ICONS + ("bar-chart-line", "calculator", "file-pdf", "telephone")
+    ),
+    UserRole.ADVISOR: (
+        BASE_MENU + ("ลูกค้าของฉัน", "Black-Litterman", "Monte Carlo", "ปรับสมดุล", "รายงาน PDF"),
+        BASE_ICONS + ("people", "graph-up-arrow", "bar-chart-line", "arrow-repeat", "file-pdf")
+    ),
+    UserRole.ADMIN: (
+        BASE_MENU + ("จัดการผู้ใช้", "Black-Litterman", "Monte Carlo", "ปรับสมดุล", "วางแผนภาษี", "รายงาน PDF", "ติดต่อที่ปรึกษา"),
+        BASE_ICONS + ("people-fill", "graph-up-arrow", "bar-chart-line", "arrow-repeat", "calculator", "file-pdf", "telephone")
+    ),
+}
+
+
 def show_user_menu():
     """แสดงเมนู user ใน sidebar"""
     user = get_current_user()
@@ -703,17 +979,11 @@ def show_user_menu():
     st.sidebar.markdown("---")
     
     # User info
-    role_badge = {
-        UserRole.CLIENT: "🧑‍💼 ลูกค้า",
-        UserRole.ADVISOR: "👨‍💼 ที่ปรึกษา",
-        UserRole.ADMIN: "👑 แอดมิน"
-    }
-    
     st.sidebar.markdown(f"""
     <div style='padding: 1rem; background: #1a1d24; border-radius: 10px; margin-bottom: 1rem;'>
         <p style='color: #888; margin: 0; font-size: 0.85rem;'>เข้าสู่ระบบในฐานะ</p>
         <p style='color: #fff; margin: 0.3rem 0 0 0; font-weight: 600;'>{user.full_name}</p>
-        <p style='color: #00D26A; margin: 0.2rem 0 0 0; font-size: 0.9rem;'>{role_badge.get(user.role, "")}</p>
+        <p style='color: #00D26A; margin: 0.2rem 0 0 0; font-size: 0.9rem;'>{ROLE_BADGE.get(user.role, "")}</p>
     </div>
     """, unsafe_allow_html=True)
     
@@ -723,28 +993,7 @@ def show_user_menu():
         st.rerun()
 
 
-def get_menu_by_role(user: User) -> Tuple[List[str], List[str]]:
+def get_menu_by_role(user: User) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
     """ดึงเมนูตาม role ของ user"""
-    base_menu = ["แดชบอร์ด", "จัดการพอร์ต"]
-    base_icons = ["speedometer2", "wallet2"]
-    
-    if user.is_client:
-        return (
-            base_menu + ["Monte Carlo", "วางแผนภาษี", "รายงาน PDF", "ติดต่อที่ปรึกษา"],
-            base_icons + ["bar-chart-line", "calculator", "file-pdf", "telephone"]
-        )
-    
-    elif user.is_advisor:
-        return (
-            base_menu + ["ลูกค้าของฉัน", "Black-Litterman", "Monte Carlo", "ปรับสมดุล", "รายงาน PDF"],
-            base_icons + ["people", "graph-up-arrow", "bar-chart-line", "arrow-repeat", "file-pdf"]
-        )
-    
-    elif user.is_admin:
-        return (
-            base_menu + ["จัดการผู้ใช้", "Black-Litterman", "Monte Carlo", "ปรับสมดุล", "วางแผนภาษี", "รายงาน PDF", "ติดต่อที่ปรึกษา"],
-            base_icons + ["people-fill", "graph-up-arrow", "bar-chart-line", "arrow-repeat", "calculator", "file-pdf", "telephone"]
-        )
-    
-    return base_menu, base_icons
+    return MENU_BY_ROLE.get(user.role, (BASE_MENU, BASE_ICONS))
 
@@ -7,12 +7,20 @@ Handles all data fetching operations including:
 - Supabase connection simulation
 """
 
+import copy
+import functools
+import math
+import os
+import time
+from pathlib import Path
 import pandas as pd
 import numpy as np
-import yfinance as yf
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 
+# Optional JIT backend for the synthetic price generator
+from jit_backend import NUMBA_AVAILABLE, njit, prange
+
 # =============================================================================
 # ASSET CONFIGURATION
 # =============================================================================
@@ -37,6 +45,14 @@ MARKET_CAPS = {
     "Gold": 3000,         # Gold market
     "Bonds": 50000        # US Bond market
 }
+_TOTAL_CAP = sum(MARKET_CAPS.values())
+# Weights for the full universe, normalized once at import
+MARKET_CAP_WEIGHTS = {asset: cap / _TOTAL_CAP for asset, cap in MARKET_CAPS.items()}
+
+# On-disk Parquet cache of downloaded close prices, one file per
+# ticker/period/interval; survives server restarts (needs pyarrow)
+PRICE_CACHE_DIR = Path(os.getenv("SWA_CACHE_DIR", Path.home() / ".cache" / "swa"))
+PRICE_CACHE_TTL = 12 * 3600  # seconds before a cached series is re-fetched
 
 
 # =============================================================================
@@ -71,28 +87,21 @@ def get_historical_prices(
         tickers = ASSET_TICKERS
     
     try:
-        # Download data for all tickers at once for efficiency
-        ticker_symbols = list(tickers.values())
-        data = yf.download(
-            ticker_symbols, 
-            period=period, 
-            interval=interval,
-            progress=False,
-            auto_adjust=True
-        )
+        # Fresh per-ticker series from the disk cache; download only the rest
+        closes = {
+            asset: _read_cached_close(symbol, period, interval)
+            for asset, symbol in tickers.items()
+        }
+        missing = {asset: symbol for asset, symbol in tickers.items() if closes[asset] is None}
         
-        # Extract Close prices
-        if len(ticker_symbols) == 1:
-            prices = data[['Close']].copy()
-            prices.columns = [list(tickers.keys())[0]]
-        else:
-            prices = data['Close'].copy()
-            # Rename columns to asset names
-            reverse_map = {v: k for k, v in tickers.items()}
-            prices.columns = [reverse_map.get(col, col) for col in prices.columns]
+        if missing:
+            fetched = _download_closes(missing, period, interval)
+            for asset, symbol in missing.items():
+                closes[asset] = fetched[asset]
+                _write_cached_close(fetched[asset], symbol, period, interval)
         
         # Drop any rows with missing values
-        prices = prices.dropna()
+        prices = pd.DataFrame(closes).dropna()
         
         return prices
         
@@ -102,6 +111,82 @@ def get_historical_prices(
         return _generate_synthetic_prices(tickers, period)
 
 
+if NUMBA_AVAILABLE:
+    @njit("float64[:, :](float64[:, :], float64[:], float64[:], float64[:])",
+          parallel=True, cache=True)
+    def _gbm_paths(shocks, daily_return, daily_vol, initial):
+        """GBM price paths from (n_days, n_assets) shocks, one parallel task per asset."""
+        n_days, n_assets = shocks.shape
+        out = np.empty((n_days, n_assets))
+        for j in prange(n_assets):
+            log_price = 0.0
+            for i in range(n_days):
+                log_price += daily_return[j] + daily_vol[j] * shocks[i, j]
+                out[i, j] = initial[j] * math.exp(log_price)
+        return out
+
+
+def _download_closes(
+    tickers: Dict[str, str],
+    period: str,
+    interval: str
+) -> pd.DataFrame:
+    """Close prices for `tickers` from yfinance, columns renamed to asset names."""
+    # Imported on first download only: yfinance pulls in requests/lxml and
+    # is never needed when every ticker is served from the parquet cache.
+    import yfinance as yf
+    
+    # Download data for all tickers at once (threaded per ticker)
+    ticker_symbols = list(tickers.values())
+    data = yf.download(
+        ticker_symbols, 
+        period=period, 
+        interval=interval,
+        progress=False,
+        auto_adjust=True,
+        threads=True
+    )
+    
+    # Extract Close prices
+    if len(ticker_symbols) == 1:
+        prices = data[['Close']].copy()
+        prices.columns = [list(tickers.keys())[0]]
+    else:
+        prices = data['Close'].copy()
+        # Rename columns to asset names
+        reverse_map = {v: k for k, v in tickers.items()}
+        prices.columns = [reverse_map.get(col, col) for col in prices.columns]
+    return prices
+
+
+def _price_cache_path(symbol: str, period: str, interval: str) -> Path:
+    return PRICE_CACHE_DIR / f"{symbol}_{period}_{interval}.parquet"
+
+
+def _read_cached_close(symbol: str, period: str, interval: str) -> Optional[pd.Series]:
+    """Cached close series if younger than PRICE_CACHE_TTL, else None."""
+    path = _price_cache_path(symbol, period, interval)
+    try:
+        if time.time() - path.stat().st_mtime > PRICE_CACHE_TTL:
+            return None
+        return pd.read_parquet(path)["Close"]
+    except (OSError, ImportError, ValueError, KeyError):
+        return None
+
+
+def _write_cached_close(close: pd.Series, symbol: str, period: str, interval: str):
+    """Best-effort write; a failed or empty download is never cached."""
+    if close.dropna().empty:
+        return
+    try:
+        PRICE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        close.to_frame("Close").to_parquet(
+            _price_cache_path(symbol, period, interval), compression="zstd"
+        )
+    except (OSError, ImportError, ValueError):
+        pass
+
+
 def _generate_synthetic_prices(
     tickers: Dict[str, str], 
     period: str = "2y"
@@ -126,22 +211,27 @@ def _generate_synthetic_prices(
         "Bonds": (0.03, 0.05, 100)
     }
     
-    np.random.seed(42)  # For reproducibility
-    prices_data = {}
+    assets = list(tickers)
+    mu, sigma, initial = np.array(
+        [params.get(asset, (0.07, 0.18, 100)) for asset in assets], dtype=np.float64
+    ).reshape(-1, 3).T
     
-    for asset in tickers.keys():
-        mu, sigma, initial = params.get(asset, (0.07, 0.18, 100))
-        
-        # Daily parameters
-        daily_return = mu / 252
-        daily_vol = sigma / np.sqrt(252)
-        
-        # Generate GBM path
-        returns = np.random.normal(daily_return, daily_vol, n_days)
-        price_path = initial * np.exp(np.cumsum(returns))
-        prices_data[asset] = price_path
+    # Daily parameters, broadcast across the asset columns
+    daily_return = mu / 252
+    daily_vol = sigma / np.sqrt(252)
+    
+    # All GBM shocks in one (n_days, n_assets) draw, shared by both backends
+    rng = np.random.default_rng(42)  # For reproducibility
+    shocks = rng.standard_normal((n_days, len(assets)))
+    
+    if NUMBA_AVAILABLE:
+        # Running log-price per asset, no (n_days, n_assets) temporaries
+        prices = _gbm_paths(shocks, daily_return, daily_vol, initial)
+    else:
+        returns = shocks * daily_vol + daily_return
+        prices = initial * np.exp(np.cumsum(returns, axis=0))
     
-    return pd.DataFrame(prices_data, index=dates)
+    return pd.DataFrame(prices, index=dates, columns=assets)
 
 
 def get_market_caps(assets: Optional[List[str]] = None) -> Dict[str, float]:
@@ -159,7 +249,7 @@ def get_market_caps(assets: Optional[List[str]] = None) -> Dict[str, float]:
         Mapping of asset names to market cap weights (normalized to sum to 1)
     """
     if assets is None:
-        assets = list(MARKET_CAPS.keys())
+        return MARKET_CAP_WEIGHTS.copy()
     
     caps = {asset: MARKET_CAPS.get(asset, 1000) for asset in assets}
     total = sum(caps.values())
@@ -176,7 +266,11 @@ def calculate_returns(prices: pd.DataFrame) -> pd.DataFrame:
     2. They are symmetric (for small returns)
     3. Better for statistical properties
     """
-    return np.log(prices / prices.shift(1)).dropna()
+    # log(p_t / p_{t-1}) as a difference of one log pass on the raw array
+    log_prices = np.log(prices.to_numpy())
+    returns = log_prices[1:] - log_prices[:-1]
+    keep = ~np.isnan(returns).any(axis=1)  # same rows as .dropna()
+    return pd.DataFrame(returns[keep], index=prices.index[1:][keep], columns=prices.columns)
 
 
 def calculate_statistics(
@@ -194,9 +288,16 @@ def calculate_statistics(
     """
     returns = calculate_returns(prices)
     
+    # One mean pass, reused for centering; rows are NaN-free after
+    # calculate_returns, so the sample covariance is a single matmul
+    X = returns.to_numpy(dtype=np.float64)
+    mean = X.mean(axis=0)
+    Xc = X - mean
+    cov = (Xc.T @ Xc) / (X.shape[0] - 1)
+    
     # Annualize: multiply daily stats by 252 trading days
-    expected_returns = returns.mean() * 252
-    cov_matrix = returns.cov() * 252
+    expected_returns = pd.Series(mean * 252, index=returns.columns)
+    cov_matrix = pd.DataFrame(cov * 252, index=returns.columns, columns=returns.columns)
     
     return expected_returns, cov_matrix
 
@@ -205,6 +306,32 @@ def calculate_statistics(
 # SUPABASE SIMULATION
 # =============================================================================
 
+# Sample client data, copied into each SupabaseSimulator
+MOCK_CLIENT_DATA = {
+    "clients": [
+        {
+            "id": 1,
+            "name": "John Doe",
+            "total_assets": 5000000,
+            "ytd_return": 0.0823,
+            "risk_score": 7,
+            "portfolio": {
+                "Thai Stock": 0.30,
+                "US Tech": 0.35,
+                "Gold": 0.15,
+                "Bonds": 0.20
+            },
+            "target_allocation": {
+                "Thai Stock": 0.25,
+                "US Tech": 0.35,
+                "Gold": 0.20,
+                "Bonds": 0.20
+            }
+        }
+    ]
+}
+
+
 class SupabaseSimulator:
     """
     Simulates Supabase connection for prototype purposes.
@@ -215,33 +342,8 @@ class SupabaseSimulator:
         self.url = url
         self.key = key
         self.connected = True
-        self._mock_data = self._init_mock_data()
-    
-    def _init_mock_data(self) -> Dict:
-        """Initialize mock client data."""
-        return {
-            "clients": [
-                {
-                    "id": 1,
-                    "name": "John Doe",
-                    "total_assets": 5000000,
-                    "ytd_return": 0.0823,
-                    "risk_score": 7,
-                    "portfolio": {
-                        "Thai Stock": 0.30,
-                        "US Tech": 0.35,
-                        "Gold": 0.15,
-                        "Bonds": 0.20
-                    },
-                    "target_allocation": {
-                        "Thai Stock": 0.25,
-                        "US Tech": 0.35,
-                        "Gold": 0.20,
-                        "Bonds": 0.20
-                    }
-                }
-            ]
-        }
+        # Private copy: update_portfolio mutates it
+        self._mock_data = copy.deepcopy(MOCK_CLIENT_DATA)
     
     def get_client(self, client_id: int = 1) -> Dict:
         """Fetch client data by ID."""
@@ -263,9 +365,10 @@ class SupabaseSimulator:
         return self.connected
 
 
+@functools.lru_cache(maxsize=1)
 def simulate_supabase_connection() -> SupabaseSimulator:
     """
-    Create and return a simulated Supabase connection.
+    Return the simulated Supabase connection (one shared instance per process).
     
     Usage:
         db = simulate_supabase_connection()
@@ -0,0 +1,19 @@
+"""
+JIT Backend
+===========
+Optional numba setup shared by every module with compiled kernels
+(models, data_loader, algo, tax_optimizer), so the threading layer is
+configured in one place before any of them compiles.
+"""
+
+try:
+    import numba
+    from numba import njit, prange
+    # Streamlit launches parallel kernels from script threads; under TBB
+    # that leaves a worker pool which blocks interpreter shutdown, so prefer
+    # OpenMP (still thread-safe) when it is available
+    numba.config.THREADING_LAYER_PRIORITY = ["omp", "tbb", "workqueue"]
+    NUMBA_AVAILABLE = True
+except ImportError:
+    njit = prange = None
+    NUMBA_AVAILABLE = False
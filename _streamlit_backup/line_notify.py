@@ -9,12 +9,22 @@ LINE Notify Integration Module
 3. เรียกใช้ send_line_notify()
 """
 
+import asyncio
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dataclasses import dataclass
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 from datetime import datetime
 import os
 
+# Optional async client for sending many alerts concurrently
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
 
 # =============================================================================
 # CONFIGURATION
@@ -22,6 +32,29 @@ import os
 
 # LINE Notify API Endpoint
 LINE_NOTIFY_API = "https://notify-api.line.me/api/notify"
+LINE_NOTIFY_TIMEOUT = 10  # seconds per request
+# Max concurrent connections when broadcasting alerts
+LINE_BROADCAST_CONNECTIONS = 50
+
+# Keep-alive session for sync sends: one TCP/TLS handshake per pooled
+# connection instead of per message. POST is retried, with a short backoff,
+# only when the connection could not be opened or the server answered 5xx;
+# read timeouts and other errors are not retried (the message may have
+# been delivered already).
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=10,
+    max_retries=Retry(
+        total=2,
+        read=0,
+        other=0,
+        backoff_factor=0.2,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset({"POST"}),
+        raise_on_status=False
+    )
+))
 
 # ดึง Token จาก Environment Variable หรือใช้ค่า default (mock mode)
 LINE_NOTIFY_TOKEN = os.getenv("LINE_NOTIFY_TOKEN", "")
@@ -30,6 +63,23 @@ LINE_NOTIFY_TOKEN = os.getenv("LINE_NOTIFY_TOKEN", "")
 MOCK_MODE = True  # เปลี่ยนเป็น False เมื่อมี Token จริง
 
 
+# Advisor alert message: emoji by priority and the fixed body template
+PRIORITY_EMOJI = {
+    "NORMAL": "📊",
+    "HIGH": "⚠️",
+    "URGENT": "🚨"
+}
+ALERT_TEMPLATE = """
+{emoji} แจ้งเตือนจากระบบ Wealth Advisor
+
+👤 ลูกค้า: {name} (ID: {cid})
+💰 มูลค่าพอร์ต: ฿{pv:,.0f}
+{change_symbol} เปลี่ยนแปลง: ฿{dc:+,.0f} ({dcp:+.2f}%)
+
+📋 เหตุผล: {reason}
+"""
+
+
 # =============================================================================
 # DATA CLASSES
 # =============================================================================
@@ -83,37 +133,11 @@ def send_line_notify(
     
     # Mock mode - ไม่ส่งจริง แต่ log ไว้
     if MOCK_MODE or not use_token:
-        print(f"[MOCK LINE NOTIFY] {timestamp}")
-        print(f"Message: {message}")
-        print("-" * 50)
-        
-        return NotifyResult(
-            success=True,
-            status_code=200,
-            message="[MOCK] ข้อความถูกบันทึก (ไม่ได้ส่งจริง)",
-            timestamp=timestamp,
-            mock_mode=True
-        )
+        return _mock_notify(message, timestamp)
     
     # ส่งจริง
     try:
-        headers = {
-            "Authorization": f"Bearer {use_token}",
-            "Content-Type": "application/x-www-form-urlencoded"
-        }
-        
-        payload = {"message": message}
-        
-        if image_url:
-            payload["imageThumbnail"] = image_url
-            payload["imageFullsize"] = image_url
-        
-        response = requests.post(
-            LINE_NOTIFY_API,
-            headers=headers,
-            data=payload,
-            timeout=10
-        )
+        response = post_line_notify(message, use_token, image_url)
         
         if response.status_code == 200:
             return NotifyResult(
@@ -139,36 +163,141 @@ def send_line_notify(
         )
 
 
-def format_advisor_alert(alert: AdvisorAlert) -> str:
+def post_line_notify(
+    message: str,
+    token: str,
+    image_url: Optional[str] = None,
+    session: Optional[requests.Session] = None
+) -> requests.Response:
     """
-    จัดรูปแบบข้อความแจ้งเตือนที่ปรึกษา
+    POST ไปที่ LINE Notify โดยตรง (ไม่มี mock mode, ไม่ดัก exception)
+    
+    ใช้โดย send_line_notify และ Celery task ใน tasks.py
     
     Args:
-        alert: ข้อมูลการแจ้งเตือน
+        session: session ที่ใช้ส่ง (default: _SESSION ที่ retry connect/5xx เอง)
     
-    Returns:
-        ข้อความที่จัดรูปแบบแล้ว
+    Raises:
+        requests.exceptions.RequestException เมื่อเชื่อมต่อไม่ได้
     """
-    # กำหนด emoji ตาม priority
-    priority_emoji = {
-        "NORMAL": "📊",
-        "HIGH": "⚠️",
-        "URGENT": "🚨"
+    return (session or _SESSION).post(
+        LINE_NOTIFY_API,
+        headers=_line_headers(token),
+        data=_line_payload(message, image_url),
+        timeout=LINE_NOTIFY_TIMEOUT
+    )
+
+
+def _line_headers(token: str) -> Dict[str, str]:
+    """HTTP headers สำหรับ LINE Notify"""
+    return {
+        "Authorization": f"Bearer {token}",
+        "Content-Type": "application/x-www-form-urlencoded"
     }
-    emoji = priority_emoji.get(alert.priority, "📊")
+
+
+def _line_payload(message: str, image_url: Optional[str] = None) -> Dict[str, str]:
+    """Form body สำหรับ LINE Notify"""
+    payload = {"message": message}
     
-    # กำหนดสีตามการเปลี่ยนแปลง
-    change_symbol = "📈" if alert.daily_change >= 0 else "📉"
+    if image_url:
+        payload["imageThumbnail"] = image_url
+        payload["imageFullsize"] = image_url
     
-    message = f"""
-{emoji} แจ้งเตือนจากระบบ Wealth Advisor
+    return payload
 
-👤 ลูกค้า: {alert.client_name} (ID: {alert.client_id})
-💰 มูลค่าพอร์ต: ฿{alert.portfolio_value:,.0f}
-{change_symbol} เปลี่ยนแปลง: ฿{alert.daily_change:+,.0f} ({alert.daily_change_pct:+.2f}%)
 
-📋 เหตุผล: {alert.alert_reason}
-"""
+def _mock_notify(message: str, timestamp: str) -> NotifyResult:
+    """Mock mode - log ข้อความแทนการส่งจริง"""
+    print(f"[MOCK LINE NOTIFY] {timestamp}")
+    print(f"Message: {message}")
+    print("-" * 50)
+    
+    return NotifyResult(
+        success=True,
+        status_code=200,
+        message="[MOCK] ข้อความถูกบันทึก (ไม่ได้ส่งจริง)",
+        timestamp=timestamp,
+        mock_mode=True
+    )
+
+
+async def send_line_notify_async(
+    message: str,
+    session: "aiohttp.ClientSession",
+    token: Optional[str] = None,
+    image_url: Optional[str] = None
+) -> NotifyResult:
+    """
+    ส่งข้อความผ่าน LINE Notify แบบ async (ใช้ session ร่วมกัน)
+    
+    Args:
+        message: ข้อความที่ต้องการส่ง
+        session: aiohttp.ClientSession ที่ใช้ส่ง
+        token: LINE Notify Token (ถ้าไม่ระบุจะใช้ค่าจาก env)
+        image_url: URL รูปภาพ (optional)
+    
+    Returns:
+        NotifyResult พร้อมสถานะการส่ง
+    """
+    use_token = token or LINE_NOTIFY_TOKEN
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    
+    if MOCK_MODE or not use_token:
+        return _mock_notify(message, timestamp)
+    
+    try:
+        async with session.post(
+            LINE_NOTIFY_API,
+            headers=_line_headers(use_token),
+            data=_line_payload(message, image_url),
+            timeout=aiohttp.ClientTimeout(total=LINE_NOTIFY_TIMEOUT)
+        ) as response:
+            if response.status == 200:
+                return NotifyResult(
+                    success=True,
+                    status_code=200,
+                    message="ส่งข้อความสำเร็จ",
+                    timestamp=timestamp
+                )
+            return NotifyResult(
+                success=False,
+                status_code=response.status,
+                message=f"Error: {await response.text()}",
+                timestamp=timestamp
+            )
+    
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        return NotifyResult(
+            success=False,
+            status_code=500,
+            message=f"Connection Error: {str(e)}",
+            timestamp=timestamp
+        )
+
+
+def format_advisor_alert(alert: AdvisorAlert) -> str:
+    """
+    จัดรูปแบบข้อความแจ้งเตือนที่ปรึกษา
+    
+    Args:
+        alert: ข้อมูลการแจ้งเตือน
+    
+    Returns:
+        ข้อความที่จัดรูปแบบแล้ว
+    """
+    message = ALERT_TEMPLATE.format(
+        # กำหนด emoji ตาม priority
+        emoji=PRIORITY_EMOJI.get(alert.priority, "📊"),
+        name=alert.client_name,
+        cid=alert.client_id,
+        pv=alert.portfolio_value,
+        # กำหนดสีตามการเปลี่ยนแปลง
+        change_symbol="📈" if alert.daily_change >= 0 else "📉",
+        dc=alert.daily_change,
+        dcp=alert.daily_change_pct,
+        reason=alert.alert_reason
+    )
     
     if alert.contact_phone:
         message += f"📞 โทร: {alert.contact_phone}\n"
@@ -193,9 +322,60 @@ def send_advisor_alert(alert: AdvisorAlert, token: Optional[str] = None) -> Noti
         NotifyResult
     """
     message = format_advisor_alert(alert)
+    use_token = token or LINE_NOTIFY_TOKEN
+    
+    # With a Celery broker configured, hand the HTTP call to a worker so
+    # the Streamlit request never waits on LINE (up to the 10s timeout)
+    if not MOCK_MODE and use_token:
+        from tasks import enqueue_line_notify
+        if enqueue_line_notify(message, use_token):
+            return NotifyResult(
+                success=True,
+                status_code=202,
+                message="ส่งคำขอเข้าคิวแล้ว",
+                timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            )
+    
     return send_line_notify(message, token)
 
 
+async def broadcast_alerts_async(
+    alerts: List[AdvisorAlert],
+    token: Optional[str] = None
+) -> List[NotifyResult]:
+    """
+    ส่งการแจ้งเตือนหลายรายการพร้อมกันผ่าน connection pool เดียว
+    
+    Returns:
+        NotifyResult ตามลำดับของ alerts
+    """
+    connector = aiohttp.TCPConnector(limit=LINE_BROADCAST_CONNECTIONS)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        return list(await asyncio.gather(*(
+            send_line_notify_async(format_advisor_alert(alert), session, token)
+            for alert in alerts
+        )))
+
+
+def broadcast_alerts(alerts: List[AdvisorAlert], token: Optional[str] = None) -> List[NotifyResult]:
+    """
+    ส่งการแจ้งเตือนหลายรายการ (พร้อมกันถ้ามี aiohttp)
+    
+    Args:
+        alerts: รายการการแจ้งเตือน
+        token: LINE Notify Token
+    
+    Returns:
+        NotifyResult ตามลำดับของ alerts
+    """
+    use_token = token or LINE_NOTIFY_TOKEN
+    if MOCK_MODE or not use_token or not AIOHTTP_AVAILABLE or len(alerts) < 2:
+        return [send_advisor_alert(alert, token) for alert in alerts]
+    
+    # Called from sync code (Streamlit script thread has no running loop)
+    return asyncio.run(broadcast_alerts_async(alerts, token))
+
+
 # =============================================================================
 # HELPER FUNCTIONS
 # =============================================================================
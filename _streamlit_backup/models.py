@@ -9,19 +9,64 @@ Contains mathematical models for:
 
 import numpy as np
 import pandas as pd
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Union
 from dataclasses import dataclass
 
+# Optional JIT backend for the Monte Carlo kernel
+from jit_backend import NUMBA_AVAILABLE, njit, prange
+
+# Optional GPU backend for Monte Carlo (install the cupy wheel matching
+# the local CUDA toolkit, e.g. cupy-cuda12x)
+try:
+    import cupy as cp
+    HAS_GPU = cp.cuda.runtime.getDeviceCount() > 0
+except Exception:  # ImportError, or cupy present without a usable device
+    cp = None
+    HAS_GPU = False
+
+# CUDA source for the GPU Monte Carlo: one thread per path, advancing
+# n_periods months from wealth[i] (updated in place) with the running value
+# in a register. Shocks/out are time-major (period, simulation) so
+# neighbouring threads read neighbouring words.
+_GBM_CUDA_SRC = r'''
+extern "C" __global__
+void gbm_chunk(const float* shocks, float* out, double* wealth,
+               const long long n_sim, const int n_periods,
+               const double contribution, const double drift, const double vol)
+{
+    long long i = (long long)blockIdx.x * blockDim.x + threadIdx.x;
+    if (i >= n_sim) return;
+    double w = wealth[i];
+    for (int t = 0; t < n_periods; ++t) {
+        w = w * exp(drift + vol * (double)shocks[t * n_sim + i]) + contribution;
+        out[t * n_sim + i] = (float)w;
+    }
+    wealth[i] = w;
+}
+'''
+_gbm_chunk_kernel = cp.RawKernel(_GBM_CUDA_SRC, "gbm_chunk") if HAS_GPU else None
+
 
 # =============================================================================
 # MONTE CARLO SIMULATION
 # =============================================================================
 
+# Below this many paths the numba thread fan-out costs more than it saves
+MC_PARALLEL_MIN_SIMS = 1000
+# GPU only pays off (host<->device copies, launch) for very large runs
+MC_GPU_MIN_SIMS = 100_000
+GPU_THREADS_PER_BLOCK = 256
+# Rows of shocks per RNG stream (stream b = seed jumped b times)
+MC_RNG_BLOCK_ROWS = 10_000
+# Months advanced per step; shocks (and, with return_paths=False, the
+# simulated values) are held for one such chunk at a time
+MC_TIME_CHUNK = 32
+
 @dataclass
 class SimulationResult:
     """Container for Monte Carlo simulation results."""
     years: np.ndarray
-    paths: np.ndarray  # Shape: (n_simulations, n_years)
+    paths: Optional[np.ndarray]  # Shape: (n_simulations, n_years), float32; None if not kept
     percentile_10: np.ndarray
     percentile_50: np.ndarray
     percentile_90: np.ndarray
@@ -36,7 +81,11 @@ def run_monte_carlo(
     annual_return: float = 0.07,
     annual_volatility: float = 0.15,
     n_simulations: int = 1000,
-    goal_amount: Optional[float] = None
+    goal_amount: Optional[float] = None,
+    noise: Optional[np.ndarray] = None,
+    parallel: Optional[bool] = None,
+    backend: Optional[str] = None,
+    return_paths: bool = True
 ) -> SimulationResult:
     """
     Run Monte Carlo simulation for retirement planning.
@@ -71,6 +120,22 @@ def run_monte_carlo(
         Number of simulation paths (default 1000)
     goal_amount : float, optional
         Target retirement amount for success probability
+    noise : np.ndarray, optional
+        Pre-drawn standard normals of shape at least
+        (n_simulations, years_to_retire * 12). Only the leading block is
+        read and the array is never modified, so it can be shared across
+        calls (e.g. cached between Streamlit reruns).
+    parallel : bool, optional
+        Run the numba kernel across threads. Defaults to True when
+        n_simulations >= MC_PARALLEL_MIN_SIMS.
+    backend : {"cpu", "cuda"}, optional
+        Where to simulate. Defaults to "cuda" when a CuPy device is present
+        and n_simulations >= MC_GPU_MIN_SIMS; "cuda" without a device falls
+        back to the CPU.
+    return_paths : bool
+        Keep every path in the result (default). With False, `paths` is
+        None and memory no longer grows with n_simulations * n_periods.
+        Both settings draw the same shocks and give the same statistics.
         
     Returns
     -------
@@ -86,8 +151,6 @@ def run_monte_carlo(
     This helps clients understand the range of possible outcomes
     and plan accordingly.
     """
-    np.random.seed(42)  # For reproducibility in demo
-    
     # Time parameters
     n_periods = years_to_retire * 12  # Monthly periods
     dt = 1/12  # Time step (1 month = 1/12 year)
@@ -100,27 +163,21 @@ def run_monte_carlo(
     # E[exp(X)] = exp(μ + σ²/2), so we subtract σ²/2 from μ
     drift = (annual_return - 0.5 * annual_volatility**2) / 12
     
-    # Initialize paths array
-    paths = np.zeros((n_simulations, n_periods + 1))
-    paths[:, 0] = current_wealth
+    if backend is None:
+        backend = "cuda" if HAS_GPU and n_simulations >= MC_GPU_MIN_SIMS else "cpu"
+    elif backend not in ("cpu", "cuda"):
+        raise ValueError(f"Unknown backend: {backend!r}")
     
-    # Generate random returns for all simulations at once
-    # Using vectorized operations for efficiency
-    random_shocks = np.random.standard_normal((n_simulations, n_periods))
-    
-    # Simulate paths
-    for t in range(1, n_periods + 1):
-        # GBM step: S(t+1) = S(t) * exp(drift + vol * Z) + contribution
-        growth_factor = np.exp(drift + monthly_volatility * random_shocks[:, t-1])
-        paths[:, t] = paths[:, t-1] * growth_factor + monthly_contribution
-    
-    # Calculate statistics at each time point
-    percentile_10 = np.percentile(paths, 10, axis=0)
-    percentile_50 = np.percentile(paths, 50, axis=0)
-    percentile_90 = np.percentile(paths, 90, axis=0)
-    
-    # Final values for success probability
-    final_values = paths[:, -1]
+    if backend == "cuda" and HAS_GPU:
+        paths, (percentile_10, percentile_50, percentile_90), final_values = _simulate_paths_gpu(
+            current_wealth, monthly_contribution, drift, monthly_volatility,
+            n_simulations, n_periods, noise, return_paths
+        )
+    else:
+        paths, (percentile_10, percentile_50, percentile_90), final_values = _simulate_cpu(
+            current_wealth, monthly_contribution, drift, monthly_volatility,
+            n_simulations, n_periods, noise, parallel, return_paths
+        )
     
     # Calculate probability of reaching goal
     if goal_amount is not None:
@@ -142,16 +199,239 @@ def run_monte_carlo(
     )
 
 
+def _simulate_cpu(
+    current_wealth: float,
+    monthly_contribution: float,
+    drift: float,
+    monthly_volatility: float,
+    n_simulations: int,
+    n_periods: int,
+    noise: Optional[np.ndarray] = None,
+    parallel: Optional[bool] = None,
+    return_paths: bool = True
+) -> Tuple[Optional[np.ndarray], np.ndarray, np.ndarray]:
+    """
+    GBM simulation on the CPU, MC_TIME_CHUNK months at a time.
+    
+    Every simulation advances one time chunk per step, with wealth carried
+    over between chunks in float64, and each chunk is reduced to exact
+    percentiles right away. With `return_paths` the chunk is a view into
+    the float32 (n_simulations, n_periods + 1) paths; otherwise it is one
+    reused (n_simulations, MC_TIME_CHUNK) buffer, so memory is
+    O(n_simulations * MC_TIME_CHUNK). Internally drawn shocks come chunk by
+    chunk from one PCG64 stream per MC_RNG_BLOCK_ROWS rows (stream b = seed
+    jumped b times), so both modes see the same sample.
+    
+    Returns
+    -------
+    tuple
+        (paths or None, percentiles of shape (3, n_periods + 1),
+        float32 final values)
+    """
+    wealth = np.full(n_simulations, float(current_wealth))
+    percentiles = np.empty((3, n_periods + 1))
+    percentiles[:, 0] = current_wealth
+    
+    width = min(MC_TIME_CHUNK, n_periods)
+    if return_paths:
+        paths = np.empty((n_simulations, n_periods + 1), dtype=np.float32)
+        paths[:, 0] = current_wealth
+    else:
+        paths = None
+        values = np.empty((n_simulations, width), dtype=np.float32)
+    if noise is None:
+        # PCG64 streams, seeded for reproducibility in demo. Flat buffer so
+        # every (n_simulations, k) view of it is contiguous
+        shock_buf = np.empty(n_simulations * width, dtype=np.float32)
+        rngs = [np.random.Generator(np.random.PCG64(42).jumped(b))
+                for b in range(-(-n_simulations // MC_RNG_BLOCK_ROWS))]
+    
+    if NUMBA_AVAILABLE:
+        if parallel is None:
+            parallel = n_simulations >= MC_PARALLEL_MIN_SIMS
+        kernel = _mc_chunk_kernel if parallel else _mc_chunk_kernel_serial
+    
+    for t0 in range(0, n_periods, MC_TIME_CHUNK):
+        k = min(MC_TIME_CHUNK, n_periods - t0)
+        if noise is not None:
+            random_shocks = noise[:n_simulations, t0:t0 + k]
+        else:
+            random_shocks = shock_buf[:n_simulations * k].reshape(n_simulations, k)
+            for b, rng in enumerate(rngs):
+                rows = random_shocks[b * MC_RNG_BLOCK_ROWS:(b + 1) * MC_RNG_BLOCK_ROWS]
+                rng.standard_normal(out=rows, dtype=np.float32)
+        
+        chunk = paths[:, t0 + 1:t0 + k + 1] if return_paths else values[:, :k]
+        if NUMBA_AVAILABLE:
+            kernel(
+                random_shocks, chunk, wealth, float(monthly_contribution),
+                float(drift), float(monthly_volatility)
+            )
+        else:
+            wealth[:] = _gbm_block(
+                random_shocks, chunk, wealth[:, np.newaxis],
+                monthly_contribution, drift, monthly_volatility
+            )[:, 0]
+        percentiles[:, t0 + 1:t0 + k + 1] = np.percentile(chunk, [10, 50, 90], axis=0)
+    
+    return paths, percentiles, wealth.astype(np.float32)
+
+
+def _gbm_block(random_shocks, out, start_wealth, monthly_contribution, drift, monthly_volatility):
+    """
+    NumPy GBM values for the months in ``random_shocks`` (no numba).
+    
+    Starts from ``start_wealth`` (a scalar or an (n, 1) float64 column),
+    writes every month into the float32 ``out`` (n, k) and returns the
+    last month as an (n, 1) float64 column.
+    """
+    # Unrolled GBM recurrence (same closed form as the GPU path):
+    #   S(t) = G(t) * (S(0) + c * Σ_{s<=t} 1/G(s)),  G(t) = Π_{s<=t} g(s)
+    # G is built as exp(cumsum(log g)) so long horizons stay stable;
+    # the log-growth sum is kept in float64, the paths are float32.
+    # Every step after the first multiply runs in place on G, so the
+    # only temporaries are G itself and the contribution sums
+    G = np.multiply(random_shocks, monthly_volatility, dtype=np.float64)
+    G += drift
+    np.cumsum(G, axis=1, out=G)
+    np.exp(G, out=G)
+    
+    if monthly_contribution:
+        contributions = np.reciprocal(G)
+        np.cumsum(contributions, axis=1, out=contributions)
+        contributions *= monthly_contribution
+        contributions += start_wealth
+        np.multiply(G, contributions, out=out)
+        return G[:, -1:] * contributions[:, -1:]
+    np.multiply(G, start_wealth, out=out)
+    return G[:, -1:] * start_wealth
+
+
+if NUMBA_AVAILABLE:
+    from numba import types as nb_types
+    
+    # Eager signatures for float32 or float64 shocks (read-only, any layout):
+    # both are compiled or loaded from the on-disk cache at import, so the
+    # first simulation doesn't pay for JIT. Wealth compounds in float64;
+    # only the stored values are float32 (half the memory traffic)
+    _MC_CHUNK_SIGNATURES = [
+        nb_types.void(
+            nb_types.Array(dtype, 2, "A", readonly=True), nb_types.float32[:, :],
+            nb_types.float64[::1], nb_types.float64, nb_types.float64, nb_types.float64
+        )
+        for dtype in (nb_types.float32, nb_types.float64)
+    ]
+    
+    @njit(_MC_CHUNK_SIGNATURES, parallel=True, fastmath=True, cache=True)
+    def _mc_chunk_kernel(shocks, out, wealth, monthly_contribution, drift, monthly_volatility):
+        """
+        Advance every simulation by shocks.shape[1] months from ``wealth``
+        (updated in place), writing each month into ``out``. Simulations
+        are independent, so the outer loop runs in parallel and wealth is
+        compounded in a register instead of through array temporaries.
+        """
+        n_simulations, n_periods = shocks.shape
+        for i in prange(n_simulations):
+            w = wealth[i]
+            for t in range(n_periods):
+                # GBM step: S(t+1) = S(t) * exp(drift + vol * Z) + contribution
+                w = w * np.exp(drift + monthly_volatility * shocks[i, t]) + monthly_contribution
+                out[i, t] = w
+            wealth[i] = w
+    
+    @njit(_MC_CHUNK_SIGNATURES, fastmath=True, cache=True)
+    def _mc_chunk_kernel_serial(shocks, out, wealth, monthly_contribution, drift, monthly_volatility):
+        """Single-threaded twin of `_mc_chunk_kernel` for small simulation counts."""
+        n_simulations, n_periods = shocks.shape
+        for i in range(n_simulations):
+            w = wealth[i]
+            for t in range(n_periods):
+                w = w * np.exp(drift + monthly_volatility * shocks[i, t]) + monthly_contribution
+                out[i, t] = w
+            wealth[i] = w
+
+
+def _simulate_paths_gpu(
+    current_wealth: float,
+    monthly_contribution: float,
+    drift: float,
+    monthly_volatility: float,
+    n_simulations: int,
+    n_periods: int,
+    noise: Optional[np.ndarray] = None,
+    return_paths: bool = True
+) -> Tuple[Optional[np.ndarray], np.ndarray, np.ndarray]:
+    """
+    GBM paths with contributions computed on the GPU (CuPy).
+    
+    Same MC_TIME_CHUNK scheme as `_simulate_cpu`: float32 shocks for one
+    chunk at a time (drawn on the device unless `noise` is given), wealth
+    carried in float64 on the device, and 10/50/90th percentiles taken on
+    the device per chunk. Without `return_paths` the device holds only one
+    chunk of shocks and values; the only transfer back is the finished
+    paths (when kept) plus the percentile curves and final values. Both
+    modes draw the same shocks.
+    
+    Returns
+    -------
+    tuple
+        (paths or None, percentiles of shape (3, n_periods + 1), final values)
+    """
+    width = min(MC_TIME_CHUNK, n_periods)
+    wealth = cp.full(n_simulations, float(current_wealth), dtype=cp.float64)
+    percentiles = cp.empty((3, n_periods + 1))
+    percentiles[:, 0] = current_wealth
+    q = cp.asarray([10.0, 50.0, 90.0])
+    
+    if return_paths:
+        paths = cp.empty((n_periods + 1, n_simulations), dtype=cp.float32)
+        paths[0] = current_wealth
+    else:
+        values = cp.empty((width, n_simulations), dtype=cp.float32)
+    if noise is None:
+        rng = cp.random.default_rng(42)
+        shock_buf = cp.empty((width, n_simulations), dtype=cp.float32)
+    
+    blocks = (n_simulations + GPU_THREADS_PER_BLOCK - 1) // GPU_THREADS_PER_BLOCK
+    for t0 in range(0, n_periods, MC_TIME_CHUNK):
+        k = min(MC_TIME_CHUNK, n_periods - t0)
+        if noise is not None:
+            shocks = cp.ascontiguousarray(
+                cp.asarray(noise[:n_simulations, t0:t0 + k], dtype=cp.float32).T
+            )
+        else:
+            shocks = shock_buf[:k]
+            rng.standard_normal(dtype=cp.float32, out=shocks)
+        
+        chunk = paths[t0 + 1:t0 + k + 1] if return_paths else values[:k]
+        _gbm_chunk_kernel(
+            (blocks,), (GPU_THREADS_PER_BLOCK,),
+            (shocks, chunk, wealth, np.int64(n_simulations), np.int32(k),
+             np.float64(monthly_contribution), np.float64(drift),
+             np.float64(monthly_volatility))
+        )
+        percentiles[:, t0 + 1:t0 + k + 1] = cp.percentile(chunk, q, axis=1)
+    
+    final_values = cp.asnumpy(wealth.astype(cp.float32))
+    percentiles = cp.asnumpy(percentiles)
+    if not return_paths:
+        return None, percentiles, final_values
+    return np.ascontiguousarray(cp.asnumpy(paths).T), percentiles, final_values
+
+
 def summarize_simulation(result: SimulationResult) -> Dict:
     """
     Create a summary dictionary of simulation results.
+    
+    The final-value percentiles are the last point of the per-period
+    percentile curves, which run_monte_carlo already computed.
     """
     return {
-        "Initial Wealth": result.paths[0, 0],
+        "Initial Wealth": result.percentile_50[0],
         "Years": result.years[-1],
-        "Median Final Value": np.median(result.final_values),
-        "10th Percentile": np.percentile(result.final_values, 10),
-        "90th Percentile": np.percentile(result.final_values, 90),
+        "Median Final Value": result.percentile_50[-1],
+        "10th Percentile": result.percentile_10[-1],
+        "90th Percentile": result.percentile_90[-1],
         "Mean Final Value": np.mean(result.final_values),
         "Std Dev": np.std(result.final_values),
         "Probability of Success": result.probability_of_success
@@ -162,6 +442,15 @@ def summarize_simulation(result: SimulationResult) -> Dict:
 # PORTFOLIO REBALANCING
 # =============================================================================
 
+# Unit prices used when generate_action_plan gets no asset_prices
+DEFAULT_ASSET_PRICES = {
+    "Thai Stock": 100,
+    "US Tech": 450,
+    "Gold": 180,
+    "Bonds": 100
+}
+
+
 @dataclass
 class RebalanceAction:
     """Represents a single rebalancing trade."""
@@ -199,23 +488,80 @@ def calculate_drift(
     pd.DataFrame
         DataFrame with assets, weights, and drift values
     """
-    assets = list(set(current_weights.keys()) | set(target_weights.keys()))
+    assets = list(dict.fromkeys([*current_weights, *target_weights]))
+    curr, tgt = _weight_arrays(assets, current_weights, target_weights)
+    drift = _drift_core(curr, tgt)
     
-    drift_data = []
-    for asset in assets:
-        current = current_weights.get(asset, 0)
-        target = target_weights.get(asset, 0)
-        drift = current - target
-        
-        drift_data.append({
-            "Asset": asset,
-            "Current (%)": current * 100,
-            "Target (%)": target * 100,
-            "Drift (%)": drift * 100,
-            "Status": _get_drift_status(drift)
-        })
+    return pd.DataFrame({
+        "Asset": assets,
+        "Current (%)": curr * 100,
+        "Target (%)": tgt * 100,
+        "Drift (%)": drift * 100,
+        "Status": [_get_drift_status(d) for d in drift]
+    }).sort_values("Drift (%)", ascending=False)
+
+
+def _weight_arrays(
+    assets: List[str],
+    current_weights: Dict[str, float],
+    target_weights: Dict[str, float]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Current/target weights as float64 arrays aligned to ``assets``."""
+    curr = np.fromiter((current_weights.get(a, 0) for a in assets), dtype=np.float64, count=len(assets))
+    tgt = np.fromiter((target_weights.get(a, 0) for a in assets), dtype=np.float64, count=len(assets))
+    return curr, tgt
+
+
+def _drift_core(curr, tgt):
+    """Per-asset drift (current - target) as fractions."""
+    drift = np.empty(curr.shape[0])
+    for i in range(curr.shape[0]):
+        drift[i] = curr[i] - tgt[i]
+    return drift
+
+
+def _action_plan_core(curr, tgt, prices, portfolio_value, drift_threshold):
+    """
+    Numeric core of ``generate_action_plan``.
     
-    return pd.DataFrame(drift_data).sort_values("Drift (%)", ascending=False)
+    Returns (sides, units, amounts) per asset: side is +1 for SELL,
+    -1 for BUY and 0 when the drift is within the threshold.
+    """
+    n = curr.shape[0]
+    sides = np.zeros(n, dtype=np.int8)
+    units = np.zeros(n, dtype=np.int64)
+    amounts = np.zeros(n)
+    for i in range(n):
+        drift = curr[i] - tgt[i]
+        if abs(drift) > drift_threshold:
+            sides[i] = 1 if drift > 0 else -1
+            amounts[i] = abs(drift) * portfolio_value
+            units[i] = int(amounts[i] / prices[i])
+    return sides, units, amounts
+
+
+def _action_plan_core_numpy(curr, tgt, prices, portfolio_value, drift_threshold):
+    """Masked-array form of ``_action_plan_core`` for when numba is missing."""
+    drift = curr - tgt
+    hit = np.abs(drift) > drift_threshold
+    sides = np.where(hit, np.sign(drift), 0).astype(np.int8)
+    amounts = np.where(hit, np.abs(drift) * portfolio_value, 0.0)
+    units = (amounts / prices).astype(np.int64)  # truncates like int()
+    return sides, units, amounts
+
+
+if NUMBA_AVAILABLE:
+    # Eager signatures: compiled once at import (and cached on disk), never
+    # re-specialised per call
+    _drift_core = njit("float64[:](float64[:], float64[:])", cache=True)(_drift_core)
+    _action_plan_core = njit(
+        "Tuple((int8[:], int64[:], float64[:]))(float64[:], float64[:], float64[:], float64, float64)",
+        cache=True
+    )(_action_plan_core)
+else:
+    # Whole-array NumPy ops instead of the per-asset Python loops
+    _drift_core = np.subtract
+    _action_plan_core = _action_plan_core_numpy
 
 
 def _get_drift_status(drift: float) -> str:
@@ -267,40 +613,28 @@ def generate_action_plan(
     """
     # Default prices if not provided
     if asset_prices is None:
-        asset_prices = {
-            "Thai Stock": 100,
-            "US Tech": 450,
-            "Gold": 180,
-            "Bonds": 100
-        }
-    
-    actions = []
-    assets = list(set(current_weights.keys()) | set(target_weights.keys()))
-    
-    for asset in assets:
-        current = current_weights.get(asset, 0)
-        target = target_weights.get(asset, 0)
-        drift = current - target
-        
-        # Only create action if drift exceeds threshold
-        if abs(drift) > drift_threshold:
-            # Calculate trade amount in currency
-            trade_amount = abs(drift) * portfolio_value
-            
-            # Calculate units to trade
-            price = asset_prices.get(asset, 100)
-            trade_units = int(trade_amount / price)
-            
-            action = RebalanceAction(
-                asset=asset,
-                action="SELL" if drift > 0 else "BUY",
-                current_weight=current,
-                target_weight=target,
-                drift=drift,
-                trade_amount=trade_amount,
-                trade_units=trade_units
-            )
-            actions.append(action)
+        asset_prices = DEFAULT_ASSET_PRICES
+    
+    assets = list(dict.fromkeys([*current_weights, *target_weights]))
+    curr, tgt = _weight_arrays(assets, current_weights, target_weights)
+    prices = np.fromiter((asset_prices.get(a, 100) for a in assets), dtype=np.float64, count=len(assets))
+    sides, units, amounts = _action_plan_core(
+        curr, tgt, prices, float(portfolio_value), float(drift_threshold)
+    )
+    
+    # Only create actions where drift exceeds threshold
+    actions = [
+        RebalanceAction(
+            asset=assets[i],
+            action="SELL" if sides[i] > 0 else "BUY",
+            current_weight=float(curr[i]),
+            target_weight=float(tgt[i]),
+            drift=float(curr[i] - tgt[i]),
+            trade_amount=float(amounts[i]),
+            trade_units=int(units[i])
+        )
+        for i in np.flatnonzero(sides)
+    ]
     
     # Sort by absolute trade amount (largest first)
     actions.sort(key=lambda x: abs(x.trade_amount), reverse=True)
@@ -315,23 +649,33 @@ def format_action_plan(actions: List[RebalanceAction]) -> pd.DataFrame:
     if not actions:
         return pd.DataFrame({"Message": ["No rebalancing needed at this time."]})
     
-    data = []
-    for action in actions:
-        data.append({
-            "Action": f"{'🔻 SELL' if action.action == 'SELL' else '🔺 BUY'}",
-            "Asset": action.asset,
-            "Units": f"{action.trade_units:,}",
-            "Amount": f"฿{action.trade_amount:,.0f}",
-            "Current → Target": f"{action.current_weight*100:.1f}% → {action.target_weight*100:.1f}%"
-        })
-    
-    return pd.DataFrame(data)
+    plan = pd.DataFrame([vars(a) for a in actions])
+    return pd.DataFrame({
+        "Action": np.where(plan["action"] == "SELL", "🔻 SELL", "🔺 BUY"),
+        "Asset": plan["asset"],
+        "Units": plan["trade_units"].map("{:,}".format),
+        "Amount": plan["trade_amount"].map("฿{:,.0f}".format),
+        "Current → Target": (plan["current_weight"] * 100).map("{:.1f}% → ".format)
+                            + (plan["target_weight"] * 100).map("{:.1f}%".format)
+    })
 
 
 # =============================================================================
 # RISK METRICS
 # =============================================================================
 
+# Default risk ratings
+DEFAULT_RISK_RATINGS = {
+    "Thai Stock": 7,   # Emerging market equity
+    "US Tech": 8,     # High volatility sector
+    "Gold": 5,        # Moderate, hedge asset
+    "Bonds": 2        # Low risk fixed income
+}
+# Same ratings as a vector, for dot products against aligned weights
+DEFAULT_RISK_ASSETS = tuple(DEFAULT_RISK_RATINGS)
+DEFAULT_RISK_VECTOR = np.fromiter(DEFAULT_RISK_RATINGS.values(), dtype=np.float64)
+UNRATED_ASSET_RISK = 5  # rating for assets missing from the ratings
+
 def calculate_risk_score(
     weights: Dict[str, float],
     asset_risk_ratings: Optional[Dict[str, int]] = None
@@ -354,23 +698,21 @@ def calculate_risk_score(
     int
         Overall portfolio risk score (1-10)
     """
-    # Default risk ratings
-    if asset_risk_ratings is None:
-        asset_risk_ratings = {
-            "Thai Stock": 7,   # Emerging market equity
-            "US Tech": 8,     # High volatility sector
-            "Gold": 5,        # Moderate, hedge asset
-            "Bonds": 2        # Low risk fixed income
-        }
-    
-    # Calculate weighted average risk
-    total_risk = 0
-    total_weight = 0
-    
-    for asset, weight in weights.items():
-        risk = asset_risk_ratings.get(asset, 5)
-        total_risk += weight * risk
-        total_weight += weight
+    if asset_risk_ratings is None or asset_risk_ratings is DEFAULT_RISK_RATINGS:
+        # One dot product over the known assets; anything else is unrated
+        w = np.fromiter((weights.get(a, 0.0) for a in DEFAULT_RISK_ASSETS),
+                        dtype=np.float64, count=len(DEFAULT_RISK_ASSETS))
+        total_weight = sum(weights.values())
+        total_risk = w @ DEFAULT_RISK_VECTOR + UNRATED_ASSET_RISK * (total_weight - w.sum())
+    else:
+        # Calculate weighted average risk
+        total_risk = 0
+        total_weight = 0
+        
+        for asset, weight in weights.items():
+            risk = asset_risk_ratings.get(asset, UNRATED_ASSET_RISK)
+            total_risk += weight * risk
+            total_weight += weight
     
     if total_weight > 0:
         avg_risk = total_risk / total_weight
@@ -380,9 +722,140 @@ def calculate_risk_score(
     return round(avg_risk)
 
 
+def calculate_risk_score_batch(
+    W: np.ndarray,
+    risk_vector: np.ndarray = DEFAULT_RISK_VECTOR
+) -> np.ndarray:
+    """
+    Risk scores (1-10) for many portfolios at once.
+    
+    Parameters
+    ----------
+    W : np.ndarray
+        Weight matrix of shape (k, p), columns in the order of `risk_vector`
+        (DEFAULT_RISK_ASSETS for the default ratings)
+    risk_vector : np.ndarray
+        Risk rating per column
+        
+    Returns
+    -------
+    np.ndarray
+        Shape (k,) integer scores; 5 for rows whose weights sum to 0
+    """
+    total_weight = W.sum(axis=1)
+    avg_risk = np.divide(W @ risk_vector, total_weight,
+                         out=np.full(len(W), float(UNRATED_ASSET_RISK)), where=total_weight > 0)
+    return np.rint(avg_risk).astype(np.int64)
+
+
+def calculate_dashboard_metrics(
+    asset_order: Tuple[str, ...],
+    weights: np.ndarray,
+    target_weights: Dict[str, float],
+    asset_risk_ratings: Optional[Dict[str, int]] = None
+) -> Tuple[int, np.ndarray, float, float]:
+    """
+    Risk score, drift and diversification for the dashboard in one pass.
+    
+    Parameters
+    ----------
+    asset_order : tuple
+        Asset names matching `weights`
+    weights : np.ndarray
+        Current portfolio weights
+    target_weights : dict
+        Target portfolio weights (assets missing from asset_order count
+        as held at 0%)
+    asset_risk_ratings : dict, optional
+        Risk rating for each asset (1-10), defaults to DEFAULT_RISK_RATINGS
+        
+    Returns
+    -------
+    tuple
+        (risk_score, drift, max_abs_drift_pct, diversification_score)
+        - risk_score: same as calculate_risk_score
+        - drift: current - target per asset in asset_order (+ target-only assets)
+        - max_abs_drift_pct: largest |drift| in percent
+        - diversification_score: 0-10, from the Herfindahl index
+          (1 - Σw²) scaled so that equal weights score 10
+    """
+    if asset_risk_ratings is None:
+        asset_risk_ratings = DEFAULT_RISK_RATINGS
+    
+    extra = [a for a in target_weights if a not in asset_order]
+    assets = list(asset_order) + extra
+    w = np.zeros(len(assets))
+    w[:len(asset_order)] = weights
+    target = np.array([target_weights.get(a, 0) for a in assets], dtype=float)
+    ratings = np.array([asset_risk_ratings.get(a, 5) for a in assets], dtype=float)
+    
+    n_held = len(asset_order)
+    total_weight, rating_sum, drift, max_abs_drift, sum_sq_shares = _dashboard_core(
+        w, target, ratings, n_held
+    )
+    risk_score = round(rating_sum / total_weight) if total_weight > 0 else 5
+    
+    # Rounded so float32 storage noise (0.3 -> 0.30000001) cannot tip a
+    # drift sitting exactly on a threshold
+    max_drift = round(max_abs_drift * 100, 4)
+    
+    # Herfindahl: 1 - Σw² is 0 for a single asset and 1 - 1/n for equal weights
+    if total_weight > 0 and n_held > 1:
+        diversification = (1 - sum_sq_shares) / (1 - 1 / n_held) * 10
+    else:
+        diversification = 0.0
+    
+    return risk_score, drift, max_drift, float(diversification)
+
+
+def _dashboard_core(w, target, ratings, n_held):
+    """
+    Numeric core of ``calculate_dashboard_metrics`` in one loop.
+    
+    Returns (total_weight, Σ rating·w, drift, max |drift|, Σ share² over
+    the first `n_held` assets), shares being w / total_weight.
+    """
+    n = w.shape[0]
+    drift = np.empty(n)
+    total_weight = 0.0
+    rating_sum = 0.0
+    max_abs_drift = 0.0
+    for i in range(n):
+        total_weight += w[i]
+        rating_sum += ratings[i] * w[i]
+        drift[i] = w[i] - target[i]
+        max_abs_drift = max(max_abs_drift, abs(drift[i]))
+    sum_sq_shares = 0.0
+    if total_weight > 0:
+        for i in range(n_held):
+            share = w[i] / total_weight
+            sum_sq_shares += share * share
+    return total_weight, rating_sum, drift, max_abs_drift, sum_sq_shares
+
+
+def _dashboard_core_numpy(w, target, ratings, n_held):
+    """Whole-array form of ``_dashboard_core`` for when numba is missing."""
+    total_weight = float(w.sum())
+    drift = w - target
+    max_abs_drift = float(np.abs(drift).max()) if len(drift) else 0.0
+    shares = w[:n_held] / total_weight if total_weight > 0 else w[:0]
+    return total_weight, float(ratings @ w), drift, max_abs_drift, float(shares @ shares)
+
+
+if NUMBA_AVAILABLE:
+    # Eager signature: compiled once at import (and cached on disk)
+    _dashboard_core = njit(
+        "Tuple((float64, float64, float64[:], float64, float64))"
+        "(float64[:], float64[:], float64[:], int64)",
+        cache=True
+    )(_dashboard_core)
+else:
+    _dashboard_core = _dashboard_core_numpy
+
+
 def calculate_portfolio_volatility(
     weights: Dict[str, float],
-    cov_matrix: pd.DataFrame
+    cov_matrix: Union[pd.DataFrame, np.ndarray]
 ) -> float:
     """
     Calculate annualized portfolio volatility (standard deviation).
@@ -393,22 +866,52 @@ def calculate_portfolio_volatility(
     ----------
     weights : dict
         Portfolio weights
-    cov_matrix : pd.DataFrame
-        Covariance matrix of asset returns
+    cov_matrix : pd.DataFrame or np.ndarray
+        Covariance matrix of asset returns. An ndarray is taken to be
+        already sliced to the assets of `weights`, in the same order,
+        which skips the per-call `.loc` lookup.
         
     Returns
     -------
     float
         Annualized portfolio volatility
     """
-    assets = list(weights.keys())
-    w = np.array([weights.get(a, 0) for a in assets])
-    Sigma = cov_matrix.loc[assets, assets].values
+    assets, W = _weight_row(weights)
     
-    portfolio_variance = w @ Sigma @ w
-    portfolio_volatility = np.sqrt(portfolio_variance)
+    return calculate_portfolio_volatility_batch(W, _cov_for(cov_matrix, assets))[0]
+
+
+def _weight_row(weights: Dict[str, float]) -> Tuple[List[str], np.ndarray]:
+    """Assets of `weights` and their weights as a (1, p) matrix for the *_batch functions."""
+    assets = list(weights)
+    return assets, np.fromiter(weights.values(), dtype=np.float64, count=len(assets))[np.newaxis, :]
+
+
+def _cov_for(cov_matrix: Union[pd.DataFrame, np.ndarray], assets: List[str]) -> np.ndarray:
+    """Σ of `assets` in that order; an ndarray is assumed to be in that order already."""
+    if isinstance(cov_matrix, np.ndarray):
+        return cov_matrix
+    return cov_matrix.loc[assets, assets].values
+
+
+def calculate_portfolio_volatility_batch(W: np.ndarray, Sigma: np.ndarray) -> np.ndarray:
+    """
+    Annualized volatility of many portfolios at once.
     
-    return portfolio_volatility
+    Parameters
+    ----------
+    W : np.ndarray
+        Weight matrix of shape (k, p), one portfolio per row
+    Sigma : np.ndarray
+        Covariance matrix of shape (p, p), assets in the same order as W
+        
+    Returns
+    -------
+    np.ndarray
+        Shape (k,) volatilities: sqrt(diag(W Σ W'))
+    """
+    # One GEMM for W Σ, then a row-wise dot with W (never forms the k x k product)
+    return np.sqrt(np.einsum('ij,ij->i', W @ Sigma, W))
 
 
 def calculate_expected_return(
@@ -419,19 +922,24 @@ def calculate_expected_return(
     Calculate portfolio expected return.
     
     E[R_p] = Σ w_i * E[R_i]
+    
+    Assets without an expected return contribute nothing.
     """
-    portfolio_return = 0
-    for asset, weight in weights.items():
-        if asset in expected_returns.index:
-            portfolio_return += weight * expected_returns[asset]
+    assets, W = _weight_row(weights)
+    mu = expected_returns.reindex(assets, fill_value=0.0).to_numpy(dtype=np.float64)
     
-    return portfolio_return
+    return calculate_expected_return_batch(W, mu)[0]
+
+
+def calculate_expected_return_batch(W: np.ndarray, mu: np.ndarray) -> np.ndarray:
+    """Expected return of each row of the (k, p) weight matrix W: W @ μ."""
+    return W @ mu
 
 
 def calculate_sharpe_ratio(
     weights: Dict[str, float],
     expected_returns: pd.Series,
-    cov_matrix: pd.DataFrame,
+    cov_matrix: Union[pd.DataFrame, np.ndarray],
     risk_free_rate: float = 0.02
 ) -> float:
     """
@@ -443,13 +951,95 @@ def calculate_sharpe_ratio(
     - > 1.0: Good
     - > 2.0: Very good
     - > 3.0: Excellent
+    
+    `cov_matrix` may be a pre-sliced ndarray, as in
+    calculate_portfolio_volatility. For repeated calls over a fixed asset
+    universe, RiskEngine resolves Σ and μ once.
     """
-    port_return = calculate_expected_return(weights, expected_returns)
-    port_vol = calculate_portfolio_volatility(weights, cov_matrix)
+    assets, W = _weight_row(weights)
+    mu = expected_returns.reindex(assets, fill_value=0.0).to_numpy(dtype=np.float64)
     
-    if port_vol > 0:
-        sharpe = (port_return - risk_free_rate) / port_vol
-    else:
-        sharpe = 0
+    return calculate_sharpe_ratio_batch(W, mu, _cov_for(cov_matrix, assets), risk_free_rate)[0]
+
+
+def calculate_sharpe_ratio_batch(
+    W: np.ndarray,
+    mu: np.ndarray,
+    Sigma: np.ndarray,
+    risk_free_rate: float = 0.02
+) -> np.ndarray:
+    """
+    Sharpe Ratio of each row of the (k, p) weight matrix W.
+    
+    Same convention as calculate_sharpe_ratio: 0 where volatility is 0.
+    """
+    excess = calculate_expected_return_batch(W, mu) - risk_free_rate
+    vol = calculate_portfolio_volatility_batch(W, Sigma)
+    return np.divide(excess, vol, out=np.zeros_like(excess, dtype=np.float64), where=vol > 0)
+
+
+class RiskEngine:
+    """
+    Risk/return metrics for a fixed asset universe.
+    
+    The asset -> index map, covariance matrix and expected returns are
+    resolved once, so each call is a weight fill plus the *_batch math
+    instead of rebuilding arrays and slicing a DataFrame with `.loc` every
+    time. Weights may be a dict (assets left out count as 0) or an array
+    already in `assets` order.
+    """
+    
+    def __init__(self, assets: Tuple[str, ...], Sigma: np.ndarray, mu: Optional[np.ndarray] = None):
+        self.assets = tuple(assets)
+        self.index = {asset: i for i, asset in enumerate(self.assets)}
+        self.Sigma = np.ascontiguousarray(Sigma, dtype=np.float64)
+        self.mu = None if mu is None else np.asarray(mu, dtype=np.float64)
+        
+        n = len(self.assets)
+        if self.Sigma.shape != (n, n):
+            raise ValueError(f"Sigma must be {n}x{n} for {n} assets, got {self.Sigma.shape}")
+        if self.mu is not None and self.mu.shape != (n,):
+            raise ValueError(f"mu must have {n} entries, got shape {self.mu.shape}")
+    
+    @classmethod
+    def from_frames(
+        cls,
+        cov_matrix: pd.DataFrame,
+        expected_returns: Optional[pd.Series] = None
+    ) -> "RiskEngine":
+        """Build from the covariance DataFrame (and expected-return Series, missing assets = 0)."""
+        assets = tuple(cov_matrix.columns)
+        mu = None if expected_returns is None else expected_returns.reindex(assets, fill_value=0.0).to_numpy()
+        return cls(assets, cov_matrix.loc[list(assets), list(assets)].to_numpy(), mu)
+    
+    def weight_vector(self, weights: Union[Dict[str, float], np.ndarray]) -> np.ndarray:
+        """Weights as an array in `assets` order (KeyError for unknown assets)."""
+        if isinstance(weights, dict):
+            # Fresh buffer per call: an engine cached in Streamlit is shared
+            # by concurrent sessions, so a reused scratch array would race
+            w = np.zeros(len(self.assets))
+            index = self.index
+            for asset, weight in weights.items():
+                w[index[asset]] = weight
+            return w
+        return np.asarray(weights, dtype=np.float64)
+    
+    def _require_mu(self) -> np.ndarray:
+        if self.mu is None:
+            raise ValueError("RiskEngine was built without expected returns (mu)")
+        return self.mu
+    
+    def volatility(self, weights: Union[Dict[str, float], np.ndarray]) -> float:
+        """Annualized portfolio volatility, as calculate_portfolio_volatility."""
+        W = self.weight_vector(weights)[np.newaxis, :]
+        return float(calculate_portfolio_volatility_batch(W, self.Sigma)[0])
+    
+    def expected_return(self, weights: Union[Dict[str, float], np.ndarray]) -> float:
+        """Portfolio expected return, as calculate_expected_return (needs mu)."""
+        W = self.weight_vector(weights)[np.newaxis, :]
+        return float(calculate_expected_return_batch(W, self._require_mu())[0])
     
-    return sharpe
+    def sharpe_ratio(self, weights: Union[Dict[str, float], np.ndarray], risk_free_rate: float = 0.02) -> float:
+        """Sharpe Ratio, 0 when volatility is 0, as calculate_sharpe_ratio (needs mu)."""
+        W = self.weight_vector(weights)[np.newaxis, :]
+        return float(calculate_sharpe_ratio_batch(W, self._require_mu(), self.Sigma, risk_free_rate)[0])
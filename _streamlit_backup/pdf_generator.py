@@ -28,7 +28,7 @@ class WealthReportPDF(FPDF):
         self.primary_color = (0, 210, 106)     # Green
         self.secondary_color = (255, 215, 0)   # Gold
         self.dark_bg = (30, 34, 42)            # Dark background
-        self.text_color = (50, 50, 50)         # Dark text
+        self.dark_text = (50, 50, 50)          # Dark text (fpdf2 reserves text_color)
         self.light_text = (128, 128, 128)      # Gray text
         
     def header(self):
@@ -39,7 +39,7 @@ class WealthReportPDF(FPDF):
         
         # Title
         self.set_font('Helvetica', 'B', 16)
-        self.set_text_color(*self.text_color)
+        self.set_text_color(*self.dark_text)
         self.set_xy(22, 10)
         self.cell(0, 8, 'SMART WEALTH ADVISOR', new_x="LMARGIN", new_y="NEXT")
         
@@ -98,7 +98,7 @@ class WealthReportPDF(FPDF):
         # Value
         self.set_xy(start_x + 3, start_y + 10)
         self.set_font('Helvetica', 'B', 14)
-        self.set_text_color(*self.text_color)
+        self.set_text_color(*self.dark_text)
         self.cell(width - 6, 8, value)
         
         # Delta
@@ -129,7 +129,7 @@ class WealthReportPDF(FPDF):
         
         # Data rows
         self.set_font('Helvetica', '', 9)
-        self.set_text_color(*self.text_color)
+        self.set_text_color(*self.dark_text)
         
         fill = False
         for row in data:
@@ -146,7 +146,7 @@ class WealthReportPDF(FPDF):
     def add_text_block(self, text: str):
         """เพิ่มบล็อกข้อความ"""
         self.set_font('Helvetica', '', 10)
-        self.set_text_color(*self.text_color)
+        self.set_text_color(*self.dark_text)
         self.multi_cell(0, 6, text)
         self.ln(3)
 
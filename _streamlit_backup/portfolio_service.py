@@ -10,18 +10,18 @@ Features:
 """
 
 import os
+import importlib.util
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
 from datetime import datetime
 from enum import Enum
 
-# Try to import supabase
-try:
-    from supabase import create_client, Client
-    SUPABASE_AVAILABLE = True
-except ImportError:
-    SUPABASE_AVAILABLE = False
-    Client = None
+import numpy as np
+
+# supabase is imported lazily in PortfolioService (mock mode never loads it)
+SUPABASE_AVAILABLE = importlib.util.find_spec("supabase") is not None
+if TYPE_CHECKING:
+    from supabase import Client
 
 try:
     from dotenv import load_dotenv
@@ -64,6 +64,19 @@ class Portfolio:
     target_allocation: Dict[str, float] = field(default_factory=dict)
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
+    # Array view of holdings (asset_order[i] -> weights[i]) for numeric code
+    asset_order: Tuple[str, ...] = field(default=(), init=False, repr=False)
+    weights: np.ndarray = field(default=None, init=False, repr=False)
+    
+    def __post_init__(self):
+        self.sync_weights()
+    
+    def sync_weights(self):
+        """Rebuild asset_order/weights after holdings change"""
+        self.asset_order = tuple(self.holdings)
+        self.weights = np.fromiter(
+            self.holdings.values(), dtype=np.float32, count=len(self.holdings)
+        )
 
 
 @dataclass
@@ -96,10 +109,11 @@ class PortfolioService:
     
     def __init__(self):
         self.mock_mode = MOCK_MODE
-        self.client: Optional[Client] = None
+        self.client: Optional["Client"] = None
         
         if not self.mock_mode:
             try:
+                from supabase import create_client
                 self.client = create_client(SUPABASE_URL, SUPABASE_KEY)
             except Exception as e:
                 print(f"Failed to connect to Supabase: {e}")
@@ -337,6 +351,7 @@ class PortfolioService:
         for asset, weight in allocation.items():
             portfolio.holdings[asset] = weight
             portfolio.target_allocation[asset] = weight
+        portfolio.sync_weights()
         
         portfolio.updated_at = datetime.now()
         
@@ -0,0 +1,97 @@
+"""
+Background Tasks Module
+=======================
+งานที่ส่งไปรันบน Celery worker แทน Streamlit request
+
+การใช้งาน:
+1. ตั้งค่า CELERY_BROKER_URL (เช่น redis://localhost:6379/1)
+2. รัน worker: celery -A tasks worker --loglevel=info
+3. ถ้าไม่ได้ตั้งค่า broker ระบบจะส่งแบบ synchronous เหมือนเดิม
+"""
+
+import os
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from line_notify import post_line_notify
+
+# Optional task queue (fire-and-forget LINE notifications)
+try:
+    from celery import Celery
+    CELERY_AVAILABLE = True
+except ImportError:
+    CELERY_AVAILABLE = False
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "")
+
+# Queue only when a broker is configured
+QUEUE_ENABLED = bool(CELERY_AVAILABLE and CELERY_BROKER_URL)
+
+celery_app = None
+
+if QUEUE_ENABLED:
+    # No result backend: callers never wait on a task
+    celery_app = Celery("wealth", broker=CELERY_BROKER_URL, backend=None)
+    celery_app.conf.update(
+        task_ignore_result=True,
+        # Redis broker + acks_late re-delivers unacked tasks only after the
+        # visibility timeout; early ack keeps delivery latency low
+        task_acks_late=False,
+        worker_prefetch_multiplier=4
+    )
+
+
+# =============================================================================
+# TASKS
+# =============================================================================
+
+if QUEUE_ENABLED:
+    # Celery is the only retry layer on the worker: this pool never retries,
+    # so one alert is POSTed at most 1 + max_retries times
+    _WORKER_SESSION = requests.Session()
+    _WORKER_SESSION.mount("https://", HTTPAdapter(max_retries=0))
+
+    @celery_app.task(
+        bind=True,
+        autoretry_for=(requests.exceptions.ConnectionError, requests.exceptions.HTTPError),
+        retry_backoff=True,
+        max_retries=3
+    )
+    def send_line_notify_task(self, message: str, token: str, image_url: Optional[str] = None) -> int:
+        """ส่ง LINE Notify บน worker; retry เมื่อเชื่อมต่อไม่ได้หรือ server error"""
+        response = post_line_notify(message, token, image_url, session=_WORKER_SESSION)
+        if response.status_code >= 500:
+            response.raise_for_status()  # HTTPError -> autoretry
+        return response.status_code
+
+
+def enqueue_line_notify(message: str, token: str, image_url: Optional[str] = None) -> bool:
+    """
+    ส่งข้อความเข้าคิว Celery
+    
+    Returns:
+        True ถ้าเข้าคิวสำเร็จ, False ถ้าไม่มี broker หรือ broker ไม่ตอบ
+        (ผู้เรียกควรส่งแบบ synchronous แทน)
+    """
+    if not QUEUE_ENABLED:
+        return False
+    
+    try:
+        send_line_notify_task.delay(message, token, image_url)
+        return True
+    except Exception as e:  # kombu OperationalError etc.
+        print(f"Failed to enqueue LINE notify: {e}")
+        return False
@@ -10,6 +10,9 @@ from dataclasses import dataclass
 from typing import Dict, List, Tuple
 import numpy as np
 
+# Optional JIT backend for the bracket walk
+from jit_backend import NUMBA_AVAILABLE, njit
+
 
 # =============================================================================
 # TAX RATES 2567 (2024)
@@ -27,6 +30,10 @@ TAX_BRACKETS_2567 = [
     (float('inf'), 0.35)  # มากกว่า 5,000,000 = 35%
 ]
 
+# ขั้นบันไดภาษีในรูป array (เพดานบน / อัตรา) สำหรับ _tax_from_net
+_BRACKET_EDGES = np.array([b for b, _ in TAX_BRACKETS_2567], dtype=np.float64)
+_BRACKET_RATES = np.array([r for _, r in TAX_BRACKETS_2567], dtype=np.float64)
+
 # ค่าลดหย่อนพื้นฐาน
 PERSONAL_DEDUCTION = 60_000          # ค่าลดหย่อนส่วนตัว
 SPOUSE_DEDUCTION = 60_000            # คู่สมรส
@@ -176,6 +183,27 @@ def calculate_total_deductions(deductions: TaxDeductions, income: float) -> floa
     return total
 
 
+def _tax_from_net(net: float, rates: np.ndarray, edges: np.ndarray) -> float:
+    """ภาษีแบบขั้นบันไดจากเงินได้สุทธิ (scalar kernel, JIT เมื่อมี numba)"""
+    tax = 0.0
+    prev = 0.0
+    for i in range(edges.shape[0]):
+        if net <= prev:
+            break
+        tax += (min(net, edges[i]) - prev) * rates[i]
+        prev = edges[i]
+    return tax
+
+
+if NUMBA_AVAILABLE:
+    # Eager signature: compiled once and cached on disk across restarts.
+    # No "ninf"/"nnan" fast-math: the last bracket edge is +inf
+    _tax_from_net = njit(
+        "float64(float64, float64[:], float64[:])", cache=True,
+        fastmath={"nsz", "arcp", "contract", "reassoc"}
+    )(_tax_from_net)
+
+
 def calculate_tax(net_income: float) -> Tuple[float, str]:
     """
     คำนวณภาษีจากเงินได้สุทธิ
@@ -189,22 +217,8 @@ def calculate_tax(net_income: float) -> Tuple[float, str]:
     if net_income <= 0:
         return 0, "0%"
     
-    tax = 0
-    remaining = net_income
-    prev_bracket = 0
-    current_rate = "0%"
-    
-    for bracket, rate in TAX_BRACKETS_2567:
-        taxable = min(remaining, bracket - prev_bracket)
-        if taxable > 0:
-            tax += taxable * rate
-            current_rate = f"{rate*100:.0f}%"
-        remaining -= taxable
-        prev_bracket = bracket
-        if remaining <= 0:
-            break
-    
-    return tax, current_rate
+    tax = _tax_from_net(float(net_income), _BRACKET_RATES, _BRACKET_EDGES)
+    return tax, f"{get_marginal_rate(net_income)*100:.0f}%"
 
 
 def get_marginal_rate(net_income: float) -> float: